@@ -1,48 +1,248 @@
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import JSONResponse
-from app.models.state import global_state
-from app.core.workflow import DocumentGenerationWorkflow
+import asyncio
+import json
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.core import config, metrics
+from app.core.event_loop import engine_loop
+from app.core.jobs import job_manager, JobQueueFullError
 
 router = APIRouter()
 
 
+def _job_not_found(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        {"status": "error", "message": f"Job {job_id} not found or expired."},
+        status_code=404,
+    )
+
+
+# Document i of a seeded job uses seed + i, which must stay a 32-bit integer
+_MAX_SEED = 2**31 - 1 - config.MAX_FILES_PER_JOB
+
+
 @router.post("/api/start")
-def start_generation(data: dict, background_tasks: BackgroundTasks):
-    if global_state.is_currently_running:
+async def start_generation(data: dict):
+    api_key = data.get("api_key")
+    try:
+        num_files = int(data.get("num_files", 1))
+        concurrency = int(data["concurrency"]) if data.get("concurrency") else None
+        seed = int(data["seed"]) if data.get("seed") not in (None, "") else None
+    except (TypeError, ValueError):
+        return JSONResponse({"status": "error", "message": "num_files, concurrency and seed must be whole numbers."})
+    if concurrency is not None and not (1 <= concurrency <= config.LLM_GLOBAL_CONCURRENCY):
         return JSONResponse(
-            {"status": "error", "message": "A generation process is already running."}
+            {"status": "error", "message": f"Concurrency must be between 1 and {config.LLM_GLOBAL_CONCURRENCY}."}
         )
+    if seed is not None and not (0 <= seed <= _MAX_SEED):
+        return JSONResponse({"status": "error", "message": f"Seed must be between 0 and {_MAX_SEED}."})
 
-    api_key = data.get("api_key")
-    num_files = int(data.get("num_files", 1))
+    from app.services.renderers import parse_formats
+    try:
+        formats = parse_formats(data.get("formats"))
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)})
 
-    if not (1 <= num_files <= 20):
+    if not (1 <= num_files <= config.MAX_FILES_PER_JOB):
         return JSONResponse(
             {
                 "status": "error",
-                "message": "File count must be between 1 and 20 to respect API rate limits.",
+                "message": f"File count must be between 1 and {config.MAX_FILES_PER_JOB} to respect API rate limits.",
             }
         )
 
     if not api_key:
         return JSONResponse({"status": "error", "message": "API Key is required."})
 
-    from app.services.ai_service import AIService
-    if not AIService.verify_api_key(api_key):
+    from app.services.async_ai_service import AsyncAIService
+    if not await engine_loop.run_async(AsyncAIService.verify_api_key(api_key)):
         return JSONResponse({"status": "error", "message": "Mã API Key không hợp lệ hoặc đã hết hạn từ Cerebras Cloud."})
 
-    background_tasks.add_task(DocumentGenerationWorkflow.run, api_key, num_files)
-    return JSONResponse({"status": "success", "message": "Generation started."})
+    try:
+        job_id = await asyncio.to_thread(
+            job_manager.submit,
+            api_key,
+            num_files,
+            concurrency,
+            seed,
+            formats,
+            bool(data.get("combine_pdf")),
+        )
+    except JobQueueFullError as e:
+        return JSONResponse({"status": "error", "message": str(e)})
+
+    return JSONResponse({"status": "success", "message": "Generation started.", "job_id": job_id})
+
+
+@router.head("/api/status/{job_id}")
+@router.get("/api/status/{job_id}")
+def get_status(job_id: str, since_version: Optional[int] = None):
+    """A job's public status, or only what changed after `since_version`."""
+    state = job_manager.get(job_id)
+    if state is None:
+        return _job_not_found(job_id)
+    if since_version is not None:
+        return JSONResponse(state.changes_since(since_version))
+    return JSONResponse(state.get_public_status())
+
+
+@router.get("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/api/cache")
+def cache_stats():
+    from app.services.cache_service import get_cache
+
+    cache = get_cache()
+    if cache is None:
+        return JSONResponse({"enabled": False})
+    return JSONResponse({"enabled": True, **cache.stats()})
+
+
+_TERMINAL_STATUSES = ("finished", "cancelled")
+
+
+def _is_terminal(event: dict) -> bool:
+    return event["type"] == "status" and event["data"]["status"] in _TERMINAL_STATUSES
 
 
-@router.head("/api/status")
-@router.get("/api/status")
-def get_status():
-    return JSONResponse(global_state.get_public_status())
+def _sse(event_type: str, event_id: int, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
-@router.post("/api/reset")
-def reset_status():
-    if not global_state.is_currently_running:
-        global_state.reset()
+@router.get("/api/events/{job_id}")
+async def stream_events(job_id: str, request: Request, last_event_id: str = None):
+    """Server-Sent Events stream of a job's progress.
+
+    Sends a `snapshot` first (or the missed events when resuming with
+    Last-Event-ID), then `message`, `progress` and `status` deltas until the
+    job finishes. Slow clients are resynced with a fresh snapshot.
+    """
+    state = await asyncio.to_thread(job_manager.get, job_id)
+    if state is None:
+        return _job_not_found(job_id)
+
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    try:
+        resume_from = int(resume_from) if resume_from else None
+    except ValueError:
+        resume_from = None
+
+    async def event_stream():
+        sub, backlog, snapshot = state.subscribe(resume_from, max_queue=config.SSE_QUEUE_SIZE)
+        try:
+            yield "retry: 3000\n\n"
+            last_sent = resume_from or 0
+            if snapshot is not None:
+                last_sent = snapshot.pop("event_id")
+                yield _sse("snapshot", last_sent, snapshot)
+                if snapshot["status"] in _TERMINAL_STATUSES:
+                    return
+            for event in backlog:
+                last_sent = event["id"]
+                yield _sse(event["type"], event["id"], event["data"])
+                if _is_terminal(event):
+                    return
+
+            while not await request.is_disconnected():
+                if sub.lagged:
+                    snapshot = state.snapshot()
+                    sub.lagged = False
+                    last_sent = snapshot.pop("event_id")
+                    yield _sse("snapshot", last_sent, snapshot)
+                    if snapshot["status"] in _TERMINAL_STATUSES:
+                        return
+                    continue
+
+                event = await sub.get(timeout=config.SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event["id"] > last_sent:
+                    last_sent = event["id"]
+                    yield _sse(event["type"], event["id"], event["data"])
+                    if _is_terminal(event):
+                        return
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/api/cancel/{job_id}")
+def cancel_job(job_id: str):
+    if not job_manager.cancel(job_id):
+        return _job_not_found(job_id)
+    return JSONResponse({"status": "success", "message": "Cancellation requested."})
+
+
+@router.post("/api/reset/{job_id}")
+def reset_status(job_id: str):
+    job_manager.remove(job_id)
     return JSONResponse({"status": "success", "message": "State reset."})
+
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def _iter_file(path: str, start: int, length: int, chunk_size: int = 256 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@router.get("/api/download/{job_id}")
+def download_archive(job_id: str, request: Request):
+    from app.services.storage_service import StorageService
+
+    found = StorageService.get_backend("local").open(job_id)
+    if found is None:
+        return _job_not_found(job_id)
+    path, filename = found
+    size = os.path.getsize(path)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    start, end = 0, size - 1
+    status_code = 200
+
+    range_header = request.headers.get("range")
+    if range_header:
+        match = _RANGE_RE.match(range_header.strip())
+        if match is None or match.groups() == ("", ""):
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))  # Suffix range: the last N bytes
+        if start > end or start >= size:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status_code = 206
+
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        media_type="application/zip",
+        headers=headers,
+    )
@@ -0,0 +1,131 @@
+"""Generate documents from the command line, without the web server.
+
+    CEREBRAS_API_KEY=... python -m app.cli --count 2000 --output out/ --concurrency 8
+    python -m app.cli --topics-file topics.txt --output batch.zip --formats pdf,html
+    python -m app.cli --output out/ --resume
+
+Documents are written to the output directory (or packed into the .zip at
+the end) as they finish; see app.core.batch for the journal, resuming and
+manifest.json. Ctrl+C stops the batch, keeping every finished document; run
+again with --resume to continue.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from app.core import config
+from app.core.batch import Batch
+from app.core.event_loop import engine_loop
+from app.models.state import GenerationState
+from app.services.render_pool import render_pool
+
+
+def _read_topics(path: str) -> List[str]:
+    """One topic per line; blank lines and lines starting with "#" are skipped."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _report_progress(state: GenerationState, stop: threading.Event, interval: float, verbose: bool):
+    """Print progress (and with `verbose` every message) to stderr until `stop` is set."""
+    version, last_line = 0, 0.0
+    while True:
+        stopping = stop.wait(1.0)
+        delta = state.changes_since(version)
+        version = delta["version"]
+        if verbose:
+            for message in delta.get("messages", ()):
+                print(message, file=sys.stderr)
+        now = time.monotonic()
+        changed = "completed" in delta or "failed" in delta
+        if stopping or (changed and now - last_line >= interval):
+            status = state.get_public_status()
+            usage = status["usage"]
+            done = status["completed"] + status["failed"]
+            line = f"[{done}/{status['total']}] {status['completed']} ok, {status['failed']} failed"
+            if usage["documents_per_minute"]:
+                line += f", {usage['documents_per_minute']:.1f} docs/min"
+                remaining = status["total"] - done
+                if remaining > 0:
+                    seconds = round(remaining * 60 / usage["documents_per_minute"])
+                    line += f", ~{seconds // 3600}h{seconds // 60 % 60:02d}m{seconds % 60:02d}s left"
+            if usage["cost_usd"]:
+                line += f", ${usage['cost_usd']:.4f}"
+            print(line, file=sys.stderr)
+            last_line = now
+        if stopping:
+            return
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, help="Number of documents (default: one per topic in --topics-file)")
+    parser.add_argument("--topics-file", help="Topics, one per line; the AI plans topics beyond them")
+    parser.add_argument("--output", required=True, help="Output directory, or an archive ending in .zip")
+    parser.add_argument("--concurrency", type=int, help=f"LLM requests in flight (default {config.LLM_CONCURRENCY})")
+    parser.add_argument("--formats", help="Comma-separated output formats (default pdf)")
+    parser.add_argument("--seed", type=int, help="Make the batch reproducible (and cacheable)")
+    parser.add_argument("--api-key", default=config.CEREBRAS_API_KEY, help="Default: $CEREBRAS_API_KEY")
+    parser.add_argument("--resume", action="store_true", help="Continue the batch already in --output")
+    parser.add_argument("--progress-seconds", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every progress message")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or CEREBRAS_API_KEY)")
+
+    try:
+        topics = _read_topics(args.topics_file) if args.topics_file else []
+        batch = Batch(args.output, args.count, topics, args.seed, args.formats, args.resume)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    from app.services.async_ai_service import AsyncAIService
+    if not engine_loop.run(AsyncAIService.verify_api_key(args.api_key)):
+        batch.close()
+        print("The API key was rejected by Cerebras Cloud.", file=sys.stderr)
+        return 1
+
+    render_pool.warm()
+    stop = threading.Event()
+    reporter = threading.Thread(
+        target=_report_progress, args=(batch.state, stop, args.progress_seconds, args.verbose), daemon=True
+    )
+    reporter.start()
+    future = engine_loop.submit(batch.generate(args.api_key, args.concurrency))
+    try:
+        while True:
+            try:
+                future.result()
+                break
+            except KeyboardInterrupt:
+                if batch.state.cancelled:
+                    raise  # Second Ctrl+C: don't wait for the manifest either
+                print("Stopping; finished documents are kept (Ctrl+C again to quit now)...", file=sys.stderr)
+                batch.state.cancel()
+        manifest = batch.finish()
+    except BaseException:
+        batch.close()
+        raise
+    finally:
+        stop.set()
+        reporter.join()
+        render_pool.shutdown()
+
+    summary = {key: manifest[key] for key in ("status", "output", "num_files", "completed", "failed")}
+    summary["manifest"] = batch.manifest_path
+    summary["cost_usd"] = manifest["usage"]["cost_usd"]
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if manifest["completed"] == manifest["num_files"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
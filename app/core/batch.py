@@ -0,0 +1,273 @@
+"""Offline batches: generate many documents straight to disk, without the web server.
+
+    from app.core.batch import run_batch
+    manifest = run_batch(api_key, "out/", num_files=2000, concurrency=8)
+
+A batch writes every document into an output directory as soon as it is
+rendered. With an output ending in ".zip" the files are staged in a sibling
+"<name>.parts" directory and packed into the archive at the end.
+
+Progress is journaled to "manifest.jsonl" (one JSON line per planned topic
+and per finished document), so an interrupted batch resumes with only the
+missing documents (`resume=True`). The finished batch is summarized in
+"manifest.json": parameters, per-document files and timings, stage timings
+and token usage. For an archive both sit next to it as "<name>.manifest.json(l)".
+
+Unlike jobs from /api/start, batches have no file limit and don't go
+through the JobManager queue, its shared limiters or the upload to tmpfiles.org.
+"""
+import datetime
+import json
+import os
+import shutil
+import threading
+import uuid
+import zipfile
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.event_loop import engine_loop
+from app.models.state import GenerationState
+from app.services.archive_service import DirectoryWriter
+from app.services.renderers import DEFAULT_FORMATS, parse_formats
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class Batch:
+    """One offline batch: where its files go, its journal and its manifest.
+
+    Also serves as the workflow's checkpoint (same methods as JobCheckpoint),
+    so resuming works the way it does for jobs in the JobStore.
+    """
+
+    def __init__(
+        self,
+        output: str,
+        num_files: Optional[int] = None,
+        topics: Sequence[str] = (),
+        seed: Optional[int] = None,
+        formats: Optional[Sequence[str]] = None,
+        resume: bool = False,
+    ):
+        output = os.path.abspath(output)
+        if output.lower().endswith(".zip"):
+            stem = output[:-4]
+            self.archive_path: Optional[str] = output
+            self.files_dir = stem + ".parts"
+            self.manifest_path = stem + ".manifest.json"
+        else:
+            self.archive_path = None
+            self.files_dir = output
+            self.manifest_path = os.path.join(output, "manifest.json")
+        self.journal_path = self.manifest_path + "l"
+
+        self._lock = threading.Lock()
+        self._topics: Dict[int, str] = {}
+        self._documents: Dict[int, dict] = {}
+        header = self._load_journal() if os.path.exists(self.journal_path) else None
+        fresh = header is None
+        if not fresh and not resume:
+            raise FileExistsError(f"{self.journal_path} already holds a batch; resume it or pick another output")
+
+        if fresh:
+            topics = [t.strip() for t in topics if t.strip()]
+            header = {
+                "type": "batch",
+                "batch_id": uuid.uuid4().hex,
+                "created_at": _now(),
+                "num_files": num_files or len(topics),
+                "formats": list(parse_formats(formats or DEFAULT_FORMATS)),
+                "seed": seed,
+                "topics": topics,
+            }
+            if header["num_files"] < 1:
+                raise ValueError("A batch needs a number of files or a list of topics")
+        else:
+            for name, value in (("num_files", num_files), ("seed", seed)):
+                if value is not None and value != header[name]:
+                    raise ValueError(f"Cannot resume with {name}={value}: the batch was started with {header[name]}")
+            if formats is not None and list(parse_formats(formats)) != header["formats"]:
+                raise ValueError(f"Cannot resume with other formats than {','.join(header['formats'])}")
+
+        self.batch_id: str = header["batch_id"]
+        self.created_at: str = header["created_at"]
+        self.num_files: int = header["num_files"]
+        self.formats: Tuple[str, ...] = tuple(header["formats"])
+        self.seed: Optional[int] = header["seed"]
+        self.given_topics: List[str] = header["topics"]
+
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        self.writer = DirectoryWriter(self.files_dir)
+        self.state = GenerationState(self.batch_id)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if fresh:
+            self._append(header)
+
+    def _load_journal(self) -> Optional[dict]:
+        """Read back the header, planned topics and finished documents of an earlier run."""
+        header = None
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Cut short by a crash
+                kind = record.pop("type", None)
+                if kind == "batch":
+                    header = record
+                elif kind == "topic":
+                    self._topics[record["index"]] = record["topic"]
+                elif kind == "document":
+                    self._documents[record["index"]] = record
+        return header
+
+    def _append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._journal.write(line + "\n")
+            self._journal.flush()
+
+    # Checkpoint interface (see app.core.job_store.JobCheckpoint)
+
+    def topics(self) -> Dict[int, str]:
+        return dict(self._topics)
+
+    def save_topic(self, index: int, topic: str):
+        self._topics[index] = topic
+        self._append({"type": "topic", "index": index, "topic": topic})
+
+    def completed(self) -> List[int]:
+        """Journaled documents whose files are all still on disk (or in the archive).
+
+        The others are generated again, so what is left of their files is
+        deleted rather than kept next to the new ones.
+        """
+        present = set(os.listdir(self.files_dir)) | set(self._archived())
+        done = [i for i, doc in self._documents.items() if all(name in present for name in doc["files"])]
+        for index in set(self._documents) - set(done):
+            for name in self._documents.pop(index)["files"]:
+                self.writer.remove(name)
+        return done
+
+    def contents(self) -> List[Tuple[int, str, str]]:
+        return []  # Batches don't make a combined PDF
+
+    def iter_files(self) -> Iterator[Tuple[int, str, bytes]]:
+        return iter(())  # Already on disk
+
+    def save_document(self, index: int, full_topic: str, content: str, files: Mapping[str, bytes]):
+        stats = self.state.document_stats(index) or {}
+        stats.pop("index", None)
+        record = {
+            "index": index,
+            "topic": self._topics.get(index) or self._given(index),
+            "title": full_topic,
+            "files": [self.writer.written.get(name, name) for name in files],
+            "finished_at": _now(),
+            "stats": stats,
+        }
+        self._documents[index] = record
+        self._append({"type": "document", **record})
+
+    def _given(self, index: int) -> Optional[str]:
+        return self.given_topics[index - 1] if index <= len(self.given_topics) else None
+
+    def _archived(self) -> List[str]:
+        if self.archive_path is None or not os.path.exists(self.archive_path):
+            return []
+        with zipfile.ZipFile(self.archive_path) as zf:
+            return zf.namelist()
+
+    async def generate(self, api_key: str, concurrency: Optional[int] = None) -> GenerationState:
+        """Run the missing documents through DocumentGenerationWorkflow (on the engine loop)."""
+        from app.core.workflow import DocumentGenerationWorkflow
+
+        return await DocumentGenerationWorkflow.run_async(
+            api_key,
+            self.num_files,
+            concurrency,
+            state=self.state,
+            seed=self.seed,
+            checkpoint=self,
+            formats=self.formats,
+            topics=self.given_topics,
+            output=self.writer,
+            upload=False,
+        )
+
+    def _pack(self):
+        """Write the staged files (and those of an earlier archive) into the archive."""
+        staged = set(os.listdir(self.files_dir))
+        previous = zipfile.ZipFile(self.archive_path) if os.path.exists(self.archive_path) else None
+        partial = self.archive_path + ".part"
+        try:
+            with zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED) as zf:
+                archived = set(previous.namelist()) if previous is not None else set()
+                for index in sorted(self._documents):
+                    for name in self._documents[index]["files"]:
+                        if name in staged:
+                            zf.write(os.path.join(self.files_dir, name), name)
+                        elif name in archived:
+                            zf.writestr(previous.getinfo(name), previous.read(name))
+        finally:
+            if previous is not None:
+                previous.close()
+        os.replace(partial, self.archive_path)
+        shutil.rmtree(self.files_dir, ignore_errors=True)
+
+    def finish(self) -> dict:
+        """Pack the archive (if any), write manifest.json and return it."""
+        if self.archive_path is not None:
+            self._pack()
+        status = self.state.get_public_status()
+        manifest = {
+            "batch_id": self.batch_id,
+            "status": status["status"],
+            "created_at": self.created_at,
+            "finished_at": _now(),
+            "output": self.archive_path or self.files_dir,
+            "num_files": self.num_files,
+            "formats": list(self.formats),
+            "seed": self.seed,
+            "completed": len(self._documents),
+            "failed": status["failed"],
+            "timings": status["timings"],
+            "usage": status["usage"],
+            "documents": [self._documents[i] for i in sorted(self._documents)],
+        }
+        partial = self.manifest_path + ".part"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(partial, self.manifest_path)
+        self.close()
+        return manifest
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
+
+
+def run_batch(
+    api_key: str,
+    output: str,
+    num_files: Optional[int] = None,
+    topics: Sequence[str] = (),
+    concurrency: Optional[int] = None,
+    seed: Optional[int] = None,
+    formats: Optional[Sequence[str]] = None,
+    resume: bool = False,
+) -> dict:
+    """Generate a batch into `output` (a directory, or an archive ending in ".zip").
+
+    Blocks until every document is done and returns the manifest. Give
+    `num_files`, `topics` or both (topics first, the AI plans the rest).
+    """
+    batch = Batch(output, num_files, topics, seed, formats, resume)
+    try:
+        engine_loop.run(batch.generate(api_key, concurrency))
+    except BaseException:
+        batch.close()
+        raise
+    return batch.finish()
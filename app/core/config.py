@@ -0,0 +1,108 @@
+import os
+import tempfile
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Number of LLM requests a single batch keeps in flight at the same time.
+LLM_CONCURRENCY = max(1, _int_env("LLM_CONCURRENCY", 4))
+
+# Upper bound on files per /api/start request.
+MAX_FILES_PER_JOB = max(1, _int_env("MAX_FILES_PER_JOB", 20))
+
+# Starting refill rate (requests/second) of the per-key adaptive rate limiter.
+# It is halved on 429s and follows the x-ratelimit-* response headers.
+LLM_RATE_PER_SEC = max(0.05, float(os.getenv("LLM_RATE_PER_SEC", "1.0") or 1.0))
+LLM_MAX_RETRIES = max(0, _int_env("LLM_MAX_RETRIES", 4))
+LLM_TIMEOUT_SECONDS = max(1, _int_env("LLM_TIMEOUT_SECONDS", 120))
+
+# Models: LLM_MODEL writes the articles (and is the one API keys are checked
+# against), LLM_TOPICS_MODEL plans topics. An optional LLM_FALLBACK_MODEL takes
+# over for LLM_MODEL_COOLDOWN_SECONDS after a model was throttled or took more
+# than LLM_SLOW_SECONDS. Completion budgets are sized per request up to
+# LLM_MAX_COMPLETION_TOKENS. LLM_PRICES ("model=in/out,...", USD per million
+# tokens) feeds the per-job cost report.
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3.1-8b")
+LLM_TOPICS_MODEL = os.getenv("LLM_TOPICS_MODEL", "") or LLM_MODEL
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+LLM_MAX_COMPLETION_TOKENS = max(1, _int_env("LLM_MAX_COMPLETION_TOKENS", 4096))
+LLM_SLOW_SECONDS = max(1, _int_env("LLM_SLOW_SECONDS", 90))
+LLM_MODEL_COOLDOWN_SECONDS = max(1, _int_env("LLM_MODEL_COOLDOWN_SECONDS", 60))
+LLM_PRICES = os.getenv("LLM_PRICES", "")
+
+# How long an API key check at /api/start is trusted, for accepted and for
+# rejected keys. A 401 during generation marks the key rejected right away.
+API_KEY_CACHE_SECONDS = max(0, _int_env("API_KEY_CACHE_SECONDS", 300))
+API_KEY_REJECT_CACHE_SECONDS = max(0, _int_env("API_KEY_REJECT_CACHE_SECONDS", 30))
+
+# Stream document completions token by token (reports time-to-first-token and
+# tokens/sec per document, and salvages a stream cut off by a dropped connection
+# instead of re-asking).
+LLM_STREAMING = _bool_env("LLM_STREAMING", True)
+
+# PDF render worker processes; 0 renders on a thread inside the web process.
+RENDER_WORKERS = max(0, _int_env("RENDER_WORKERS", min(os.cpu_count() or 1, 4)))
+
+# Keep TrueType hinting instructions in embedded fonts. Off by default: PDF
+# viewers barely use them and they are about half of the embedded font data.
+PDF_FONT_HINTING = _bool_env("PDF_FONT_HINTING", False)
+
+# Multi-job scheduling: jobs running at once, jobs accepted (running + queued),
+# and LLM / PDF render slots shared fairly between running jobs.
+MAX_CONCURRENT_JOBS = max(1, _int_env("MAX_CONCURRENT_JOBS", 2))
+MAX_PENDING_JOBS = max(1, _int_env("MAX_PENDING_JOBS", 50))
+LLM_GLOBAL_CONCURRENCY = max(1, _int_env("LLM_GLOBAL_CONCURRENCY", LLM_CONCURRENCY * 2))
+RENDER_CONCURRENCY = max(1, _int_env("RENDER_CONCURRENCY", RENDER_WORKERS or os.cpu_count() or 1))
+
+# Finished jobs (and their status) are dropped this many seconds after they end.
+JOB_TTL_SECONDS = max(1, _int_env("JOB_TTL_SECONDS", 1800))
+
+# ZIP archives stay in memory up to this size, then spill to a temp file.
+ARCHIVE_SPOOL_BYTES = max(0, _int_env("ARCHIVE_SPOOL_BYTES", 8 * 1024 * 1024))
+
+# Where finished archives go: "tmpfiles" (tmpfiles.org) or "local" (served
+# from ARTIFACT_DIR by /api/download/{job_id} and deleted after the TTL).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "tmpfiles")
+TMPFILES_UPLOAD_URL = os.getenv("TMPFILES_UPLOAD_URL", "https://tmpfiles.org/api/v1/upload")
+UPLOAD_CONNECT_TIMEOUT_SECONDS = max(1, _int_env("UPLOAD_CONNECT_TIMEOUT_SECONDS", 10))
+UPLOAD_READ_TIMEOUT_SECONDS = max(1, _int_env("UPLOAD_READ_TIMEOUT_SECONDS", 120))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "cerebras-pdf-gen"))
+ARTIFACT_TTL_SECONDS = max(1, _int_env("ARTIFACT_TTL_SECONDS", 3600))
+
+# Server-Sent Events: per-client event queue before a slow client is resynced,
+# and the keepalive comment interval.
+SSE_QUEUE_SIZE = max(1, _int_env("SSE_QUEUE_SIZE", 100))
+SSE_KEEPALIVE_SECONDS = max(1, _int_env("SSE_KEEPALIVE_SECONDS", 15))
+
+# Opt-in cache for seeded LLM generations and rendered PDFs: an in-memory LRU
+# in front of a disk tier (CACHE_DISK_BYTES=0 keeps it memory-only).
+CACHE_ENABLED = _bool_env("CACHE_ENABLED", False)
+CACHE_MEMORY_BYTES = max(0, _int_env("CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "cerebras-pdf-gen-cache"))
+CACHE_DISK_BYTES = max(0, _int_env("CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+
+# Durable job queue (SQLite). When JOB_STORE_PATH is set, jobs and each
+# completed document are checkpointed there and unfinished jobs resume after a
+# restart. API keys are only written to it with JOB_STORE_PERSIST_KEYS (or in
+# external worker mode); otherwise a resumed job uses CEREBRAS_API_KEY, or just
+# packages the documents it already has. JOB_WORKER_MODE=external leaves
+# generation to `python -m app.worker` processes sharing the same store.
+# Stored keys are in PLAINTEXT until their job ends: the store file is created
+# readable by its owner only, and must be protected like a secrets file.
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "")
+JOB_STORE_PERSIST_KEYS = _bool_env("JOB_STORE_PERSIST_KEYS", False)
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "inline")
+JOB_LEASE_SECONDS = max(5, _int_env("JOB_LEASE_SECONDS", 30))
+CEREBRAS_API_KEY = os.getenv("CEREBRAS_API_KEY", "")
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class EngineLoop:
+    """A single long-lived asyncio loop running on a daemon thread.
+
+    Async HTTP connection pools and rate limiters are bound to the loop that
+    created them, so all generation work is scheduled here to keep them warm
+    across jobs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="engine-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the engine loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Block the calling (non-engine) thread until the coroutine finishes."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("EngineLoop.run() cannot be called from the engine loop itself")
+        return self.submit(coro).result(timeout)
+
+    async def run_async(self, coro: Coroutine) -> Any:
+        """Await a coroutine on the engine loop from another event loop."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+
+engine_loop = EngineLoop()
@@ -0,0 +1,370 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.core import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    num_files INTEGER NOT NULL,
+    concurrency INTEGER,
+    seed INTEGER,
+    formats TEXT,
+    combine_pdf INTEGER NOT NULL DEFAULT 0,
+    api_key TEXT,
+    owner TEXT,
+    lease_until REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS topics (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS documents (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    full_topic TEXT,
+    content TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS document_files (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (job_id, idx, filename)
+);
+"""
+_SCHEMA_VERSION = 1
+
+_UNFINISHED = ("queued", "running")
+_CHECKPOINT_TABLES = ("topics", "documents", "document_files")
+
+
+def worker_id() -> str:
+    """Identifies this process as a lease owner."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobStore:
+    """SQLite-backed durable job queue and checkpoint store.
+
+    Holds every job's parameters and last progress snapshot, the planned
+    topics, and each completed document (markdown and output files) until the job
+    finishes, so an interrupted batch resumes after its last completed
+    document. Running jobs hold a lease that their owner renews; a job whose
+    lease ran out can be claimed by another process (see app.worker).
+
+    API keys handed to create_job are stored in plaintext (the workers need
+    them) until the job finishes or is cancelled. A new store file is created
+    readable and writable by its owner only; keep it that way.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Owner-only before SQLite writes anything (it may hold API keys);
+        # the -wal/-shm files get the same mode
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._migrate()
+
+    def _migrate(self):
+        """Create the schema in a new store. Later schema changes add upgrade steps here."""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+        try:
+            self._conn.executescript(
+                f"BEGIN IMMEDIATE;\n{_SCHEMA}\nPRAGMA user_version = {_SCHEMA_VERSION};\nCOMMIT;"
+            )
+        except BaseException:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def _execute(self, sql: str, params=()) -> int:
+        """Run a statement; returns the number of rows changed."""
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchone(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Jobs
+
+    def create_job(
+        self,
+        job_id: str,
+        num_files: int,
+        concurrency: Optional[int],
+        seed: Optional[int],
+        api_key: Optional[str],
+        owner: Optional[str] = None,
+        formats: Sequence[str] = ("pdf",),
+        combine_pdf: bool = False,
+    ):
+        """Record a new job. With an `owner` it is created already claimed."""
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (job_id, status, num_files, concurrency, seed, formats, combine_pdf, api_key,"
+            " owner, lease_until, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id, "running" if owner else "queued", num_files, concurrency, seed, ",".join(formats),
+                int(combine_pdf), api_key, owner, now + config.JOB_LEASE_SECONDS if owner else None, now, now,
+            ),
+        )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._fetchone(
+            "SELECT job_id, status, num_files, concurrency, seed, formats, combine_pdf, api_key,"
+            " cancel_requested, progress, finished_at FROM jobs WHERE job_id = ?",
+            (job_id,),
+        )
+        return _job_row(row) if row else None
+
+    def claim_job(self, owner: str, job_id: Optional[str] = None, force: bool = False) -> Optional[dict]:
+        """Take the oldest claimable job (or `job_id`) and return it, or None.
+
+        Queued jobs and running jobs with an expired lease are claimable;
+        `force` also takes running jobs whose lease is still valid (used when
+        a single-process deployment restarts).
+        """
+        now = time.time()
+        condition = "status = 'queued' OR (status = 'running' AND (? OR lease_until IS NULL OR lease_until < ?))"
+        params: list = [int(force), now]
+        if job_id is not None:
+            condition = f"job_id = ? AND ({condition})"
+            params.insert(0, job_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT job_id FROM jobs WHERE {condition} ORDER BY created_at LIMIT 1", params
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ?"
+                    " WHERE job_id = ?",
+                    (owner, now + config.JOB_LEASE_SECONDS, now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get_job(row[0])
+
+    def save_progress(self, job_id: str, owner: str, snapshot: dict) -> bool:
+        """Store a progress snapshot and renew the lease.
+
+        Returns whether a cancel was requested for the job.
+        """
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET progress = ?, lease_until = ?, updated_at = ? WHERE job_id = ? AND owner = ?",
+            (json.dumps(snapshot, ensure_ascii=False), now + config.JOB_LEASE_SECONDS, now, job_id, owner),
+        )
+        row = self._fetchone("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,))
+        return bool(row and row[0])
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Cancel a queued job outright, or flag a running one for its owner to stop."""
+        now = time.time()
+        with self._lock:
+            changed = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', api_key = NULL, updated_at = ?, finished_at = ?"
+                " WHERE job_id = ? AND status = 'queued'",
+                (now, now, job_id),
+            ).rowcount
+            changed += self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status = 'running'",
+                (now, job_id),
+            ).rowcount
+        return changed > 0
+
+    def finish_job(self, job_id: str, snapshot: dict):
+        """Mark a job done, store its final status and drop its checkpoints and key."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, progress = ?, api_key = NULL, owner = NULL, lease_until = NULL,"
+                    " updated_at = ?, finished_at = ? WHERE job_id = ?",
+                    (snapshot["status"], json.dumps(snapshot, ensure_ascii=False), now, now, job_id),
+                )
+                for table in _CHECKPOINT_TABLES:
+                    self._conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_job(self, job_id: str):
+        with self._lock:
+            for table in ("jobs",) + _CHECKPOINT_TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+
+    def unfinished_jobs(self) -> List[str]:
+        rows = self._fetchall(
+            "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", _UNFINISHED
+        )
+        return [row[0] for row in rows]
+
+    def count_pending(self) -> int:
+        row = self._fetchone("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", _UNFINISHED)
+        return row[0]
+
+    def purge_finished(self, older_than: float):
+        self._execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (older_than,)
+        )
+
+    # Checkpoints
+
+    def save_topic(self, job_id: str, index: int, topic: str):
+        self._execute(
+            "INSERT OR REPLACE INTO topics (job_id, idx, topic) VALUES (?, ?, ?)", (job_id, index, topic)
+        )
+
+    def load_topics(self, job_id: str) -> Dict[int, str]:
+        rows = self._fetchall("SELECT idx, topic FROM topics WHERE job_id = ?", (job_id,))
+        return dict(rows)
+
+    def save_document(
+        self, job_id: str, index: int, full_topic: str, content: str, files: Mapping[str, bytes]
+    ):
+        """Checkpoint a finished document and its output files (archive name -> bytes)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (job_id, idx, full_topic, content, completed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (job_id, index, full_topic, content, now),
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO document_files (job_id, idx, filename, data) VALUES (?, ?, ?, ?)",
+                    [(job_id, index, name, sqlite3.Binary(data)) for name, data in files.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def completed_documents(self, job_id: str) -> List[int]:
+        """Index of every checkpointed document, in order."""
+        rows = self._fetchall("SELECT idx FROM documents WHERE job_id = ? ORDER BY idx", (job_id,))
+        return [row[0] for row in rows]
+
+    def document_contents(self, job_id: str) -> List[Tuple[int, str, str]]:
+        """(index, full_topic, markdown) of every checkpointed document, in order."""
+        return self._fetchall(
+            "SELECT idx, full_topic, content FROM documents WHERE job_id = ? ORDER BY idx", (job_id,)
+        )
+
+    def iter_document_files(self, job_id: str) -> Iterator[Tuple[int, str, bytes]]:
+        """(index, filename, data) of every checkpointed file, one at a time."""
+        names = self._fetchall(
+            "SELECT idx, filename FROM document_files WHERE job_id = ? ORDER BY idx, filename", (job_id,)
+        )
+        for index, filename in names:
+            row = self._fetchone(
+                "SELECT data FROM document_files WHERE job_id = ? AND idx = ? AND filename = ?",
+                (job_id, index, filename),
+            )
+            if row is not None:
+                yield index, filename, bytes(row[0])
+
+
+class JobCheckpoint:
+    """One job's view of the JobStore, handed to the workflow."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def topics(self) -> Dict[int, str]:
+        return self.store.load_topics(self.job_id)
+
+    def save_topic(self, index: int, topic: str):
+        self.store.save_topic(self.job_id, index, topic)
+
+    def completed(self) -> List[int]:
+        return self.store.completed_documents(self.job_id)
+
+    def contents(self) -> List[Tuple[int, str, str]]:
+        return self.store.document_contents(self.job_id)
+
+    def iter_files(self) -> Iterator[Tuple[int, str, bytes]]:
+        return self.store.iter_document_files(self.job_id)
+
+    def save_document(self, index: int, full_topic: str, content: str, files: Mapping[str, bytes]):
+        self.store.save_document(self.job_id, index, full_topic, content, files)
+
+
+def _job_row(row) -> dict:
+    (
+        job_id, status, num_files, concurrency, seed, formats, combine_pdf, api_key,
+        cancel_requested, progress, finished_at,
+    ) = row
+    return {
+        "job_id": job_id,
+        "status": status,
+        "num_files": num_files,
+        "concurrency": concurrency,
+        "seed": seed,
+        "formats": tuple(formats.split(",")) if formats else ("pdf",),
+        "combine_pdf": bool(combine_pdf),
+        "api_key": api_key,
+        "cancel_requested": bool(cancel_requested),
+        "progress": json.loads(progress) if progress else None,
+        "finished_at": finished_at,
+    }
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> Optional[JobStore]:
+    """The shared store, or None when JOB_STORE_PATH is not set."""
+    global _store
+    if not config.JOB_STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(config.JOB_STORE_PATH)
+        return _store
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Sequence, Set
+
+from app.core import config, metrics
+from app.core.event_loop import engine_loop
+from app.core.job_store import JobCheckpoint, JobStore, get_job_store, worker_id
+from app.core.scheduler import FairLimiter
+from app.models.state import GenerationState
+from app.services.renderers import DEFAULT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# How often running jobs checkpoint their progress (and renew their lease),
+# and how often mirrored jobs are refreshed from the store.
+_SYNC_INTERVAL_SECONDS = 1.0
+# How often expired jobs are deleted from the store.
+_PURGE_INTERVAL_SECONDS = 60.0
+
+
+class JobQueueFullError(RuntimeError):
+    pass
+
+
+class JobManager:
+    """Owns every generation job and schedules them on the engine loop.
+
+    At most MAX_CONCURRENT_JOBS run at once; the rest wait in FIFO order.
+    Running jobs share LLM and render capacity through FairLimiters, and
+    finished jobs are forgotten JOB_TTL_SECONDS after they end.
+
+    With a JobStore (JOB_STORE_PATH) jobs are durable. The `role` decides who
+    runs them: "inline" runs them in this process and resumes unfinished ones
+    on start(); "external" only queues them in the store and mirrors the
+    progress reported by "worker" processes (see app.worker).
+    """
+
+    def __init__(self, role: Optional[str] = None, store: Optional[JobStore] = None):
+        self.store = store if store is not None else get_job_store()
+        self.role = role or ("external" if config.JOB_WORKER_MODE == "external" else "inline")
+        if self.role != "inline" and self.store is None:
+            raise RuntimeError(f"JobManager role {self.role!r} needs JOB_STORE_PATH to be set")
+        self.owner = worker_id()
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, GenerationState] = {}
+        self._running: Set[str] = set()  # Jobs this process runs (as opposed to mirrors)
+        self._job_slots: Optional[asyncio.Semaphore] = None
+        self._started = False
+        self._purged_at = 0.0  # Last purge of the store (monotonic)
+        self.llm_limiter = FairLimiter(config.LLM_GLOBAL_CONCURRENCY)
+        self.render_limiter = FairLimiter(config.RENDER_CONCURRENCY)
+
+    def submit(
+        self,
+        api_key: str,
+        num_files: int,
+        concurrency: Optional[int] = None,
+        seed: Optional[int] = None,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        combine_pdf: bool = False,
+    ) -> str:
+        """Queue a new job and return its ID."""
+        self.purge_expired()
+        with self._lock:
+            if self.role == "external":
+                pending = self.store.count_pending()
+            else:
+                pending = sum(1 for s in self._jobs.values() if not s.is_finished)
+            if pending >= config.MAX_PENDING_JOBS:
+                raise JobQueueFullError("Too many jobs are queued. Please try again later.")
+
+            job_id = uuid.uuid4().hex
+            state = GenerationState(job_id)
+            state.mark_queued(num_files)
+            self._jobs[job_id] = state
+            if self.role != "external":
+                self._running.add(job_id)
+
+        if self.store is not None:
+            external = self.role == "external"
+            stored_key = api_key if external or config.JOB_STORE_PERSIST_KEYS else None
+            self.store.create_job(
+                job_id, num_files, concurrency, seed, stored_key,
+                owner=None if external else self.owner, formats=formats, combine_pdf=combine_pdf,
+            )
+        self.start()
+        if self.role != "external":
+            engine_loop.submit(
+                self._run_job(state, api_key, num_files, concurrency, seed, formats, combine_pdf)
+            )
+        return job_id
+
+    def start(self):
+        """Start syncing with the store; inline managers also resume unfinished jobs."""
+        with self._lock:
+            if self.store is None or self._started:
+                return
+            self._started = True
+        engine_loop.submit(self._sync_loop())
+        if self.role == "inline":
+            self._recover()
+
+    def _recover(self):
+        """Resume jobs an earlier run of this (single-process) deployment left unfinished."""
+        for job_id in self.store.unfinished_jobs():
+            with self._lock:
+                if job_id in self._jobs:
+                    continue
+            row = self.store.claim_job(self.owner, job_id, force=True)
+            if row is not None:
+                logger.info("Resuming job %s", job_id)
+                self._start_claimed(row)
+
+    def _start_claimed(self, row: dict):
+        """Run a job claimed from the store."""
+        state = GenerationState(row["job_id"])
+        state.mark_queued(row["num_files"])
+        if row["cancel_requested"]:
+            state.cancel()
+        with self._lock:
+            self._jobs[row["job_id"]] = state
+            self._running.add(row["job_id"])
+        api_key = row["api_key"] or config.CEREBRAS_API_KEY or None
+        engine_loop.submit(
+            self._run_job(
+                state, api_key, row["num_files"], row["concurrency"], row["seed"],
+                row["formats"], row["combine_pdf"],
+            )
+        )
+
+    async def _run_job(
+        self,
+        state: GenerationState,
+        api_key: Optional[str],
+        num_files: int,
+        concurrency: Optional[int],
+        seed: Optional[int],
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        combine_pdf: bool = False,
+    ):
+        from app.core.workflow import DocumentGenerationWorkflow
+
+        if self._job_slots is None:
+            self._job_slots = asyncio.Semaphore(config.MAX_CONCURRENT_JOBS)
+
+        try:
+            async with self._job_slots:
+                if not state.is_finished:  # Not cancelled while queued
+                    await DocumentGenerationWorkflow.run_async(
+                        api_key,
+                        num_files,
+                        concurrency,
+                        state=state,
+                        llm_limiter=self.llm_limiter,
+                        render_limiter=self.render_limiter,
+                        seed=seed,
+                        formats=formats,
+                        combine_pdf=combine_pdf,
+                        checkpoint=JobCheckpoint(self.store, state.job_id) if self.store else None,
+                    )
+            # Only a job that ran to the end is finished in the store; one cut
+            # short by shutdown (CancelledError) stays resumable.
+            if self.store is not None:
+                await asyncio.to_thread(self.store.finish_job, state.job_id, state.snapshot())
+        finally:
+            with self._lock:
+                self._running.discard(state.job_id)
+
+    async def run_worker(self):
+        """Claim and run queued jobs from the store until cancelled (worker role)."""
+        self.start()
+        while True:
+            with self._lock:
+                running = len(self._running)
+            if running < config.MAX_CONCURRENT_JOBS:
+                row = await asyncio.to_thread(self.store.claim_job, self.owner)
+                if row is not None:
+                    logger.info("Claimed job %s", row["job_id"])
+                    self._start_claimed(row)
+                    continue
+            await asyncio.to_thread(self.purge_expired)
+            await asyncio.sleep(_SYNC_INTERVAL_SECONDS)
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._sync_once)
+                await asyncio.to_thread(self.purge_expired)
+            except Exception:
+                logger.exception("Job store sync failed")
+            await asyncio.sleep(_SYNC_INTERVAL_SECONDS)
+
+    def _sync_once(self):
+        with self._lock:
+            jobs = [(job_id, state, job_id in self._running) for job_id, state in self._jobs.items()]
+        for job_id, state, local in jobs:
+            if local:
+                if state.is_currently_running and self.store.save_progress(job_id, self.owner, state.snapshot()):
+                    state.cancel()
+            elif not state.is_finished:
+                self._refresh_mirror(job_id, state)
+
+    def _refresh_mirror(self, job_id: str, state: GenerationState) -> bool:
+        """Update a mirrored job from the store; False if it no longer exists."""
+        row = self.store.get_job(job_id)
+        if row is None:
+            return False
+        if row["progress"] is not None:
+            state.apply_snapshot(row["progress"])
+        if row["status"] == "cancelled":
+            state.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[GenerationState]:
+        self._forget_expired()  # In memory only: status polls don't write to the store
+        with self._lock:
+            state = self._jobs.get(job_id)
+        if state is not None or self.store is None:
+            return state
+
+        # Known to the store only: queued by another process, or from before a restart
+        row = self.store.get_job(job_id)
+        if row is None:
+            return None
+        state = GenerationState(job_id)
+        state.mark_queued(row["num_files"])
+        self._refresh_mirror(job_id, state)
+        self.start()
+        with self._lock:
+            return self._jobs.setdefault(job_id, state)
+
+    def cancel(self, job_id: str) -> bool:
+        state = self.get(job_id)
+        if state is None:
+            return False
+        state.cancel()
+        if self.store is not None:
+            self.store.request_cancel(job_id)
+        return True
+
+    def remove(self, job_id: str) -> bool:
+        """Forget a finished job early (e.g. once its archive was downloaded)."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None or not state.is_finished:
+                return False
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.delete_job(job_id)
+        return True
+
+    def purge_expired(self):
+        """Forget expired jobs, and delete them from the store every _PURGE_INTERVAL_SECONDS."""
+        cutoff = self._forget_expired()
+        if self.store is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._purged_at < _PURGE_INTERVAL_SECONDS:
+                return
+            self._purged_at = now
+        self.store.purge_finished(cutoff)
+
+    def _forget_expired(self) -> float:
+        """Drop jobs finished more than JOB_TTL_SECONDS ago from memory; returns that cutoff."""
+        cutoff = time.time() - config.JOB_TTL_SECONDS
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, state in self._jobs.items()
+                if state.is_finished and state.finished_at is not None and state.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return cutoff
+
+    @property
+    def active_jobs(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._jobs.values() if s.is_currently_running)
+
+    @property
+    def queued_jobs(self) -> int:
+        with self._lock:
+            return sum(1 for s in self._jobs.values() if s.status == "queued")
+
+
+job_manager = JobManager()
+
+metrics.JOBS_IN_FLIGHT.set_function(lambda: job_manager.active_jobs)
+metrics.JOBS_QUEUED.set_function(lambda: job_manager.queued_jobs)
+for _pool, _limiter in (("llm", job_manager.llm_limiter), ("render", job_manager.render_limiter)):
+    metrics.SLOTS_IN_USE.labels(_pool).set_function(lambda limiter=_limiter: limiter.in_use)
+    metrics.SLOTS_WAITING.labels(_pool).set_function(lambda limiter=_limiter: limiter.waiting)
@@ -0,0 +1,312 @@
+"""Prometheus-style metrics and optional OpenTelemetry spans.
+
+The registry is dependency-free and renders the Prometheus text exposition
+format for GET /metrics. Spans are emitted through OpenTelemetry when the
+`opentelemetry-api` package is installed (and configured by the deployment);
+otherwise `span()` is a no-op.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+# Seconds, spanning fast cache hits to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """The child metric for one combination of label values."""
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in sorted(children):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+    def _sample_lines(self, values, child) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._func: Optional[Callable[[], float]] = None
+
+    @property
+    def value(self) -> float:
+        if self._func is not None:
+            return float(self._func())
+        return self._value
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, func: Callable[[], float]):
+        """Compute the value at scrape time instead of tracking it."""
+        self._func = func
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, func: Callable[[], float]):
+        self._default().set_function(func)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry=None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _sample_lines(self, values, child) -> List[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}")
+        labels = _label_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """An OpenTelemetry span when the SDK is available, otherwise nothing."""
+    if _otel_trace is None:
+        yield None
+        return
+    tracer = _otel_trace.get_tracer("cerebras-pdf-gen")
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+_SIZE_BUCKETS = (16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6, 50e6, 100e6)
+_TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 3072, 4096, 8192)
+
+# LLM
+LLM_REQUEST_SECONDS = Histogram(
+    "pdfgen_llm_request_seconds", "Time for one successful LLM completion, by kind.", ["kind"]
+)
+LLM_TTFT_SECONDS = Histogram(
+    "pdfgen_llm_time_to_first_token_seconds", "Time to first streamed token, by kind.", ["kind"]
+)
+LLM_COMPLETION_TOKENS = Histogram(
+    "pdfgen_llm_completion_tokens", "Completion tokens per LLM response, by kind.", ["kind"],
+    buckets=_TOKEN_BUCKETS,
+)
+LLM_RETRIES = Counter(
+    "pdfgen_llm_retries_total", "LLM attempts that were retried, by reason.", ["reason"]
+)
+LLM_TRUNCATIONS = Counter(
+    "pdfgen_llm_truncations_total", "LLM responses cut off at max_completion_tokens, by kind.", ["kind"]
+)
+LLM_FAILURES = Counter(
+    "pdfgen_llm_failures_total", "LLM calls that gave up after retries, by reason.", ["reason"]
+)
+LLM_FALLBACKS = Counter(
+    "pdfgen_llm_fallbacks_total", "Requests moved to the next model after a 429, by kind.", ["kind"]
+)
+LLM_TOKENS = Counter(
+    "pdfgen_llm_tokens_total", "Tokens billed, by model and type (prompt/completion).", ["model", "type"]
+)
+LLM_COST_USD = Counter(
+    "pdfgen_llm_cost_usd_total", "Estimated LLM spend in USD (see LLM_PRICES), by model.", ["model"]
+)
+KEY_VERIFICATIONS = Counter(
+    "pdfgen_key_verifications_total", "API key checks at job start, by result.", ["result"]
+)
+LLM_JSON_REPAIRS = Counter(
+    "pdfgen_llm_json_repairs_total", "Responses whose JSON had to be repaired locally."
+)
+
+# Rendering and packaging
+PDF_RENDER_SECONDS = Histogram("pdfgen_pdf_render_seconds", "Time to render one PDF (cache misses).")
+PDF_BYTES = Histogram("pdfgen_pdf_bytes", "Size of rendered PDFs.", buckets=_SIZE_BUCKETS)
+RENDER_SECONDS = Histogram(
+    "pdfgen_render_seconds", "Renderer time for one document, by output format.", ["format"]
+)
+ZIP_ADD_SECONDS = Histogram("pdfgen_zip_add_seconds", "Time to add one PDF to the job archive.")
+UPLOAD_SECONDS = Histogram(
+    "pdfgen_upload_seconds", "Time to store a job archive, by backend.", ["backend"]
+)
+UPLOAD_BYTES = Histogram(
+    "pdfgen_upload_bytes", "Size of stored job archives.", ["backend"], buckets=_SIZE_BUCKETS
+)
+UPLOAD_FAILURES = Counter("pdfgen_upload_failures_total", "Failed archive uploads, by backend.", ["backend"])
+
+# Jobs
+DOCUMENTS = Counter("pdfgen_documents_total", "Documents processed, by outcome.", ["outcome"])
+JOBS = Counter("pdfgen_jobs_total", "Jobs that ended, by final status.", ["status"])
+TOPIC_PLANNING_SECONDS = Histogram("pdfgen_topic_planning_seconds", "Time to plan a job's topics.")
+JOBS_IN_FLIGHT = Gauge("pdfgen_jobs_in_flight", "Jobs currently generating.")
+JOBS_QUEUED = Gauge("pdfgen_jobs_queued", "Jobs accepted but waiting for a job slot.")
+SLOTS_IN_USE = Gauge("pdfgen_slots_in_use", "Shared LLM/render slots held, by pool.", ["pool"])
+SLOTS_WAITING = Gauge("pdfgen_slots_waiting", "Requests waiting for a shared slot, by pool.", ["pool"])
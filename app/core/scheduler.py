@@ -0,0 +1,69 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque
+
+
+class FairLimiter:
+    """Capacity limiter that hands freed slots to waiting jobs round-robin.
+
+    A plain semaphore is FIFO, so a 20-file batch that queues first would hold
+    every slot until it drains. Here each job has its own wait queue and a
+    released slot goes to the next job in rotation. Must be used on one loop.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._in_use = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        # list() copies atomically under the GIL, so metrics can read this from any thread
+        return sum(len(q) for q in list(self._waiters.values()))
+
+    async def acquire(self, job_id: str):
+        if self._in_use < self.capacity and not self._waiters:
+            self._in_use += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just before cancellation: pass it on.
+                self.release()
+            else:
+                queue = self._waiters.get(job_id)
+                if queue is not None and fut in queue:
+                    queue.remove(fut)
+                    if not queue:
+                        del self._waiters[job_id]
+            raise
+
+    def release(self):
+        while self._waiters:
+            job_id, queue = next(iter(self._waiters.items()))
+            fut = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(job_id)
+            else:
+                del self._waiters[job_id]
+            if not fut.done():
+                fut.set_result(None)  # The slot moves straight to this waiter
+                return
+        self._in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, job_id: str):
+        await self.acquire(job_id)
+        try:
+            yield
+        finally:
+            self.release()
@@ -1,71 +1,342 @@
-import traceback
-import io
-from app.models.state import global_state
-from app.services.ai_service import AIService
-from app.services.pdf_service import PDFService
+import asyncio
+import logging
+import time
+from contextlib import aclosing, contextmanager, nullcontext
+from typing import AsyncIterator, Dict, Optional, Sequence, Set, Tuple, Union
+from app.core import config, metrics
+from app.core.event_loop import engine_loop
+from app.core.job_store import JobCheckpoint
+from app.core.scheduler import FairLimiter
+from app.models.state import GenerationState
+from app.services.archive_service import DirectoryWriter, ZipArchiveWriter
+from app.services.async_ai_service import AsyncAIService
+from app.services.cache_service import ContentCache, get_cache
+from app.services.render_pool import render_pool
+from app.services.renderers import DEFAULT_FORMATS, RENDER_VERSION, RENDERERS, needs_reportlab
 from app.services.storage_service import StorageService
+from app.services.topic_planner import TopicPlanner
+
+logger = logging.getLogger(__name__)
 
 class DocumentGenerationWorkflow:
     @staticmethod
-    def run(api_key: str, num_files: int):
-        """Background task to sequence the generator calls."""
-        global_state.start_generation(num_files)
-        
-        try:
-            ai_service = AIService(api_key=api_key)
+    def run(
+        api_key: str,
+        num_files: int,
+        concurrency: Optional[int] = None,
+        seed: Optional[int] = None,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        combine_pdf: bool = False,
+    ) -> GenerationState:
+        """Blocking entry point: runs one batch on the engine loop and returns its state."""
+        state = GenerationState()
+        engine_loop.run(
+            DocumentGenerationWorkflow.run_async(
+                api_key, num_files, concurrency,
+                state=state, seed=seed, formats=formats, combine_pdf=combine_pdf,
+            )
+        )
+        return state
+
+    @staticmethod
+    async def run_async(
+        api_key: Optional[str],
+        num_files: int,
+        concurrency: Optional[int] = None,
+        state: Optional[GenerationState] = None,
+        llm_limiter: Optional[FairLimiter] = None,
+        render_limiter: Optional[FairLimiter] = None,
+        seed: Optional[int] = None,
+        checkpoint: Optional[JobCheckpoint] = None,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        combine_pdf: bool = False,
+        topics: Sequence[str] = (),
+        output: Union[ZipArchiveWriter, DirectoryWriter, None] = None,
+        upload: bool = True,
+    ) -> GenerationState:
+        """Sequence the generator calls for one batch.
+
+        Topics come from TopicPlanner and each document starts as soon as its
+        topic is planned. Up to `concurrency` LLM requests are kept in flight;
+        each finished document is rendered to every requested output format
+        (see app.services.renderers) as soon as it arrives. The optional
+        limiters are shared with other jobs (see JobManager). A `seed` makes
+        the batch reproducible (document i uses seed + i) and cacheable.
 
-            global_state.add_message(f"Asking AI to invent {num_files} distinct topics...")
-            topic_areas = ai_service.generate_topics(num_files)
-            global_state.add_message(f"Successfully drew {len(topic_areas)} distinct topics from AI.")
+        With `combine_pdf` every document goes into one bookmarked PDF rendered
+        at the end (sharing one font embedding) instead of a PDF per document.
 
-            for i in range(1, num_files + 1):
-                if not global_state.is_currently_running:
-                    break
+        With a `checkpoint` (see JobStore) planned topics and finished documents
+        are saved as they happen, and a resumed batch only generates what is
+        missing. Without an `api_key` only the checkpointed documents are packaged.
 
-                current_topic = topic_areas[i - 1]
-                global_state.add_message(f"Generating file {i}/{num_files}: {current_topic}...")
+        `topics` gives the topics of the first documents up front (the rest are
+        planned by the AI). Files go into `output` (a new ZipArchiveWriter by
+        default), which is uploaded at the end unless `upload` is False.
+        """
+        if state is None:
+            state = GenerationState()
+        state.start_generation(num_files)
+        archive = output if output is not None else ZipArchiveWriter()
+        # Per-document formats; a combined PDF replaces the individual ones
+        per_document = [name for name in formats if not (combine_pdf and name == "pdf")]
+        # Index -> (title, markdown) for the combined PDF
+        combined: Optional[Dict[int, Tuple[str, str]]] = {} if combine_pdf else None
 
+        try:
+            done = await DocumentGenerationWorkflow._restore(state, archive, checkpoint, combined)
+            remaining = num_files - len(done)
+
+            if remaining and api_key is None:
+                state.add_message(f"No API key to resume with; packaging the {len(done)} finished files.")
+            elif remaining:
+                ai_service = AsyncAIService(api_key=api_key, on_usage=state.record_usage)
+                concurrency = max(1, min(concurrency or config.LLM_CONCURRENCY, remaining))
+
+                # Documents start as soon as their topic is planned
+                llm_slots = asyncio.Semaphore(concurrency)
+                pending = set()
                 try:
-                    full_topic, base_filename, content = ai_service.generate_single_document_content(current_topic)
-                    
-                    pdf_buffer = io.BytesIO()
-                    success = PDFService.create_pdf(pdf_buffer, content)
-                    
-                    if success:
-                        pdf_bytes = pdf_buffer.getvalue()
-                        pdf_buffer.close()
-                        
-                        global_state.increment_completed(f"{base_filename}.pdf", pdf_bytes)
-                        global_state.add_message(f"[{i}] Created: {base_filename}.pdf")
-                    else:
-                        raise RuntimeError("PDF writing failed internally")
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    traceback.print_exc()
-                    global_state.increment_failed()
-                    global_state.add_message(f"[{i}] Failed: {error_msg[:100]}")
+                    planned = 0
+                    with DocumentGenerationWorkflow._stage(state, "topics", metrics.TOPIC_PLANNING_SECONDS):
+                        planner = DocumentGenerationWorkflow._plan_topics(
+                            state, ai_service, checkpoint, num_files, done, seed, topics
+                        )
+                        async with aclosing(planner):
+                            async for i, topic in planner:
+                                if state.cancelled:
+                                    break
+                                planned += 1
+                                pending.add(asyncio.create_task(
+                                    DocumentGenerationWorkflow._process_document(
+                                        state, ai_service, archive, llm_slots, llm_limiter, render_limiter,
+                                        i, topic, None if seed is None else seed + i, checkpoint,
+                                        per_document, combined,
+                                    )
+                                ))
+                    state.add_message(f"Successfully drew {planned} distinct topics from AI.")
+
+                    while pending:
+                        _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        if state.cancelled:
+                            break
+                finally:
+                    for task in pending:
+                        task.cancel()
+                    # Let them unwind before the archive they write to is closed
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    ai_service.close()
+
+            if combined:
+                state.add_message(f"Combining {len(combined)} documents into one PDF...")
+                with DocumentGenerationWorkflow._stage(state, "combine"):
+                    async with DocumentGenerationWorkflow._slot(render_limiter, state):
+                        pdf_bytes = await render_pool.render_combined([combined[i] for i in sorted(combined)])
+                    name = archive.filename.rsplit(".", 1)[0] + ".pdf"
+                    await asyncio.to_thread(archive.add, name, pdf_bytes)
+                    del pdf_bytes
 
             # Upload phase if at least one file succeeded
-            status = global_state.get_public_status()
-            if status["completed"] > 0:
-                global_state.add_message(f"Zipping {status['completed']} files in memory...")
-                
+            status = state.get_public_status()
+            if upload and status["completed"] > 0:
+                state.add_message(f"Uploading archive with {status['completed']} files...")
+
                 try:
-                    pdf_data = global_state.get_and_clear_pdf_data()
-                    download_url = StorageService.upload_pdfs_as_zip(pdf_data)
-                    global_state.set_download_url(download_url)
-                    global_state.add_message(f"Upload successful! Direct URL: {download_url}")
+                    with DocumentGenerationWorkflow._stage(state, "upload"):
+                        download_url = await asyncio.to_thread(StorageService.upload_archive, archive, state.job_id)
+                    state.set_download_url(download_url)
+                    state.add_message(f"Upload successful! Direct URL: {download_url}")
                 except Exception as upload_err:
-                    global_state.add_message(f"Upload logic failed: {str(upload_err)}")
+                    logger.exception("Upload failed for job %s", state.job_id)
+                    state.add_message(f"Upload logic failed: {str(upload_err)}")
 
         except Exception as e:
-            traceback.print_exc()
+            logger.exception("Job %s failed", state.job_id)
             err_str = str(e)
             if "401" in err_str or "Wrong API Key" in err_str:
-                global_state.add_message("Lỗi: API Key không hợp lệ hoặc đã hết hạn.")
+                state.add_message("Lỗi: API Key không hợp lệ hoặc đã hết hạn.")
             else:
-                global_state.add_message(f"Lỗi khởi tạo hệ thống: {err_str[:80]}")
+                state.add_message(f"Lỗi khởi tạo hệ thống: {err_str[:80]}")
         finally:
-            global_state.stop_generation()
-            global_state.add_message("Process finished.")
+            archive.close()
+            state.add_message("Process finished.")
+            state.stop_generation()
+            metrics.JOBS.labels(state.get_public_status()["status"]).inc()
+
+        return state
+
+    @staticmethod
+    async def _restore(
+        state: GenerationState,
+        archive: ZipArchiveWriter,
+        checkpoint: Optional[JobCheckpoint],
+        combined: Optional[Dict[int, Tuple[str, str]]] = None,
+    ) -> Set[int]:
+        """Put the checkpointed documents of a resumed batch back into the archive."""
+        if checkpoint is None:
+            return set()
+
+        def restore() -> Set[int]:
+            for _, filename, data in checkpoint.iter_files():
+                archive.add(filename, data)
+            if combined is not None:
+                for i, full_topic, content in checkpoint.contents():
+                    combined[i] = (full_topic, content)
+            return set(checkpoint.completed())
+
+        done = await asyncio.to_thread(restore)
+        for _ in done:
+            state.increment_completed(restored=True)
+        if done:
+            state.add_message(f"Resuming: {len(done)} files were already generated.")
+        return done
+
+    @staticmethod
+    async def _plan_topics(
+        state: GenerationState,
+        ai_service: AsyncAIService,
+        checkpoint: Optional[JobCheckpoint],
+        num_files: int,
+        done: Set[int],
+        seed: Optional[int],
+        given: Sequence[str] = (),
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """(index, topic) for every unfinished document, given and saved topics first."""
+        saved = await asyncio.to_thread(checkpoint.topics) if checkpoint else {}
+        saved.update(enumerate(given[:num_files], 1))
+        todo = [i for i in range(1, num_files + 1) if i not in done]
+        for i in todo:
+            if i in saved:
+                yield i, saved[i]
+
+        fresh = [i for i in todo if i not in saved]
+        if not fresh:
+            return
+        state.add_message(f"Asking AI to invent {len(fresh)} distinct topics...")
+        async with aclosing(TopicPlanner(ai_service).plan(len(fresh), seed, exclude=saved.values())) as topics:
+            planned = 0
+            async for topic in topics:
+                i = fresh[planned]
+                if checkpoint is not None:
+                    await asyncio.to_thread(checkpoint.save_topic, i, topic)
+                yield i, topic
+                planned += 1
+                if planned == len(fresh):
+                    return
+
+    @staticmethod
+    @contextmanager
+    def _stage(state: GenerationState, name: str, histogram=None, **attributes):
+        """Time one pipeline stage into the job's timings (and `histogram`), inside a span.
+
+        Only stages that complete are recorded.
+        """
+        started = time.perf_counter()
+        with metrics.span(name, job_id=state.job_id or "", **attributes):
+            yield
+        elapsed = time.perf_counter() - started
+        state.record_timing(name, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed)
+
+    @staticmethod
+    def _slot(limiter: Optional[FairLimiter], state: GenerationState):
+        return limiter.slot(state.job_id or str(id(state))) if limiter else nullcontext()
+
+    @staticmethod
+    async def _render_files(
+        state: GenerationState, render_limiter: Optional[FairLimiter], content: str, formats: Sequence[str]
+    ) -> Dict[str, bytes]:
+        """Render markdown to every format, reusing cached renders of identical content.
+
+        Only renders that need ReportLab take a shared render slot.
+        """
+        cache = get_cache()
+        files: Dict[str, bytes] = {}
+        if cache is not None:
+            for name in formats:
+                key = ContentCache.make_key(name, RENDER_VERSION, content)
+                data = await asyncio.to_thread(cache.get, key)
+                if data is not None:
+                    files[name] = data
+
+        missing = [name for name in formats if name not in files]
+        if missing:
+            limiter = render_limiter if needs_reportlab(missing) else None
+            async with DocumentGenerationWorkflow._slot(limiter, state):
+                rendered = await render_pool.render_formats(content, missing)
+            files.update(rendered)
+            if cache is not None:
+                for name, data in rendered.items():
+                    key = ContentCache.make_key(name, RENDER_VERSION, content)
+                    await asyncio.to_thread(cache.put, key, data)
+        return files
+
+    @staticmethod
+    async def _process_document(
+        state: GenerationState,
+        ai_service: AsyncAIService,
+        archive: Union[ZipArchiveWriter, DirectoryWriter],
+        llm_slots: asyncio.Semaphore,
+        llm_limiter: Optional[FairLimiter],
+        render_limiter: Optional[FairLimiter],
+        i: int,
+        topic: str,
+        seed: Optional[int] = None,
+        checkpoint: Optional[JobCheckpoint] = None,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        combined: Optional[Dict[int, Tuple[str, str]]] = None,
+    ):
+        """Generate one document, then render it as soon as its content arrives.
+
+        The LLM slot is released before rendering so the next request can
+        start, and the rendered files go straight into the archive.
+        """
+        with metrics.span("document", job_id=state.job_id or "", document=i):
+            try:
+                async with llm_slots, DocumentGenerationWorkflow._slot(llm_limiter, state):
+                    if state.cancelled:
+                        return
+                    state.add_message(f"Generating file {i}/{state.total}: {topic}...")
+                    with DocumentGenerationWorkflow._stage(state, "llm", document=i):
+                        full_topic, base_filename, content = await ai_service.generate_single_document_content(
+                            topic,
+                            seed,
+                            on_title=lambda title: state.add_message(f"[{i}] Writing: {title}"),
+                            on_stats=lambda stats: state.set_document_stats(i, stats),
+                        )
+
+                started = time.perf_counter()
+                with DocumentGenerationWorkflow._stage(state, "render", document=i):
+                    rendered = await DocumentGenerationWorkflow._render_files(
+                        state, render_limiter, content, formats
+                    )
+                files = {f"{base_filename}.{RENDERERS[name].extension}": rendered[name] for name in formats}
+                del rendered
+
+                rendered_at = time.perf_counter()
+                with DocumentGenerationWorkflow._stage(state, "zip", document=i):
+                    await asyncio.to_thread(archive.add_many, files)
+                state.set_document_stats(i, {
+                    "render_ms": round((rendered_at - started) * 1000),
+                    "write_ms": round((time.perf_counter() - rendered_at) * 1000),
+                    "bytes": sum(len(data) for data in files.values()),
+                })
+                if checkpoint is not None:
+                    await asyncio.to_thread(checkpoint.save_document, i, full_topic, content, files)
+                names = ", ".join(files) or full_topic
+                del files
+                if combined is not None:
+                    combined[i] = (full_topic, content)
+
+                metrics.DOCUMENTS.labels("completed").inc()
+                state.increment_completed()
+                state.add_message(f"[{i}] Created: {names}")
+
+            except Exception as e:
+                error_msg = str(e)
+                logger.warning("Document %s of job %s failed", i, state.job_id, exc_info=e)
+                metrics.DOCUMENTS.labels("failed").inc()
+                state.increment_failed()
+                state.add_message(f"[{i}] Failed: {error_msg[:100]}")
+
@@ -1,74 +1,460 @@
-from typing import List, Tuple, Optional
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+import asyncio
 import threading
+import time
+
+# Events kept per job so reconnecting clients can resume via Last-Event-ID.
+EVENT_LOG_SIZE = 200
+
+# Latest progress messages kept in the public status.
+MAX_MESSAGES = 10
+
+# Parts of the public status that change independently (see changes_since).
+_SECTIONS = ("status", "progress", "messages", "documents", "timings", "usage")
+
+
+def _empty_usage() -> dict:
+    return {
+        "models": {},  # model -> requests, prompt_tokens, completion_tokens, cost_usd
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "cost_per_document_usd": None,
+        "documents_per_minute": None,
+    }
+
+
+class StateSubscription:
+    """One client's stream of state events, fed from any thread.
+
+    Events are pushed onto a bounded asyncio queue on the subscriber's loop.
+    If the client reads too slowly the queue fills up; further events are
+    dropped and `lagged` is set, telling the reader to resync from a snapshot.
+    """
+
+    __slots__ = ("_state", "_loop", "queue", "lagged")
+
+    def __init__(self, state: "GenerationState", loop: asyncio.AbstractEventLoop, max_queue: int):
+        self._state = state
+        self._loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.lagged = False
+
+    def _push(self, event: dict):
+        # Runs on the subscriber's loop
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+    def notify(self, event: dict) -> bool:
+        try:
+            self._loop.call_soon_threadsafe(self._push, event)
+            return True
+        except RuntimeError:
+            return False  # Loop closed: drop this subscriber
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Next event, or None if nothing happened within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._state._unsubscribe(self)
+
 
 class GenerationState:
-    def __init__(self):
+    """Progress of a single generation job.
+
+    Writers (the workflow, one call per message or finished document) take
+    `_lock` and bump `version`. Readers never wait on them: the public status
+    is built at most once per version and then served as a cached snapshot,
+    and `changes_since` returns only what changed after a version the client
+    already has. Cancellation is a separate Event, so the workflow's checks
+    between files don't touch the lock at all.
+    """
+
+    __slots__ = (
+        "job_id", "status", "is_running", "total", "completed", "failed", "documents", "timings", "usage",
+        "download_url", "started_at", "finished_at", "version", "_restored", "_lock", "_cancelled", "_messages",
+        "_event_id", "_events", "_subscribers", "_section_versions", "_document_versions", "_reset_version",
+        "_cache",
+    )
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
         self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._event_id = 0
+        self._events: Deque[dict] = deque(maxlen=EVENT_LOG_SIZE)
+        self._subscribers: Set[StateSubscription] = set()
+        self.version = 0
+        # (version, public status, event ID) of the last snapshot built
+        self._cache: Optional[Tuple[int, dict, int]] = None
         self.reset()
 
     def reset(self):
         with self._lock:
+            self.status: str = "idle"
             self.is_running: bool = False
             self.total: int = 0
             self.completed: int = 0
             self.failed: int = 0
-            self.messages: List[str] = []
+            self._restored: int = 0  # Completed by an earlier run of a resumed job
+            self._messages: Deque[Tuple[int, str]] = deque(maxlen=MAX_MESSAGES)  # (version, message)
+            self.documents: Dict[int, dict] = {}
+            self._document_versions: Dict[int, int] = {}
+            self.timings: Dict[str, dict] = {}
+            self.usage: dict = _empty_usage()
             self.download_url: Optional[str] = None
-            self.generated_pdf_data: List[Tuple[str, bytes]] = []
+            self.started_at: Optional[float] = None
+            self.finished_at: Optional[float] = None
+            self._cancelled.clear()
+            self._section_versions: Dict[str, int] = {}
+            self._touch(*_SECTIONS)
+            self._reset_version = self.version
+            self._publish_status()
+            self._publish_progress()
+
+    def _touch(self, *sections: str):
+        """Start a new version covering `sections`. Caller must hold the lock."""
+        self.version += 1
+        for section in sections:
+            self._section_versions[section] = self.version
+
+    def _publish(self, event_type: str, data: dict):
+        """Record an event and fan it out. Caller must hold the lock."""
+        self._event_id += 1
+        event = {"id": self._event_id, "type": event_type, "data": data}
+        self._events.append(event)
+        dead = [sub for sub in self._subscribers if not sub.notify(event)]
+        for sub in dead:
+            self._subscribers.discard(sub)
+
+    def _publish_status(self):
+        self._publish("status", {
+            "status": self.status,
+            "is_running": self.is_running,
+            "download_url": self.download_url,
+        })
+
+    def _publish_progress(self):
+        self._publish("progress", {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+        })
+
+    def mark_queued(self, total: int):
+        with self._lock:
+            self.status = "queued"
+            self.total = total
+            self._touch("status", "progress")
+            self._publish_status()
+            self._publish_progress()
 
     def start_generation(self, total: int):
         with self._lock:
+            self.status = "running"
             self.is_running = True
             self.total = total
             self.completed = 0
             self.failed = 0
-            self.messages.clear()
+            self._restored = 0
+            self._messages.clear()
+            self.documents.clear()
+            self._document_versions.clear()
+            self.timings.clear()
+            self.usage = _empty_usage()
             self.download_url = None
-            self.generated_pdf_data.clear()
+            self.started_at = time.time()
+            self.finished_at = None
+            self._touch(*_SECTIONS)
+            self._reset_version = self.version
+            self._publish_status()
+            self._publish_progress()
 
     def stop_generation(self):
         with self._lock:
             self.is_running = False
+            if self.status in ("queued", "running"):
+                self.status = "finished"
+            if self.finished_at is None:
+                self.finished_at = time.time()
+            self._touch("status")
+            self._publish_status()
+
+    def cancel(self):
+        """Ask a queued or running job to stop; the workflow exits between files."""
+        with self._lock:
+            if self.status in ("queued", "running"):
+                self._cancelled.set()
+                self.status = "cancelled"
+                self.is_running = False
+                if self.finished_at is None:
+                    self.finished_at = time.time()
+                self._touch("status")
+                self._publish_status()
 
-    def add_message(self, message: str, max_messages: int = 10):
+    def add_message(self, message: str):
         with self._lock:
-            self.messages.append(message)
-            if len(self.messages) > max_messages:
-                self.messages.pop(0)
+            self._touch("messages")
+            self._messages.append((self.version, message))
+            self._publish("message", {"message": message})
 
-    def increment_completed(self, filename: str, pdf_bytes: bytes):
+    def increment_completed(self, restored: bool = False):
+        """Count one finished document; `restored` ones (from a checkpoint) cost nothing this run."""
         with self._lock:
             self.completed += 1
-            self.generated_pdf_data.append((filename, pdf_bytes))
+            self._restored += restored
+            self._summarize_usage()
+            self._touch("progress", "usage")
+            self._publish_progress()
 
     def increment_failed(self):
         with self._lock:
             self.failed += 1
+            self._touch("progress")
+            self._publish_progress()
+
+    def set_document_stats(self, index: int, stats: dict):
+        """Merge stats into one document's entry.
+
+        LLM timings (time-to-first-token, tokens/sec, model, cost...) arrive with
+        its content, render and write times once its files are written.
+        """
+        with self._lock:
+            entry = {**self.documents.get(index, {"index": index}), **stats}
+            self.documents[index] = entry
+            self._touch("documents")
+            self._document_versions[index] = self.version
+            self._publish("document", entry)
+
+    def document_stats(self, index: int) -> Optional[dict]:
+        with self._lock:
+            entry = self.documents.get(index)
+            return dict(entry) if entry is not None else None
+
+    def record_timing(self, stage: str, seconds: float):
+        """Add one measurement to a pipeline stage (topics, llm, render, zip, upload)."""
+        with self._lock:
+            entry = self.timings.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            self._touch("timings")
+
+    def record_usage(self, model: str, prompt_tokens: int, completion_tokens: int, cost_usd: float):
+        """Add one LLM response (topics or document) to the job's token and cost totals."""
+        with self._lock:
+            entry = self.usage["models"].setdefault(
+                model, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            )
+            entry["requests"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += cost_usd
+            self._summarize_usage()
+            self._touch("usage")
+
+    def _summarize_usage(self):
+        """Recompute the usage totals, cost per document and throughput. Caller must hold the lock."""
+        models = self.usage["models"].values()
+        cost = sum(m["cost_usd"] for m in models)
+        generated = self.completed - self._restored
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        self.usage.update(
+            prompt_tokens=sum(m["prompt_tokens"] for m in models),
+            completion_tokens=sum(m["completion_tokens"] for m in models),
+            cost_usd=cost,
+            cost_per_document_usd=cost / generated if generated else None,
+            documents_per_minute=round(generated * 60 / elapsed, 2) if generated and elapsed > 0 else None,
+        )
 
     def set_download_url(self, url: str):
         with self._lock:
             self.download_url = url
+            self._touch("status")
+            self._publish_status()
 
-    def get_public_status(self) -> dict:
+    def apply_snapshot(self, snapshot: dict):
+        """Bring this state in line with a snapshot taken elsewhere (e.g. by a worker process).
+
+        Publishes the same events a local job would, so SSE subscribers of a
+        mirrored job see regular progress, status and message events.
+        """
         with self._lock:
-            return {
-                "is_running": self.is_running,
-                "total": self.total,
-                "completed": self.completed,
-                "failed": self.failed,
-                "messages": list(self.messages),
-                "download_url": self.download_url,
+            current = [message for _, message in self._messages]
+            messages = list(snapshot.get("messages", []))
+            overlap = min(len(current), len(messages))
+            while overlap and current[-overlap:] != messages[:overlap]:
+                overlap -= 1
+            for message in messages[overlap:]:
+                self._touch("messages")
+                self._messages.append((self.version, message))
+                self._publish("message", {"message": message})
+
+            for index, stats in ((d["index"], d) for d in snapshot.get("documents", [])):
+                if self.documents.get(index) != stats:
+                    self.documents[index] = stats
+                    self._touch("documents")
+                    self._document_versions[index] = self.version
+                    self._publish("document", stats)
+            timings = {
+                stage: {"count": t["count"], "seconds": t["seconds"]}
+                for stage, t in snapshot.get("timings", {}).items()
             }
+            if timings != self.timings:
+                self.timings = timings
+                self._touch("timings")
+            usage = snapshot.get("usage")
+            if usage is not None and usage != self._public_usage():
+                self.usage = usage
+                self._touch("usage")
+
+            progress = (snapshot["total"], snapshot["completed"], snapshot["failed"])
+            if progress != (self.total, self.completed, self.failed):
+                self.total, self.completed, self.failed = progress
+                self._touch("progress")
+                self._publish_progress()
+
+            status = (snapshot["status"], snapshot["is_running"], snapshot.get("download_url"))
+            if status != (self.status, self.is_running, self.download_url):
+                self.status, self.is_running, self.download_url = status
+                if self.status == "cancelled":
+                    self._cancelled.set()
+                if self.status in ("finished", "cancelled") and self.finished_at is None:
+                    self.finished_at = time.time()
+                self._touch("status")
+                self._publish_status()
+
+    def _public_timings(self) -> Dict[str, dict]:
+        return {
+            stage: {"count": t["count"], "seconds": round(t["seconds"], 3)}
+            for stage, t in self.timings.items()
+        }
 
-    def get_and_clear_pdf_data(self) -> List[Tuple[str, bytes]]:
+    def _public_usage(self) -> dict:
+        usage = self.usage
+        per_document = usage["cost_per_document_usd"]
+        return {
+            **usage,
+            "models": {
+                model: {**m, "cost_usd": round(m["cost_usd"], 6)} for model, m in usage["models"].items()
+            },
+            "cost_usd": round(usage["cost_usd"], 6),
+            "cost_per_document_usd": round(per_document, 6) if per_document is not None else None,
+        }
+
+    def _public_status(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "version": self.version,
+            "status": self.status,
+            "is_running": self.is_running,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "messages": [message for _, message in self._messages],
+            "documents": [self.documents[i] for i in sorted(self.documents)],
+            "timings": self._public_timings(),
+            "usage": self._public_usage(),
+            "download_url": self.download_url,
+        }
+
+    def _cached(self) -> Tuple[dict, int]:
+        """The public status and its event ID, built once per version. Caller must hold the lock."""
+        cache = self._cache
+        if cache is None or cache[0] != self.version:
+            cache = self._cache = (self.version, self._public_status(), self._event_id)
+        return cache[1], cache[2]
+
+    def _latest(self) -> Tuple[dict, int]:
+        # Lock-free unless something changed since the last snapshot was built
+        cache = self._cache
+        if cache is not None and cache[0] == self.version:
+            return cache[1], cache[2]
         with self._lock:
-            data = list(self.generated_pdf_data)
-            self.generated_pdf_data.clear()
-            return data
+            return self._cached()
+
+    def get_public_status(self) -> dict:
+        """The current public status. Shared between readers: don't modify it."""
+        return self._latest()[0]
+
+    def changes_since(self, version: int) -> dict:
+        """The parts of the public status that changed after `version`.
+
+        Always has "job_id", "version" and "since_version"; status, progress,
+        messages (those added since), documents (those updated since), timings
+        and usage only if they changed. A version from before the last reset,
+        or from another process, gets the full status instead.
+        """
+        if version == self.version:
+            return {"job_id": self.job_id, "version": version, "since_version": version}
+        with self._lock:
+            if not self._reset_version <= version <= self.version:
+                return self._cached()[0]
+
+            changed = {name for name, at in self._section_versions.items() if at > version}
+            delta = {"job_id": self.job_id, "version": self.version, "since_version": version}
+            if "status" in changed:
+                delta.update(status=self.status, is_running=self.is_running, download_url=self.download_url)
+            if "progress" in changed:
+                delta.update(total=self.total, completed=self.completed, failed=self.failed)
+            if "messages" in changed:
+                delta["messages"] = [message for at, message in self._messages if at > version]
+            if "documents" in changed:
+                delta["documents"] = [
+                    self.documents[i] for i in sorted(self.documents) if self._document_versions.get(i, 0) > version
+                ]
+            if "timings" in changed:
+                delta["timings"] = self._public_timings()
+            if "usage" in changed:
+                delta["usage"] = self._public_usage()
+            return delta
+
+    def subscribe(self, last_event_id: Optional[int] = None, max_queue: int = 100):
+        """Register a subscriber on the running event loop.
+
+        Returns (subscription, backlog, snapshot). If `last_event_id` is still
+        in the event log, `backlog` holds the missed events and `snapshot` is
+        None; otherwise `snapshot` is the full public status (with its event
+        ID under "event_id") and `backlog` is empty.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sub = StateSubscription(self, loop, max_queue)
+            self._subscribers.add(sub)
+            oldest = self._events[0]["id"] if self._events else self._event_id + 1
+            if last_event_id is not None and oldest - 1 <= last_event_id <= self._event_id:
+                backlog = [e for e in self._events if e["id"] > last_event_id]
+                return sub, backlog, None
+            status, event_id = self._cached()
+            return sub, [], {**status, "event_id": event_id}
+
+    def snapshot(self) -> dict:
+        """Full public status plus the ID of the last event it reflects."""
+        status, event_id = self._latest()
+        return {**status, "event_id": event_id}
+
+    def _unsubscribe(self, sub: StateSubscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
 
     @property
     def is_currently_running(self) -> bool:
-        with self._lock:
-            return self.is_running
+        return self.is_running
 
-global_state = GenerationState()
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("finished", "cancelled")
@@ -1,106 +1,98 @@
-import json
-import time
 import re
-from typing import List, Tuple
-from cerebras.cloud.sdk import Cerebras
+import random
+from typing import List, Optional, Tuple
 
+from app.services.model_router import model_router
+from app.services.json_stream import loads_lenient
 from app.services.prompt_service import PromptService
 
 
 class AIService:
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        """Initialize Cerebras client with API Key"""
-        self.client = Cerebras(api_key=api_key)
+    """Request and response shapes of the Cerebras calls made by AsyncAIService."""
 
     @staticmethod
-    def verify_api_key(api_key: str) -> bool:
-        """Perform a quick, low-cost check to verify if the API key is active"""
-        try:
-            temp_client = Cerebras(api_key=api_key)
-            # Perform a minimal 1-token request to strictly force authentication
-            temp_client.chat.completions.create(
-                model="llama3.1-8b",
-                messages=[{"role": "user", "content": "hi"}],
-                max_completion_tokens=1
-            )
-            return True
-        except Exception:
-            return False
-
-    def generate_topics(self, num_topics: int) -> List[str]:
-        prompt = f'Tạo một mảng JSON chứa {num_topics} chủ đề học thuật hoặc kiến thức phổ thông ngẫu nhiên (hoàn toàn bằng Tiếng Việt). Mỗi chủ đề mang tính giáo dục chuyên sâu, ngẫu nhiên ở đa dạng các lĩnh vực như Lịch sử, Địa lý, Toán, Lý, Hóa, Sinh... Trả về đúng 1 JSON object có dạng: {{\n"topics": [ "chủ đề 1", "chủ đề 2", ... ]\n}}'
-
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3.1-8b",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Bạn là chuyên gia giáo dục. Chỉ trả về JSON thuần hợp lệ, không text nào khác.",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.9,
-                max_completion_tokens=4096,
-                response_format={"type": "json_object"},
-            )
-
-            data = json.loads(response.choices[0].message.content.strip())
-            topics = data.get("topics", [])
+    def _verify_request() -> dict:
+        return dict(
+            model=model_router.primary("verify"),
+            messages=[{"role": "user", "content": "hi"}],
+            max_completion_tokens=model_router.budget("verify", 1),
+        )
 
-            # Fill with fallbacks if generation comes up short
-            if len(topics) < num_topics:
-                fallbacks = PromptService.get_fallback_topics()
-                import random
+    @staticmethod
+    def _cache_key(request: dict) -> str:
+        """Content-addressed key: (model, prompt, seed, temperature)."""
+        from app.services.cache_service import ContentCache
+
+        return ContentCache.make_key(
+            "chat",
+            request["model"],
+            request["messages"],
+            request.get("seed"),
+            request.get("temperature"),
+        )
 
-                while len(topics) < num_topics:
-                    topics.append(random.choice(fallbacks))
+    @staticmethod
+    def _topics_request(
+        num_topics: int, seed: Optional[int] = None, exclude: Optional[List[str]] = None
+    ) -> dict:
+        prompt = f'Tạo một mảng JSON chứa {num_topics} chủ đề học thuật hoặc kiến thức phổ thông ngẫu nhiên (hoàn toàn bằng Tiếng Việt). Mỗi chủ đề mang tính giáo dục chuyên sâu, ngẫu nhiên ở đa dạng các lĩnh vực như Lịch sử, Địa lý, Toán, Lý, Hóa, Sinh... Các chủ đề phải khác nhau hoàn toàn, không trùng lặp. Trả về đúng 1 JSON object có dạng: {{\n"topics": [ "chủ đề 1", "chủ đề 2", ... ]\n}}'
+        if exclude:
+            prompt += "\nKHÔNG dùng lại các chủ đề đã có sau đây: " + "; ".join(exclude)
+        request = dict(
+            model=model_router.primary("topics"),
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Bạn là chuyên gia giáo dục. Chỉ trả về JSON thuần hợp lệ, không text nào khác.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.9,
+            max_completion_tokens=model_router.budget("topics", model_router.estimate_topics(num_topics)),
+            response_format={"type": "json_object"},
+        )
+        if seed is not None:
+            request["seed"] = seed
+        return request
 
-            return topics[:num_topics]
-        except Exception as e:
-            raise RuntimeError(f"Failed to generate topics: {e}")
+    @staticmethod
+    def _topic_items(response_text: str) -> List[str]:
+        data = loads_lenient(response_text.strip())
+        topics = data.get("topics", []) if isinstance(data, dict) else []
+        return [str(t) for t in topics if isinstance(t, (str, int, float))]
 
-    def generate_single_document_content(
-        self, chosen_area: str
-    ) -> Tuple[str, str, str]:
-        """Returns (full_topic, base_filename, markdown_content)"""
-        prompt = PromptService.construct_single_prompt(chosen_area)
+    @staticmethod
+    def _document_request(chosen_area: str, seed: Optional[int] = None) -> dict:
+        prompt = PromptService.construct_single_prompt(chosen_area, seed)
         system_role = PromptService.get_system_role()
+        request = dict(
+            model=model_router.primary("document"),
+            messages=[
+                {"role": "system", "content": system_role},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.9,
+            max_completion_tokens=model_router.budget(
+                "document", model_router.estimate_words(PromptService.TARGET_WORDS[1])
+            ),
+            response_format={"type": "json_object"},
+        )
+        if seed is not None:
+            request["seed"] = seed
+        return request
 
-        data = None
-        for attempt in range(2):
-            try:
-                response = self.client.chat.completions.create(
-                    model="llama3.1-8b",
-                    messages=[
-                        {"role": "system", "content": system_role},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.9,
-                    max_completion_tokens=4096,
-                    response_format={"type": "json_object"},
-                )
-
-                response_text = response.choices[0].message.content.strip()
-                data = json.loads(response_text)
-                break  # Success
-            except json.JSONDecodeError as e:
-                if attempt == 1:
-                    raise Exception(
-                        f"Failed to parse JSON after 2 attempts. LLM Error: {e}"
-                    )
-                time.sleep(1)  # Wait 1s and retry
-
-        full_topic = data.get("full_topic", "Untitled Topic").strip()
-        short_topic = data.get("short_topic", "generated_doc").strip()
-        content = data.get("content", "No content generated.").strip()
+    @staticmethod
+    def _parse_document(data: dict, seed: Optional[int] = None) -> Tuple[str, str, str]:
+        # Repaired JSON can hold null (or a number) where a string belongs
+        full_topic = str(data.get("full_topic") or "Untitled Topic").strip()
+        short_topic = str(data.get("short_topic") or "generated_doc").strip()
+        content = str(data.get("content") or "No content generated.").strip()
 
         cleaned_short_topic = re.sub(r'[\\/:*?"<>|]', "", short_topic).strip()
-        import random
+        rng = random.Random(seed) if seed is not None else random
 
         base_filename = (
-            f"[Reference][AI][{cleaned_short_topic[:70]}][{random.randint(1000,9999)}]"
+            f"[Reference][AI][{cleaned_short_topic[:70]}][{rng.randint(1000,9999)}]"
         )
 
         return full_topic, base_filename, content
@@ -0,0 +1,133 @@
+import datetime
+import os
+import tempfile
+import threading
+import zipfile
+from typing import Dict, Iterator, Mapping, Optional
+
+from app.core import config, metrics
+
+
+class ZipArchiveWriter:
+    """ZIP archive that grows one file at a time on a spooled temp file.
+
+    Each file is compressed into the archive as soon as it is rendered, so the
+    caller can drop its bytes immediately. Small archives stay in RAM; past
+    ARCHIVE_SPOOL_BYTES the archive moves to disk.
+    """
+
+    def __init__(self, filename: Optional[str] = None, spool_bytes: int = config.ARCHIVE_SPOOL_BYTES):
+        if filename is None:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"generated_pdfs_{timestamp}.zip"
+        self.filename = filename
+        self.count = 0
+        self.size = 0
+        self._lock = threading.Lock()
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+        self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(self._file, "w", zipfile.ZIP_DEFLATED)
+
+    def add(self, name: str, data: bytes):
+        """Compress one file into the archive. Safe to call from worker threads."""
+        with self._lock, metrics.ZIP_ADD_SECONDS.time():
+            if self._zip is None:
+                raise ValueError("Archive is already finished")
+            self._zip.writestr(name, data)
+            self.count += 1
+
+    def add_many(self, files: Mapping[str, bytes]):
+        """Add several files (e.g. one document in every output format) in one go."""
+        for name, data in files.items():
+            self.add(name, data)
+
+    def finish(self) -> int:
+        """Write the central directory and rewind. Returns the archive size in bytes."""
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+                self.size = self._file.tell()
+            self._file.seek(0)
+            return self.size
+
+    @property
+    def fileobj(self):
+        return self._file
+
+    def iter_chunks(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        self.finish()
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DirectoryWriter:
+    """Writes each file straight into a directory; the on-disk counterpart of ZipArchiveWriter.
+
+    Files are written under a temporary name and renamed into place, so an
+    interrupted batch never leaves a half-written file behind. A name that is
+    already taken gets a " (2)", " (3)"... suffix; `written` maps each
+    requested name to the one used.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.filename = os.path.basename(os.path.normpath(path))
+        self.count = 0
+        self.size = 0
+        self.written: Dict[str, str] = {}
+        self._taken = set(os.listdir(path))
+        self._lock = threading.Lock()
+
+    def _claim(self, name: str) -> str:
+        """A free file name for `name`. Caller must hold the lock."""
+        stem, ext = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate in self._taken:
+            n += 1
+            candidate = f"{stem} ({n}){ext}"
+        self._taken.add(candidate)
+        self.written[name] = candidate
+        return candidate
+
+    def add(self, name: str, data: bytes):
+        with self._lock:
+            target = os.path.join(self.path, self._claim(name))
+            self.count += 1
+            self.size += len(data)
+        partial = target + ".part"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, target)
+
+    def add_many(self, files: Mapping[str, bytes]):
+        for name, data in files.items():
+            self.add(name, data)
+
+    def remove(self, name: str):
+        """Delete a file (if it is still there) and free its name."""
+        with self._lock:
+            self._taken.discard(name)
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        pass
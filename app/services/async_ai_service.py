@@ -0,0 +1,404 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+import httpx
+from cerebras.cloud.sdk import (
+    APIConnectionError,
+    AuthenticationError,
+    InternalServerError,
+    PermissionDeniedError,
+    RateLimitError,
+)
+
+from app.core import config, metrics
+from app.services.ai_service import AIService
+from app.services.cache_service import get_cache
+from app.services.client_registry import client_registry, key_id, key_verifications
+from app.services.json_stream import IncrementalJSONFields, repair_json
+from app.services.model_router import model_router
+from app.services.rate_limiter import backoff_delay, parse_header_float
+from app.services.topic_planner import TopicPlanner
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAIService:
+    """The Cerebras calls of a job (request shapes from AIService).
+
+    The AsyncCerebras client (and its HTTP connection pool) and the per-model
+    adaptive rate limiters of each API key come from the shared ClientRegistry,
+    so consecutive jobs on the same key share connections and throttling state.
+    Instances must be used on a single event loop, normally the engine loop
+    (see app.core.event_loop), and closed when done so the registry may close
+    the key's clients.
+
+    Models and completion budgets come from the ModelRouter. `on_usage(model,
+    prompt_tokens, completion_tokens, cost_usd)` is called for every topics
+    and document response.
+    """
+
+    def __init__(self, api_key: str, on_usage: Optional[Callable[[str, int, int, float], None]] = None):
+        self.key_id = key_id(api_key)
+        self.client, self.limiters = client_registry.acquire(api_key)
+        self.on_usage = on_usage
+        self._closed = False
+
+    def close(self, keep: bool = True):
+        """Release the shared clients; `keep=False` drops them if the key was rejected."""
+        if not self._closed:
+            self._closed = True
+            client_registry.release(self.key_id, keep)
+
+    @staticmethod
+    async def verify_api_key(api_key: str) -> bool:
+        """Check that the key is active with a 1-token request over the pooled client.
+
+        Answers are cached (API_KEY_CACHE_SECONDS / API_KEY_REJECT_CACHE_SECONDS),
+        so starting several jobs on one key costs a single billed request.
+        """
+        kid = key_id(api_key)
+        cached = key_verifications.get(kid)
+        if cached is not None:
+            metrics.KEY_VERIFICATIONS.labels("cached_valid" if cached else "cached_invalid").inc()
+            return cached
+        service = AsyncAIService(api_key)
+        valid = False
+        try:
+            await service._create(AIService._verify_request(), max_retries=1)
+            valid = True
+        except (AuthenticationError, PermissionDeniedError):
+            pass
+        except Exception:
+            metrics.KEY_VERIFICATIONS.labels("error").inc()
+            return False  # Unreachable or throttled: not cached, the next start checks again
+        finally:
+            # Only an accepted key keeps its pooled client for the job that follows
+            service.close(keep=valid)
+        metrics.KEY_VERIFICATIONS.labels("valid" if valid else "invalid").inc()
+        key_verifications.put(kid, valid)
+        return valid
+
+    async def _create_raw(self, request: dict, max_retries: int = None, task: Optional[str] = None):
+        """with_raw_response.create with adaptive throttling and jittered backoff.
+
+        Returns (raw_response, sent_at, model): sent_at is the perf_counter()
+        reading when the successful attempt was sent, i.e. after any limiter
+        wait, and model the one that answered. With a `task` the request goes
+        to that task's models in ModelRouter order, and a 429 moves it to the
+        next one at once (without counting as a retry) before backing off.
+        """
+        if max_retries is None:
+            max_retries = config.LLM_MAX_RETRIES
+        models = model_router.route(task) if task else [request["model"]]
+
+        attempt = 0
+        while True:
+            model = models[0]
+            limiter = self.limiters[model]
+            await limiter.acquire()
+            sent_at = time.perf_counter()
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(**{**request, "model": model})
+            except RateLimitError as e:
+                retry_after = parse_header_float(e.response.headers, "retry-after")
+                limiter.on_throttled(retry_after)
+                if len(models) > 1:
+                    model_router.degrade(models.pop(0))
+                    metrics.LLM_FALLBACKS.labels(task).inc()
+                    continue
+                if attempt == max_retries:
+                    metrics.LLM_FAILURES.labels("throttled").inc()
+                    raise
+                metrics.LLM_RETRIES.labels("throttled").inc()
+                await asyncio.sleep(max(retry_after or 0.0, backoff_delay(attempt)))
+                attempt += 1
+                continue
+            except AuthenticationError:
+                # The key was revoked or expired: stop trusting a cached check
+                key_verifications.put(self.key_id, False)
+                metrics.LLM_FAILURES.labels("unauthorized").inc()
+                raise
+            except (InternalServerError, APIConnectionError) as e:
+                reason = "connection" if isinstance(e, APIConnectionError) else "server_error"
+                if attempt == max_retries:
+                    metrics.LLM_FAILURES.labels(reason).inc()
+                    raise
+                metrics.LLM_RETRIES.labels(reason).inc()
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            limiter.on_success(raw.headers)
+            return raw, sent_at, model
+
+    async def _create(self, request: dict, max_retries: int = None):
+        """chat.completions.create through _create_raw."""
+        raw, _, _ = await self._create_raw(request, max_retries)
+        return await raw.parse()
+
+    def _record_usage(
+        self, task: str, model: str, prompt_tokens: int, completion_tokens: int,
+        seconds: float, truncated: bool, budget: int,
+    ) -> float:
+        """Feed one response to the ModelRouter, metrics and on_usage; returns its cost in USD."""
+        model_router.record(task, model, completion_tokens, seconds, truncated, budget)
+        cost = model_router.cost(model, prompt_tokens, completion_tokens)
+        metrics.LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        metrics.LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+        metrics.LLM_COST_USD.labels(model).inc(cost)
+        if self.on_usage is not None:
+            self.on_usage(model, prompt_tokens, completion_tokens, cost)
+        return cost
+
+    async def _stream_deltas(self, request: dict, meta: dict, task: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the text deltas of one streamed completion.
+
+        `meta` is filled in as the stream goes: sent_at, model, first_token_at,
+        chunks, usage_tokens, prompt_tokens, finish_reason, and dropped if the
+        connection broke after some text had arrived (the partial text is kept).
+        """
+        raw, meta["sent_at"], meta["model"] = await self._create_raw({**request, "stream": True}, task=task)
+        stream = await raw.parse()
+        meta.update(
+            first_token_at=None, chunks=0, usage_tokens=None, prompt_tokens=0, finish_reason=None, dropped=False
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None and chunk.usage.completion_tokens:
+                    meta["usage_tokens"] = chunk.usage.completion_tokens
+                    meta["prompt_tokens"] = chunk.usage.prompt_tokens or 0
+                for choice in chunk.choices or ():
+                    meta["finish_reason"] = choice.finish_reason or meta["finish_reason"]
+                    text = choice.delta.content if choice.delta is not None else None
+                    if not text:
+                        continue
+                    if meta["first_token_at"] is None:
+                        meta["first_token_at"] = time.perf_counter()
+                    meta["chunks"] += 1
+                    yield text
+        except (httpx.HTTPError, APIConnectionError):
+            if not meta["chunks"]:
+                raise
+            meta["dropped"] = True
+        finally:
+            await stream.close()
+
+    async def _complete_streaming(
+        self, request: dict, on_title: Optional[Callable[[str], None]] = None
+    ) -> Tuple[str, dict]:
+        """Stream one completion, returning (text, stats).
+
+        `on_title` fires as soon as the "full_topic" field has streamed in. A
+        connection dropped mid-stream keeps the partial text (flagged as
+        truncated) so the caller can repair it rather than pay for a re-run.
+        """
+        fields = IncrementalJSONFields()
+        parts: List[str] = []
+        meta: dict = {}
+        async with aclosing(self._stream_deltas(request, meta, task="document")) as deltas:
+            async for text in deltas:
+                parts.append(text)
+                if "full_topic" in fields.feed(text) and on_title is not None:
+                    on_title(fields.fields["full_topic"])
+
+        started, first_token_at = meta["sent_at"], meta["first_token_at"]
+        finished = time.perf_counter()
+        tokens = meta["usage_tokens"] or meta["chunks"]  # One chunk is roughly one token
+        decode_seconds = finished - (first_token_at or finished)
+        truncated = meta["dropped"] or meta["finish_reason"] in (None, "length")
+        stats = {
+            "model": meta["model"],
+            "ttft_ms": round((first_token_at - started) * 1000) if first_token_at else None,
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / decode_seconds, 1) if decode_seconds > 0 else None,
+            "elapsed_ms": round((finished - started) * 1000),
+            "truncated": truncated,
+            "finish_reason": meta["finish_reason"],
+            "budget": request["max_completion_tokens"],
+        }
+        stats["cost_usd"] = round(self._record_usage(
+            "document", meta["model"], meta["prompt_tokens"], tokens,
+            finished - started, truncated, request["max_completion_tokens"],
+        ), 6)
+        return "".join(parts), stats
+
+    async def _complete(self, request: dict) -> Tuple[str, dict]:
+        """Non-streaming counterpart of _complete_streaming."""
+        raw, started, model = await self._create_raw(request, task="document")
+        response = await raw.parse()
+        elapsed = time.perf_counter() - started
+        choice = response.choices[0]
+        usage = response.usage
+        tokens = usage.completion_tokens if usage is not None else None
+        truncated = choice.finish_reason == "length"
+        stats = {
+            "model": model,
+            "ttft_ms": None,
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / elapsed, 1) if tokens and elapsed > 0 else None,
+            "elapsed_ms": round(elapsed * 1000),
+            "truncated": truncated,
+            "finish_reason": choice.finish_reason,
+            "budget": request["max_completion_tokens"],
+        }
+        stats["cost_usd"] = round(self._record_usage(
+            "document", model, (usage.prompt_tokens or 0) if usage is not None else 0, tokens or 0,
+            elapsed, truncated, request["max_completion_tokens"],
+        ), 6)
+        return choice.message.content or "", stats
+
+    async def generate_topics(self, num_topics: int, seed: Optional[int] = None) -> List[str]:
+        """All topics from TopicPlanner at once (distinct, padded with fallbacks)."""
+        try:
+            return [topic async for topic in TopicPlanner(self).plan(num_topics, seed)]
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate topics: {e}")
+
+    async def iter_topics(
+        self, num_topics: int, seed: Optional[int] = None, exclude: Optional[List[str]] = None
+    ) -> AsyncIterator[str]:
+        """Raw topics from one topics request, yielded as they stream in.
+
+        No cleaning or deduplication happens here (see TopicPlanner). Seeded
+        requests are served from / stored in the content cache when enabled.
+        """
+        request = AIService._topics_request(num_topics, seed, exclude)
+        cache = get_cache() if seed is not None else None
+        if cache is not None:
+            key = AIService._cache_key(request)
+            topics = await asyncio.to_thread(cache.get_json, key)
+            if topics is not None:
+                for topic in topics:
+                    yield topic
+                return
+
+        topics: List[str] = []
+        meta: dict = {}
+        complete = None  # Unknown if the caller stops reading early
+        try:
+            if config.LLM_STREAMING:
+                fields = IncrementalJSONFields()
+                async with aclosing(self._stream_deltas(request, meta, task="topics")) as deltas:
+                    async for text in deltas:
+                        if "topics" in fields.feed(text):
+                            for topic in fields.arrays["topics"][len(topics):]:
+                                topics.append(topic)
+                                yield topic
+                complete = not meta["dropped"] and meta["finish_reason"] not in (None, "length")
+            else:
+                raw, meta["sent_at"], meta["model"] = await self._create_raw(request, task="topics")
+                response = await raw.parse()
+                usage = response.usage
+                meta.update(
+                    prompt_tokens=(usage.prompt_tokens or 0) if usage is not None else 0,
+                    usage_tokens=usage.completion_tokens if usage is not None else None,
+                    chunks=0,
+                )
+                for topic in AIService._topic_items(response.choices[0].message.content):
+                    topics.append(topic)
+                    yield topic
+                complete = response.choices[0].finish_reason != "length"
+        finally:
+            # Also bill a response the caller stopped reading (TopicPlanner
+            # returns as soon as it has enough topics)
+            if "model" in meta:
+                elapsed = time.perf_counter() - meta["sent_at"]
+                self._record_usage(
+                    "topics", meta["model"], meta.get("prompt_tokens", 0),
+                    meta.get("usage_tokens") or meta.get("chunks", 0), elapsed, complete is False,
+                    request["max_completion_tokens"],
+                )
+                if complete is not None:  # Read to the end
+                    metrics.LLM_REQUEST_SECONDS.labels("topics").observe(elapsed)
+
+        if cache is not None and complete:
+            await asyncio.to_thread(cache.put_json, key, topics)
+
+    async def generate_single_document_content(
+        self,
+        chosen_area: str,
+        seed: Optional[int] = None,
+        on_title: Optional[Callable[[str], None]] = None,
+        on_stats: Optional[Callable[[dict], None]] = None,
+    ) -> Tuple[str, str, str]:
+        """Returns (full_topic, base_filename, markdown_content)
+
+        With a seed the request is reproducible, so the parsed result is
+        served from / stored in the content cache when it is enabled.
+
+        Malformed JSON, or a stream cut off by a dropped connection, is repaired
+        locally; a second request is made when nothing usable ("content")
+        survives the repair, or when the answer hit its token budget (with the
+        budget raised, see ModelRouter.record). An answer already at the cap
+        is repaired, kept and logged. `on_stats` receives the
+        timing/token stats of the successful attempt.
+        """
+        request = AIService._document_request(chosen_area, seed)
+        cache = get_cache() if seed is not None else None
+
+        data = None
+        if cache is not None:
+            key = AIService._cache_key(request)
+            data = await asyncio.to_thread(cache.get_json, key)
+
+        if data is None:
+            for attempt in range(2):
+                if config.LLM_STREAMING:
+                    text, stats = await self._complete_streaming(request, on_title)
+                else:
+                    text, stats = await self._complete(request)
+                stats["repaired"] = False
+                try:
+                    data = json.loads(text)
+                except json.JSONDecodeError:
+                    stats["repaired"] = True
+                    try:
+                        data = json.loads(repair_json(text))
+                    except json.JSONDecodeError as e:
+                        data, error = None, e
+                if data is not None and not (isinstance(data, dict) and data.get("content")):
+                    data, error = None, ValueError("response has no content")
+
+                if stats["finish_reason"] == "length":
+                    metrics.LLM_TRUNCATIONS.labels("document").inc()
+                    budget = model_router.budget("document", stats["budget"])
+                    # Re-asking at the same budget would only be cut off again
+                    if attempt == 0 and budget > stats["budget"]:
+                        logger.info("Document hit its %d-token budget; asking again", stats["budget"])
+                        metrics.LLM_RETRIES.labels("length").inc()
+                        request = dict(request, max_completion_tokens=budget)
+                        continue
+                    logger.warning("Document hit its %d-token budget; keeping the repaired text", stats["budget"])
+
+                if data is not None:
+                    _observe_document(stats)
+                    if on_stats is not None:
+                        on_stats(stats)
+                    break
+                if attempt == 1:
+                    metrics.LLM_FAILURES.labels("invalid_json").inc()
+                    raise Exception(
+                        f"Failed to parse JSON after 2 attempts. LLM Error: {error}"
+                    )
+                metrics.LLM_RETRIES.labels("invalid_json").inc()
+                await asyncio.sleep(backoff_delay(attempt))
+
+            if cache is not None and not stats["truncated"]:
+                fields = {k: data[k] for k in ("full_topic", "short_topic", "content") if k in data}
+                await asyncio.to_thread(cache.put_json, key, fields)
+
+        return AIService._parse_document(data, seed)
+
+
+def _observe_document(stats: dict):
+    metrics.LLM_REQUEST_SECONDS.labels("document").observe(stats["elapsed_ms"] / 1000)
+    if stats["ttft_ms"] is not None:
+        metrics.LLM_TTFT_SECONDS.labels("document").observe(stats["ttft_ms"] / 1000)
+    if stats["tokens"]:
+        metrics.LLM_COMPLETION_TOKENS.labels("document").observe(stats["tokens"])
+    if stats["repaired"]:
+        metrics.LLM_JSON_REPAIRS.inc()
@@ -0,0 +1,155 @@
+"""Shared Cerebras clients and cached API key checks.
+
+Both are keyed by `key_id(api_key)`, a SHA-256 of the key, so raw keys are
+never stored as dictionary keys. One configured client (with its HTTP
+connection pool) and one adaptive rate limiter per model is kept per key
+(Cerebras limits each model separately), so consecutive jobs and key checks
+on the same key reuse connections and throttling state. Only keys in use or
+known to be accepted keep an entry.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+from cerebras.cloud.sdk import AsyncCerebras, DefaultAsyncHttpxClient
+
+from app.core import config
+from app.core.event_loop import engine_loop
+from app.services.rate_limiter import AdaptiveRateLimiter
+
+
+def key_id(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.LLM_CONCURRENCY * 2,
+        max_keepalive_connections=config.LLM_CONCURRENCY,
+    )
+
+
+class ModelLimiters(Dict[str, AdaptiveRateLimiter]):
+    """One AdaptiveRateLimiter per model name, created on first use."""
+
+    def __missing__(self, model: str) -> AdaptiveRateLimiter:
+        limiter = self[model] = AdaptiveRateLimiter(rate=config.LLM_RATE_PER_SEC, burst=config.LLM_CONCURRENCY)
+        return limiter
+
+
+class _KeyClients:
+    __slots__ = ("async_client", "limiters", "users")
+
+    def __init__(self):
+        self.async_client: Optional[AsyncCerebras] = None
+        self.limiters = ModelLimiters()
+        self.users = 0  # Holders that haven't released the clients yet
+
+
+class ClientRegistry:
+    """Clients per API key, held with acquire() / release().
+
+    Beyond `max_keys`, the least recently used keys that nothing holds are
+    closed; a key in use is never closed under a running job (the registry
+    grows past `max_keys` instead until it is released). Clients and limiters
+    are bound to the engine loop that first uses them (see app.core.event_loop).
+    """
+
+    def __init__(self, max_keys: int = 32):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, _KeyClients]" = OrderedDict()
+
+    def acquire(self, api_key: str) -> Tuple[AsyncCerebras, ModelLimiters]:
+        """The key's client and limiters, held until a matching release()."""
+        kid = key_id(api_key)
+        with self._lock:
+            clients = self._keys.get(kid)
+            if clients is None:
+                clients = self._keys[kid] = _KeyClients()
+            self._keys.move_to_end(kid)
+            if clients.async_client is None:
+                clients.async_client = AsyncCerebras(
+                    api_key=api_key,
+                    max_retries=0,  # Retries are handled by AsyncAIService so the limiter sees every 429
+                    timeout=config.LLM_TIMEOUT_SECONDS,
+                    warm_tcp_connection=False,
+                    http_client=DefaultAsyncHttpxClient(limits=_pool_limits()),
+                )
+            clients.users += 1
+            self._evict()
+            return clients.async_client, clients.limiters
+
+    def release(self, kid: str, keep: bool = True):
+        """Drop one hold on a key's clients (by key ID).
+
+        With `keep=False` (a key that failed its check) the clients are closed
+        and forgotten as soon as nothing else holds them.
+        """
+        with self._lock:
+            clients = self._keys.get(kid)
+            if clients is None:
+                return
+            clients.users = max(0, clients.users - 1)
+            if not keep and clients.users == 0:
+                del self._keys[kid]
+                _close(clients)
+            self._evict()
+
+    def _evict(self):
+        """Close the least recently used idle keys beyond max_keys. Caller must hold the lock."""
+        excess = len(self._keys) - self.max_keys
+        if excess <= 0:
+            return
+        idle = [kid for kid, clients in self._keys.items() if clients.users == 0][:excess]
+        for kid in idle:
+            _close(self._keys.pop(kid))
+
+
+def _close(clients: _KeyClients):
+    if clients.async_client is not None:
+        engine_loop.submit(clients.async_client.close())
+
+
+class KeyVerificationCache:
+    """Recent API key checks by key ID: accepted keys for `ttl` seconds, rejected ones for `negative_ttl`.
+
+    Only definite answers are cached; a check that failed for another reason
+    (network, throttling) is retried on the next start. A 401 during
+    generation records the key as rejected at once (see AsyncAIService).
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()  # key ID -> (valid, expires)
+
+    def get(self, kid: str) -> Optional[bool]:
+        """True/False if the key was checked recently, None if it must be checked."""
+        with self._lock:
+            entry = self._entries.get(kid)
+            if entry is None:
+                return None
+            valid, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[kid]
+                return None
+            return valid
+
+    def put(self, kid: str, valid: bool):
+        ttl = self.ttl if valid else self.negative_ttl
+        with self._lock:
+            self._entries.pop(kid, None)
+            if ttl > 0:
+                self._entries[kid] = (valid, time.monotonic() + ttl)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+
+client_registry = ClientRegistry()
+key_verifications = KeyVerificationCache(config.API_KEY_CACHE_SECONDS, config.API_KEY_REJECT_CACHE_SECONDS)
@@ -0,0 +1,93 @@
+"""TrueType font preparation for PDF rendering.
+
+ReportLab already embeds only the glyphs a document uses, but it copies each
+glyph's TrueType hinting program along with it, which is about half of
+SVN-Arial's glyph data. PDF viewers rasterise at high resolution and largely
+ignore those hints, so unless PDF_FONT_HINTING is set the fonts are stripped
+of them once, before registration, with fontTools (optional: without it, or
+if a font can't be processed, the font is used as is). The prepared font
+files are small enough to hand to every render worker (see RenderPool), so
+each process parses the fonts straight from memory instead of re-reading and
+re-processing them.
+"""
+import logging
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict
+
+from app.core import config
+
+try:
+    from fontTools.ttLib import TTFont as _FontToolsFont
+except ImportError:  # Optional: fonts keep their hinting without it
+    _FontToolsFont = None
+
+logger = logging.getLogger(__name__)
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "fonts")
+FONT_FILES = {
+    "SVN-Arial": "SVN-Arial-Regular.ttf",
+    "SVN-Arial-Bold": "SVN-Arial-Bold.ttf",
+}
+
+# Hinting programs and the device metrics derived from them
+_HINTING_TABLES = ("fpgm", "prep", "cvt ", "hdmx", "VDMX", "LTSH")
+
+
+def strip_hinting(ttf: bytes) -> bytes:
+    """The same TrueType font without hinting instructions and hinting tables.
+
+    Needs fontTools. Raises whatever fontTools raises for a malformed font.
+    """
+    font = _FontToolsFont(BytesIO(ttf))
+    for tag in _HINTING_TABLES:
+        if tag in font:
+            del font[tag]
+    if "glyf" in font:
+        glyf = font["glyf"]
+        for name in glyf.keys():
+            glyf[name].removeHinting()
+    maxp = font["maxp"]
+    if maxp.tableVersion >= 0x00010000:
+        maxp.maxSizeOfInstructions = 0
+    out = BytesIO()
+    font.save(out)
+    return out.getvalue()
+
+
+def _check_embeddable(ttf: bytes):
+    """Raise unless ReportLab can parse the font and embed every glyph it maps."""
+    from reportlab.pdfbase.ttfonts import TTFontFile  # Keeps ReportLab out of the web process
+
+    font_file = TTFontFile(BytesIO(ttf))
+    font_file.makeSubset(sorted(font_file.charToGlyph))
+
+
+@lru_cache(maxsize=None)
+def load_font(path: str, hinting: bool = False) -> bytes:
+    """A font file's bytes, stripped of hinting unless `hinting` (or fontTools is missing)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if hinting or _FontToolsFont is None:
+        return data
+    try:
+        stripped = strip_hinting(data)
+        _check_embeddable(stripped)
+    except Exception:
+        logger.warning("Could not strip hinting from %s; using the font as is", path, exc_info=True)
+        return data
+    return stripped
+
+
+def fonts_hinted() -> bool:
+    """Whether prepared_fonts() keeps hinting (it changes the PDF bytes, see RENDER_VERSION)."""
+    return config.PDF_FONT_HINTING or _FontToolsFont is None
+
+
+def prepared_fonts() -> Dict[str, bytes]:
+    """The bundled fonts, by registration name, ready for TTFont. Raises OSError if missing."""
+    return {
+        name: load_font(os.path.join(FONT_DIR, filename), config.PDF_FONT_HINTING)
+        for name, filename in FONT_FILES.items()
+    }
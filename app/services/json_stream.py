@@ -0,0 +1,184 @@
+import json
+import re
+from typing import Dict, List, Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONFields:
+    """Pulls top-level fields out of a JSON object as it streams in.
+
+    String values directly under the root object land in `fields`; strings
+    inside a root-level array land in `arrays[key]` one item at a time. That
+    covers both the document payload ({full_topic, short_topic, content}) and
+    the topic list ({"topics": [...]}). `feed` returns the names of fields
+    completed (or array items appended) by that chunk.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.arrays: Dict[str, List[str]] = {}
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape: Optional[str] = None  # "" after a backslash, hex digits inside \uXXXX
+        self._buffer: List[str] = []
+        self._key: Optional[str] = None
+        self._expect_value = False
+        self._capturing = False  # Current string is a root-level key/value or array item
+
+    def feed(self, chunk: str) -> List[str]:
+        completed = []
+        for ch in chunk:
+            if self._in_string:
+                if self._escape is not None:
+                    self._consume_escape(ch)
+                elif ch == "\\":
+                    self._escape = ""
+                elif ch == '"':
+                    self._in_string = False
+                    if self._capturing:
+                        self._end_string("".join(self._buffer), completed)
+                elif self._capturing:
+                    self._buffer.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                self._capturing = len(self._stack) == 1 or self._in_root_array()
+                self._buffer = []
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1 and self._expect_value and self._key is not None:
+                    self.arrays[self._key] = []
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if len(self._stack) == 1:
+                    self._key = None
+                    self._expect_value = False
+            elif ch == ":" and len(self._stack) == 1:
+                self._expect_value = True
+            elif ch == "," and len(self._stack) == 1:
+                self._key = None
+                self._expect_value = False
+        return completed
+
+    def _in_root_array(self) -> bool:
+        return len(self._stack) == 2 and self._stack[1] == "[" and self._key in self.arrays
+
+    def _end_string(self, text: str, completed: List[str]):
+        if len(self._stack) == 2:
+            self.arrays[self._key].append(text)
+            completed.append(self._key)
+        elif self._expect_value and self._key is not None:
+            self.fields[self._key] = text
+            completed.append(self._key)
+            self._key = None
+            self._expect_value = False
+        else:
+            self._key = text
+
+    def _consume_escape(self, ch: str):
+        if self._escape == "":
+            if ch == "u":
+                self._escape = "u"
+                return
+            if self._capturing:
+                self._buffer.append(_ESCAPES.get(ch, ch))
+            self._escape = None
+            return
+        self._escape += ch
+        if len(self._escape) == 5:  # "u" + 4 hex digits
+            if self._capturing:
+                try:
+                    self._buffer.append(chr(int(self._escape[1:], 16)))
+                except ValueError:
+                    pass
+            self._escape = None
+
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def repair_json(text: str) -> str:
+    """Fix the defects LLM JSON usually has, without re-requesting it.
+
+    Strips code fences and text around the root object, removes trailing
+    commas, and closes whatever a truncated stream left open: an unfinished
+    string, a dangling key or colon, and any open objects/arrays.
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # Ignore anything after the root object
+            continue
+        out.append(ch)
+
+    if in_string:
+        if escape:
+            out.pop()  # Drop a dangling backslash
+        out.append('"')
+
+    if stack:
+        tail = "".join(out).rstrip()
+        if tail.endswith(","):
+            tail = tail[:-1]
+        elif tail.endswith(":"):
+            tail += " null"
+        elif stack[-1] == "}" and _ends_with_key(tail):
+            tail += ": null"
+        out = [tail, *reversed(stack)]
+    return "".join(out)
+
+
+def _strip_trailing_comma(out: List[str]):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def _ends_with_key(text: str) -> bool:
+    """True if the object text ends with a string that is a key, not a value."""
+    if not text.endswith('"'):
+        return False
+    i = len(text) - 2
+    while i >= 0:
+        if text[i] == '"' and (i == 0 or text[i - 1] != "\\"):
+            break
+        i -= 1
+    before = text[:i].rstrip()
+    return before.endswith("{") or before.endswith(",")
+
+
+def loads_lenient(text: str):
+    """json.loads, falling back to repair_json for malformed or truncated output."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
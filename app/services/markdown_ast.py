@@ -0,0 +1,149 @@
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+
+class Run(NamedTuple):
+    """A stretch of inline text with uniform emphasis."""
+
+    text: str
+    bold: bool = False
+    italic: bool = False
+
+
+class Block(NamedTuple):
+    """One block of a document.
+
+    `kind` is "title" (# heading), "heading" (## and deeper, with `level`),
+    "paragraph", "bullet" or "ordered" (with its `marker`, e.g. "2.").
+    """
+
+    kind: str
+    runs: Tuple[Run, ...]
+    level: int = 0
+    marker: str = ""
+
+    @property
+    def text(self) -> str:
+        return "".join(run.text for run in self.runs)
+
+
+# Block-level line prefixes: heading, unordered item, ordered item.
+_BLOCK_RE = re.compile(r"(#{1,6})\s+|([-*+•])\s+|(\d{1,3}[.)])\s+")
+
+# Emphasis markers, longest first so "***" wins over "**" and "*".
+_INLINE_RE = re.compile(r"\*\*\*|___|\*\*|__|\*|_")
+_EMPHASIS = {
+    "***": (True, True),
+    "___": (True, True),
+    "**": (True, False),
+    "__": (True, False),
+    "*": (False, True),
+    "_": (False, True),
+}
+
+
+def _closes_both(stack: List[tuple], char: str) -> bool:
+    """Whether the two innermost open markers are a single and a double `char`."""
+    return len(stack) >= 2 and {stack[-1][0], stack[-2][0]} == {char, char * 2}
+
+
+def parse_inline(text: str) -> Tuple[Run, ...]:
+    """Split inline markdown into runs in a single pass.
+
+    Properly nested emphasis becomes bold/italic runs, and any marker without
+    a matching closer (or closing out of order) is kept as a literal
+    character. Underscores inside words (snake_case) are literal.
+    """
+    parts: List = []  # Literal strings, or (marker, opens) for matched markers
+    stack: List[tuple] = []  # (marker, index of its placeholder in parts)
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        start, end = match.span()
+        parts.append(text[pos:start])
+        pos = end
+        token = match.group()
+
+        if token[0] == "_" and start > 0 and end < len(text) and text[start - 1].isalnum() and text[end].isalnum():
+            parts.append(token)
+            continue
+
+        # CommonMark-style flanking: "a * b" is neither an opener nor a closer
+        can_open = end < len(text) and not text[end].isspace()
+        can_close = start > 0 and not text[start - 1].isspace()
+
+        if can_close and stack and stack[-1][0] == token:
+            _, index = stack.pop()
+            parts[index] = (token, True)
+            parts.append((token, False))
+        elif can_close and len(token) == 3 and _closes_both(stack, token[0]):
+            # "*a **b***": the run closes the inner "**" first, then the outer "*"
+            for _ in range(2):
+                marker, index = stack.pop()
+                parts[index] = (marker, True)
+                parts.append((marker, False))
+        elif can_open and not any(marker == token for marker, _ in stack):
+            stack.append((token, len(parts)))
+            parts.append(token)
+        else:
+            parts.append(token)  # Unmatched or closing across another marker
+    parts.append(text[pos:])
+
+    runs: List[Run] = []
+    bold = italic = 0
+    buffer: List[str] = []
+    for part in parts:
+        if isinstance(part, str):
+            buffer.append(part)
+            continue
+        if buffer and "".join(buffer):
+            runs.append(Run("".join(buffer), bold > 0, italic > 0))
+        buffer = []
+        token, opens = part
+        step = 1 if opens else -1
+        adds_bold, adds_italic = _EMPHASIS[token]
+        bold += step * adds_bold
+        italic += step * adds_italic
+    if buffer and "".join(buffer):
+        runs.append(Run("".join(buffer), bold > 0, italic > 0))
+    return tuple(runs)
+
+
+@lru_cache(maxsize=64)
+def parse_markdown(markdown_text: str) -> Tuple[Block, ...]:
+    """Parse the LLM's markdown into blocks, one line at a time.
+
+    Blocks are immutable, so the result is cached and shared by every
+    renderer of the same document (see app.services.renderers).
+    """
+    blocks: List[Block] = []
+    for line in markdown_text.split("\n"):
+        line = line.strip()
+        if not line or line in ("---", "***", "___"):
+            continue
+        if line.startswith("> "):
+            line = line[2:]
+
+        block = _BLOCK_RE.match(line)
+        if block is None:
+            blocks.append(Block("paragraph", parse_inline(line)))
+            continue
+
+        runs = parse_inline(line[block.end():])
+        hashes, bullet, number = block.groups()
+        if hashes:
+            level = len(hashes)
+            blocks.append(Block("title" if level == 1 else "heading", runs, level=level))
+        elif bullet:
+            blocks.append(Block("bullet", runs))
+        else:
+            blocks.append(Block("ordered", runs, marker=number))
+    return tuple(blocks)
+
+
+def document_title(blocks: Tuple[Block, ...], default: str = "") -> str:
+    """Text of the first heading, for formats that carry a title."""
+    for block in blocks:
+        if block.kind in ("title", "heading") and block.text.strip():
+            return block.text.strip()
+    return default
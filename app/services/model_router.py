@@ -0,0 +1,140 @@
+"""Per-task model choice, completion budgets and cost accounting for LLM requests.
+
+Each kind of request ("verify", "topics", "document") has a TaskPolicy: the
+models to use in order of preference and a cap on completion tokens. The
+router sizes max_completion_tokens from an estimate of what the response
+needs, raised to what recent responses of the same task actually used, and
+puts a model behind the next one for LLM_MODEL_COOLDOWN_SECONDS after it was
+throttled or answered slower than LLM_SLOW_SECONDS.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Tuple
+
+from app.core import config
+
+# Output tokens per Vietnamese word with the Llama 3 tokenizer, Markdown and
+# JSON escaping included, and the headroom kept above an estimate.
+TOKENS_PER_WORD = 2.0
+BUDGET_HEADROOM = 1.25
+# Completion tokens per planned topic (a short Vietnamese phrase in a JSON array).
+TOKENS_PER_TOPIC = 40
+
+# List prices in USD per million (prompt, completion) tokens when this was
+# written; LLM_PRICES overrides them or adds models.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "llama3.1-8b": (0.10, 0.10),
+    "llama-3.3-70b": (0.85, 1.20),
+    "qwen-3-32b": (0.40, 0.80),
+    "gpt-oss-120b": (0.25, 0.69),
+}
+
+
+class TaskPolicy(NamedTuple):
+    models: Tuple[str, ...]  # Preferred first
+    max_tokens: int
+
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=prompt/completion,..." (USD per million tokens), skipping malformed entries."""
+    prices = {}
+    for item in value.split(","):
+        model, _, price = item.partition("=")
+        prompt, _, completion = price.partition("/")
+        try:
+            prices[model.strip()] = (float(prompt), float(completion or prompt))
+        except ValueError:
+            continue
+    return prices
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        policies: Dict[str, TaskPolicy],
+        slow_seconds: float,
+        cooldown_seconds: float,
+        prices: Dict[str, Tuple[float, float]],
+        history: int = 50,
+    ):
+        self.policies = policies
+        self.slow_seconds = slow_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.prices = prices
+        self._history = history
+        self._lock = threading.Lock()
+        self._used: Dict[str, Deque[int]] = {}  # task -> recent completion tokens needed
+        self._degraded_until: Dict[str, float] = {}  # model -> monotonic deadline
+
+    @classmethod
+    def from_config(cls) -> "ModelRouter":
+        def models(*names: str) -> Tuple[str, ...]:
+            return tuple(dict.fromkeys(name for name in names if name))
+
+        policies = {
+            # The key check must pass on the model the jobs will use
+            "verify": TaskPolicy(models(config.LLM_MODEL), 1),
+            "topics": TaskPolicy(
+                models(config.LLM_TOPICS_MODEL, config.LLM_FALLBACK_MODEL), config.LLM_MAX_COMPLETION_TOKENS
+            ),
+            "document": TaskPolicy(
+                models(config.LLM_MODEL, config.LLM_FALLBACK_MODEL), config.LLM_MAX_COMPLETION_TOKENS
+            ),
+        }
+        prices = {**MODEL_PRICES, **_parse_prices(config.LLM_PRICES)}
+        return cls(policies, config.LLM_SLOW_SECONDS, config.LLM_MODEL_COOLDOWN_SECONDS, prices)
+
+    @staticmethod
+    def estimate_topics(num_topics: int) -> int:
+        return int((32 + TOKENS_PER_TOPIC * num_topics) * BUDGET_HEADROOM)
+
+    def max_topics(self) -> int:
+        """Most topics one topics request can return within the task's token cap."""
+        room = self.policies["topics"].max_tokens / BUDGET_HEADROOM - 32
+        return max(1, int(room) // TOKENS_PER_TOPIC)
+
+    @staticmethod
+    def estimate_words(words: int) -> int:
+        """Completion tokens for an answer of up to `words` words, plus the JSON around it."""
+        return int(words * TOKENS_PER_WORD * BUDGET_HEADROOM) + 200
+
+    def primary(self, task: str) -> str:
+        return self.policies[task].models[0]
+
+    def route(self, task: str) -> List[str]:
+        """The task's models, those not throttled or slow recently first."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = {m for m in self.policies[task].models if self._degraded_until.get(m, 0.0) <= now}
+        models = self.policies[task].models
+        return [m for m in models if m in healthy] + [m for m in models if m not in healthy]
+
+    def budget(self, task: str, estimate: int) -> int:
+        """max_completion_tokens: the estimate, or more if recent responses needed it, up to the cap."""
+        with self._lock:
+            used = self._used.get(task)
+            observed = int(max(used) * BUDGET_HEADROOM) if used else 0
+        return max(1, min(self.policies[task].max_tokens, max(estimate, observed)))
+
+    def record(self, task: str, model: str, completion_tokens: int, seconds: float, truncated: bool, budget: int):
+        """Learn from one finished response. A truncated one needed more than its budget."""
+        needed = int(budget * 1.5) if truncated and budget else completion_tokens
+        with self._lock:
+            if needed:
+                self._used.setdefault(task, deque(maxlen=self._history)).append(needed)
+        if seconds > self.slow_seconds:
+            self.degrade(model)
+
+    def degrade(self, model: str):
+        """Prefer other models for this one's cooldown (after a 429 or a slow answer)."""
+        with self._lock:
+            self._degraded_until[model] = time.monotonic() + self.cooldown_seconds
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """USD for one response, 0.0 for models without a known price."""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+model_router = ModelRouter.from_config()
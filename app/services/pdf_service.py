@@ -1,45 +1,259 @@
-import io
-import re
 from io import BytesIO
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Sequence, Tuple
 
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import Flowable, PageBreak, SimpleDocTemplate, Paragraph
+from reportlab.platypus.paraparser import ParaParser
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import xml.etree.ElementTree as ET
+from reportlab.lib.fonts import addMapping
 
+import logging
 import os
+import threading
 
-try:
-    current_dir = os.path.dirname(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    )
-    regular_font_path = os.path.join(current_dir, "fonts", "SVN-Arial-Regular.ttf")
-    bold_font_path = os.path.join(current_dir, "fonts", "SVN-Arial-Bold.ttf")
-
-    pdfmetrics.registerFont(TTFont("SVN-Arial", regular_font_path))
-    pdfmetrics.registerFont(TTFont("SVN-Arial-Bold", bold_font_path))
-    default_font = "SVN-Arial"
-    bold_font = "SVN-Arial-Bold"
-except Exception as e:
-    print(f"Warning: Could not load local fonts: {e}")
+from app.services.font_service import prepared_fonts
+from app.services.markdown_ast import Block, Run, document_title, parse_inline, parse_markdown
+from app.services.renderers import FOOTER_TEXT
+
+logger = logging.getLogger(__name__)
+
+# Write content streams as binary instead of ASCII85, which is 25% larger
+rl_config.useA85 = 0
+
+default_font = "Helvetica"
+bold_font = "Helvetica-Bold"
+_fonts_registered = False
+_fonts_lock = threading.Lock()
+_styles: Mapping[str, ParagraphStyle] = MappingProxyType({})
+
+
+def register_fonts(font_data: Optional[Dict[str, bytes]] = None):
+    """Register the SVN-Arial TTFonts once per process.
+
+    Called lazily on first render, or up front by each render worker
+    (see app.services.render_pool), which is handed the fonts already
+    prepared by the parent process as `font_data`.
+    """
+    global _fonts_registered, _styles
+    with _fonts_lock:
+        if not _fonts_registered:
+            _register_fonts(font_data)
+            _styles = _build_styles()
+            _fonts_registered = True
+
+
+def _register_fonts(font_data: Optional[Dict[str, bytes]] = None):
+    global default_font, bold_font
     try:
-        pdfmetrics.registerFont(TTFont("Arial", "C:\\Windows\\Fonts\\arial.ttf"))
-        pdfmetrics.registerFont(TTFont("Arial-Bold", "C:\\Windows\\Fonts\\arialbd.ttf"))
-        default_font = "Arial"
-        bold_font = "Arial-Bold"
-    except:
-        default_font = "Helvetica"
-        bold_font = "Helvetica-Bold"
+        fonts = font_data or prepared_fonts()
+        pdfmetrics.registerFont(TTFont("SVN-Arial", BytesIO(fonts["SVN-Arial"])))
+        pdfmetrics.registerFont(TTFont("SVN-Arial-Bold", BytesIO(fonts["SVN-Arial-Bold"])))
+        default_font = "SVN-Arial"
+        bold_font = "SVN-Arial-Bold"
+        _register_family(default_font, bold_font)
+    except Exception as e:
+        logger.warning("Could not load local fonts: %s", e)
+        try:
+            if os.name != "nt":
+                raise OSError("no Windows fonts on this platform")
+            pdfmetrics.registerFont(TTFont("Arial", "C:\\Windows\\Fonts\\arial.ttf"))
+            pdfmetrics.registerFont(TTFont("Arial-Bold", "C:\\Windows\\Fonts\\arialbd.ttf"))
+            default_font = "Arial"
+            bold_font = "Arial-Bold"
+            _register_family(default_font, bold_font)
+        except:
+            default_font = "Helvetica"
+            bold_font = "Helvetica-Bold"
+
+
+def _register_family(regular: str, bold: str):
+    """Map <b>/<i> to the TTFonts. There is no italic face, so italics fall back to regular."""
+    addMapping(regular, 0, 0, regular)
+    addMapping(regular, 1, 0, bold)
+    addMapping(regular, 0, 1, regular)
+    addMapping(regular, 1, 1, bold)
+
+
+def _build_styles() -> Mapping[str, ParagraphStyle]:
+    """Paragraph styles shared by every render; read-only once fonts are registered."""
+    sample = getSampleStyleSheet()
+    body = ParagraphStyle(
+        "CustomStyle",
+        parent=sample["Normal"],
+        fontName=default_font,
+        fontSize=12,
+        leading=16,
+        spaceAfter=10,
+        alignment=0,
+    )
+    return MappingProxyType({
+        "body": body,
+        "title": ParagraphStyle(
+            "TitleStyle",
+            parent=sample["Title"],
+            fontName=bold_font,
+            fontSize=18,
+            spaceAfter=15,
+            alignment=1,
+        ),
+        "heading": ParagraphStyle(
+            "HeadingStyle",
+            parent=sample["Heading2"],
+            fontName=bold_font,
+            fontSize=14,
+            spaceBefore=10,
+            spaceAfter=10,
+            alignment=0,
+        ),
+        "list": ParagraphStyle(
+            "ListStyle",
+            parent=body,
+            leftIndent=18,
+            bulletIndent=6,
+            spaceAfter=4,
+        ),
+    })
+
+
+_ESCAPES = str.maketrans({"<": "&lt;", ">": "&gt;", "&": "&amp;"})
+
+
+def runs_to_markup(runs: Tuple[Run, ...]) -> str:
+    """Paragraph markup for inline runs: XML-escaped text in <b>/<i> tags."""
+    parts = []
+    for run in runs:
+        text = run.text.translate(_ESCAPES)
+        if run.italic:
+            text = f"<i>{text}</i>"
+        if run.bold:
+            text = f"<b>{text}</b>"
+        parts.append(text)
+    return "".join(parts)
+
+
+def markdown_inline_to_markup(text: str) -> str:
+    """Convert inline markdown to Paragraph markup (see parse_inline)."""
+    return runs_to_markup(parse_inline(text))
+
+
+# (style name, bold, italic) -> the fragment ParaParser makes for such a run
+_frag_prototypes: dict = {}
+
+
+def _run_frag(run: Run, style: ParagraphStyle):
+    key = (style.name, run.bold, run.italic)
+    prototype = _frag_prototypes.get(key)
+    if prototype is None:
+        _, frags, _ = ParaParser().parse(runs_to_markup((Run("x", run.bold, run.italic),)), style)
+        prototype = _frag_prototypes[key] = frags[0]
+    return prototype.clone(text=run.text)
+
+
+def runs_to_paragraph(runs: Tuple[Run, ...], style: ParagraphStyle, bullet_text: Optional[str] = None) -> Paragraph:
+    """A Paragraph built straight from the runs.
+
+    The runs are already parsed, so their fragments are cloned from one
+    parsed per style and emphasis instead of having ReportLab parse the
+    markup of every paragraph again (most of the cost of building a story).
+    """
+    text = runs_to_markup(runs)
+    if not runs:
+        return Paragraph(text, style, bulletText=bullet_text)
+    return Paragraph(text, style, bulletText=bullet_text, frags=[_run_frag(run, style) for run in runs])
+
+
+def blocks_to_flowables(blocks: Tuple[Block, ...]) -> list:
+    """Turn parsed markdown blocks into Platypus flowables."""
+    register_fonts()
+    styles = _styles
+    story = []
+
+    for block in blocks:
+        runs = block.runs
+        if block.kind == "title":
+            story.append(runs_to_paragraph(runs, styles["title"]))
+        elif block.kind == "heading":
+            story.append(runs_to_paragraph(runs, styles["heading"]))
+        elif block.kind == "bullet":
+            story.append(runs_to_paragraph(runs, styles["list"], "•"))
+        elif block.kind == "ordered":
+            story.append(runs_to_paragraph(runs, styles["list"], block.marker))
+        else:
+            story.append(runs_to_paragraph(runs, styles["body"]))
+
+    return story
+
+
+def markdown_to_flowables(markdown_text: str) -> list:
+    """Turn the LLM's markdown into Platypus flowables."""
+    return blocks_to_flowables(parse_markdown(markdown_text))
+
+
+def _add_footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont(default_font, 9)
+    canvas.setFillColorRGB(0.5, 0.5, 0.5)
+    canvas.drawCentredString(A4[0] / 2.0, 20, FOOTER_TEXT)
+    canvas.restoreState()
+
+
+class _Bookmark(Flowable):
+    """Zero-size marker adding an outline entry (bookmark) for the page it lands on."""
+
+    def __init__(self, key: str, title: str):
+        super().__init__()
+        self.key = key
+        self.title = title
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv.bookmarkPage(self.key)
+        self.canv.addOutlineEntry(self.title, self.key, level=0)
+        self.canv.showOutline()
 
 
 class PDFService:
+    @staticmethod
+    def render_pdf_bytes(markdown_text: str) -> bytes:
+        """Renders markdown to PDF and returns the bytes. Raises if rendering fails."""
+        return PDFService.render_blocks(parse_markdown(markdown_text))
+
+    @staticmethod
+    def render_blocks(blocks: Tuple[Block, ...]) -> bytes:
+        """Renders parsed markdown to PDF bytes. Raises if rendering fails."""
+        pdf_buffer = BytesIO()
+        if not PDFService._build(pdf_buffer, [("", blocks)]):
+            raise RuntimeError("PDF writing failed internally")
+        return pdf_buffer.getvalue()
+
+    @staticmethod
+    def render_combined(documents: Sequence[Tuple[str, str]]) -> bytes:
+        """Renders (title, markdown) documents into one PDF. Raises if rendering fails.
+
+        Each document starts on a new page under its own bookmark, and the
+        fonts are embedded once for the whole batch instead of once per file.
+        """
+        pdf_buffer = BytesIO()
+        parsed = [(title, parse_markdown(markdown_text)) for title, markdown_text in documents]
+        if not PDFService._build(pdf_buffer, parsed, bookmarks=True):
+            raise RuntimeError("PDF writing failed internally")
+        return pdf_buffer.getvalue()
+
     @staticmethod
     def create_pdf(output_path, markdown_text) -> bool:
         """Creates a PDF file from the generated markdown-like text using ReportLab Platypus.
         Outputs to the provided path or BytesIO buffer.
         """
+        return PDFService._build(output_path, [("", parse_markdown(markdown_text))])
+
+    @staticmethod
+    def _build(output_path, documents: Sequence[Tuple[str, Tuple[Block, ...]]], bookmarks: bool = False) -> bool:
         try:
             doc = SimpleDocTemplate(
                 output_path,
@@ -49,73 +263,15 @@ class PDFService:
                 topMargin=40,
                 bottomMargin=40,
             )
-
-            styles = getSampleStyleSheet()
-            custom_style = ParagraphStyle(
-                "CustomStyle",
-                parent=styles["Normal"],
-                fontName=default_font,
-                fontSize=12,
-                leading=16,
-                spaceAfter=10,
-                alignment=0,
-            )
-
-            title_style = ParagraphStyle(
-                "TitleStyle",
-                parent=styles["Title"],
-                fontName=bold_font,
-                fontSize=18,
-                spaceAfter=15,
-                alignment=1,
-            )
-
-            heading_style = ParagraphStyle(
-                "HeadingStyle",
-                parent=styles["Heading2"],
-                fontName=bold_font,
-                fontSize=14,
-                spaceBefore=10,
-                spaceAfter=10,
-                alignment=0,
-            )
-
             story = []
-
-            lines = markdown_text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith("# "):
-                    story.append(Paragraph(line[2:], title_style))
-                elif line.startswith("## "):
-                    story.append(Paragraph(line[3:], heading_style))
-                elif line.startswith("### "):
-                    story.append(Paragraph(line[4:], heading_style))
-                else:
-                    line = re.sub(r'\*\*(.*?)\*\*', rf'<font name="{bold_font}">\1</font>', line)
-                    line = re.sub(r'\*(.*?)\*', r'\1', line)
-                    line = re.sub(r'__(.*?)__', rf'<font name="{bold_font}">\1</font>', line)
-                    line = re.sub(r'_(.*?)_', r'\1', line)
-                    
-                    line = line.replace("### ", "").replace("## ", "")
-                    
-                    story.append(Paragraph(line, custom_style))
-
-            def add_footer(canvas, doc):
-                canvas.saveState()
-                canvas.setFont(default_font, 9)
-                canvas.setFillColorRGB(0.5, 0.5, 0.5)
-                canvas.drawCentredString(
-                    A4[0] / 2.0,
-                    20,
-                    "Nội dung được tạo bởi Cerebras Llama-3 70B. Vui lòng kiểm tra lại nội dung trước khi sử dụng.",
-                )
-                canvas.restoreState()
-
-            doc.build(story, onFirstPage=add_footer, onLaterPages=add_footer)
+            for n, (title, blocks) in enumerate(documents):
+                if n:
+                    story.append(PageBreak())
+                if bookmarks:
+                    story.append(_Bookmark(f"doc{n + 1}", title or document_title(blocks, f"{n + 1}")))
+                story.extend(blocks_to_flowables(blocks))
+            doc.build(story, onFirstPage=_add_footer, onLaterPages=_add_footer)
             return True
         except Exception as e:
-            print(f"Error drawing PDF: {e}")
+            logger.exception("Error drawing PDF: %s", e)
             return False
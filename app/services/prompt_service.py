@@ -2,6 +2,9 @@ import random
 
 
 class PromptService:
+    # Article length asked of the model, in words (also sizes its token budget)
+    TARGET_WORDS = (800, 1200)
+
     @staticmethod
     def get_fallback_topics() -> list[str]:
         return [
@@ -21,7 +24,7 @@ class PromptService:
         return f"""
         (Seed: {random_seed} - Chủ đề: {chosen_area})
         
-        Viết một bài trình bày hoặc bài giảng chi tiết bằng Tiếng Việt (khoảng 800-1200 từ, tương đương 1 đến 1.5 trang A4) về một khái niệm/sự kiện cụ thể trong lĩnh vực '{chosen_area}'. 
+        Viết một bài trình bày hoặc bài giảng chi tiết bằng Tiếng Việt (khoảng {PromptService.TARGET_WORDS[0]}-{PromptService.TARGET_WORDS[1]} từ, tương đương 1 đến 1.5 trang A4) về một khái niệm/sự kiện cụ thể trong lĩnh vực '{chosen_area}'. 
         YÊU CẦU QUAN TRỌNG NHẤT:
         1. Nội dung phải hoàn toàn chính xác, khoa học, dựa trên kiến thức chuẩn sách giáo khoa (SGK) hoặc kiến thức phổ thông đã được công nhận. KHÔNG ĐƯỢC BỊA ĐẶT (no hallucination).
         2. Phân tích sâu sắc, chi tiết, mở rộng các khía cạnh liên quan để đảm bảo bài viết đủ độ dài và chất lượng cao. Không viết hời hợt hoặc lập dàn ý lướt qua.
@@ -0,0 +1,107 @@
+import asyncio
+import random
+import time
+from typing import Mapping, Optional
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(str(value).rstrip("s"))
+    except ValueError:
+        return None
+
+
+class AdaptiveRateLimiter:
+    """Token bucket for one API key whose refill rate adapts to the server.
+
+    The rate is halved on every 429 (honouring Retry-After) and creeps back up
+    additively on success, capped by what the `x-ratelimit-*` headers say is
+    left in the current window.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        min_rate: float = 0.1,
+        max_rate: Optional[float] = None,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._header_cap: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    async def acquire(self):
+        """Wait for a request slot. Waiters are served in FIFO order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease after a 429.
+
+        Requests already in flight tend to be rejected together, so the rate
+        is halved at most once per second for a single throttling episode.
+        """
+        now = time.monotonic()
+        if now - self._last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._last_decrease = now
+        self._tokens = 0.0
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        """Additive increase, bounded by the remaining quota the server reports."""
+        if headers:
+            self._apply_headers(headers)
+        ceiling = self.max_rate if self._header_cap is None else min(self.max_rate, self._header_cap)
+        self.rate = max(self.min_rate, min(ceiling, self.rate + 0.1))
+
+    def _apply_headers(self, headers: Mapping[str, str]):
+        caps = []
+        for window in ("requests-minute", "requests-hour", "requests-day"):
+            remaining = parse_header_float(headers, f"x-ratelimit-remaining-{window}")
+            reset = parse_header_float(headers, f"x-ratelimit-reset-{window}")
+            if remaining is None or not reset:
+                continue
+            if remaining <= 0:
+                self._paused_until = max(self._paused_until, time.monotonic() + reset)
+            elif window == "requests-minute":
+                # Longer windows only pause when exhausted; spreading a daily
+                # quota evenly would be far too conservative.
+                caps.append(remaining / reset)
+
+        remaining_tokens = parse_header_float(headers, "x-ratelimit-remaining-tokens-minute")
+        tokens_reset = parse_header_float(headers, "x-ratelimit-reset-tokens-minute")
+        if remaining_tokens is not None and remaining_tokens <= 0 and tokens_reset:
+            self._paused_until = max(self._paused_until, time.monotonic() + tokens_reset)
+
+        self._header_cap = max(self.min_rate, min(caps)) if caps else None
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Sequence, Tuple
+import threading
+
+from app.core import config, metrics
+from app.services.font_service import prepared_fonts
+from app.services.renderers import needs_reportlab, render_documents
+
+
+def _noop():
+    return None
+
+
+# ReportLab is imported inside the workers (and the thread fallback) only, so
+# importing the pool doesn't load it into the web process.
+def _register_fonts(fonts: Optional[Dict[str, bytes]] = None):
+    from app.services.pdf_service import register_fonts
+
+    register_fonts(fonts)
+
+
+def _render_combined(documents: Sequence[Tuple[str, str]]) -> bytes:
+    from app.services.pdf_service import PDFService
+
+    return PDFService.render_combined(documents)
+
+
+class RenderPool:
+    """Runs render_documents in a warm pool of worker processes.
+
+    ReportLab layout is CPU-bound and holds the GIL, so rendering in the web
+    process slows down every other request. The fonts are prepared once here
+    and handed to every worker, which registers them in its initializer.
+    With RENDER_WORKERS=0, or when no requested format needs ReportLab,
+    rendering runs in a thread of the current process.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                try:
+                    fonts = prepared_fonts()
+                except OSError:
+                    fonts = None  # Workers fall back to system fonts
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Workers must not inherit the engine loop thread and its sockets
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_register_fonts,
+                    initargs=(fonts,),
+                )
+            return self._executor
+
+    def warm(self):
+        """Start every worker up front so the first render doesn't pay for it."""
+        if self.workers <= 0:
+            _register_fonts()
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    async def render(self, markdown_text: str) -> bytes:
+        """Render markdown to PDF bytes off the event loop."""
+        return (await self.render_formats(markdown_text, ("pdf",)))["pdf"]
+
+    async def render_formats(self, markdown_text: str, formats: Sequence[str]) -> Dict[str, bytes]:
+        """Render markdown to every format in `formats` off the event loop, parsing it once."""
+        started = time.perf_counter()
+        files, seconds = await self._render(markdown_text, tuple(formats))
+        for name, elapsed in seconds.items():
+            metrics.RENDER_SECONDS.labels(name).observe(elapsed)
+        if "pdf" in files:
+            metrics.PDF_RENDER_SECONDS.observe(time.perf_counter() - started)
+            metrics.PDF_BYTES.observe(len(files["pdf"]))
+        return files
+
+    async def render_combined(self, documents: Sequence[Tuple[str, str]]) -> bytes:
+        """Render (title, markdown) documents into one bookmarked PDF off the event loop."""
+        started = time.perf_counter()
+        pdf_bytes = await self._run(_render_combined, list(documents))
+        metrics.RENDER_SECONDS.labels("pdf-combined").observe(time.perf_counter() - started)
+        metrics.PDF_BYTES.observe(len(pdf_bytes))
+        return pdf_bytes
+
+    async def _render(self, markdown_text: str, formats: tuple):
+        if not needs_reportlab(formats):
+            return await asyncio.to_thread(render_documents, markdown_text, formats)
+        return await self._run(render_documents, markdown_text, formats)
+
+    async def _run(self, func, *args):
+        if self.workers <= 0:
+            return await asyncio.to_thread(func, *args)
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool and retry once.
+            self._reset(executor)
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def _reset(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+render_pool = RenderPool(config.RENDER_WORKERS)
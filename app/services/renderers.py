@@ -0,0 +1,330 @@
+"""Output formats for generated documents.
+
+Every renderer takes the blocks parsed once by app.services.markdown_ast, so
+a document requested in several formats is parsed a single time. Only PDF
+uses ReportLab; HTML, EPUB and DOCX are plain string templates (EPUB and
+DOCX being small ZIP packages), cheap enough to build without the render
+pool. ReportLab is only imported by the first PDF render, so processes that
+never render a PDF themselves (the web tier, with RENDER_WORKERS > 0) never
+load it.
+"""
+import hashlib
+import time
+import uuid
+import zipfile
+from html import escape
+from io import BytesIO
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+from xml.sax.saxutils import escape as xml_escape
+
+from app.services.font_service import fonts_hinted
+from app.services.markdown_ast import Block, Run, document_title, parse_markdown
+
+
+class Renderer(NamedTuple):
+    extension: str
+    media_type: str
+    render: Callable[[Tuple[Block, ...]], bytes]
+    uses_reportlab: bool = False
+
+
+# Bump when output for the same markdown changes, to invalidate cached renders.
+# PDFs also differ with and without font hinting.
+RENDER_VERSION = "5-hinted" if fonts_hinted() else "5"
+
+FOOTER_TEXT = (
+    "Nội dung được tạo bởi AI qua Cerebras Cloud. Vui lòng kiểm tra lại nội dung trước khi sử dụng."
+)
+
+
+# HTML / XHTML (shared by the HTML and EPUB renderers)
+
+_CSS = """body { font-family: Arial, "Helvetica Neue", sans-serif; font-size: 12pt; line-height: 1.45;
+  max-width: 46em; margin: 2em auto; padding: 0 1em; color: #1e293b; }
+h1 { font-size: 18pt; text-align: center; }
+h2, h3, h4, h5, h6 { font-size: 14pt; margin-top: 1.2em; }
+footer { margin-top: 3em; font-size: 9pt; color: #808080; text-align: center; }"""
+
+
+def _html_runs(runs: Tuple[Run, ...]) -> str:
+    parts = []
+    for run in runs:
+        text = escape(run.text, quote=False)
+        if run.italic:
+            text = f"<em>{text}</em>"
+        if run.bold:
+            text = f"<strong>{text}</strong>"
+        parts.append(text)
+    return "".join(parts)
+
+
+def _html_body(blocks: Tuple[Block, ...]) -> str:
+    lines: List[str] = []
+    open_list = None
+    for block in blocks:
+        list_tag = {"bullet": "ul", "ordered": "ol"}.get(block.kind)
+        if open_list and list_tag != open_list:
+            lines.append(f"</{open_list}>")
+            open_list = None
+        if list_tag and open_list is None:
+            lines.append(f"<{list_tag}>")
+            open_list = list_tag
+
+        text = _html_runs(block.runs)
+        if block.kind == "title":
+            lines.append(f"<h1>{text}</h1>")
+        elif block.kind == "heading":
+            lines.append(f"<h{block.level}>{text}</h{block.level}>")
+        elif list_tag:
+            lines.append(f"<li>{text}</li>")
+        else:
+            lines.append(f"<p>{text}</p>")
+    if open_list:
+        lines.append(f"</{open_list}>")
+    return "\n".join(lines)
+
+
+def render_html(blocks: Tuple[Block, ...]) -> bytes:
+    title = escape(document_title(blocks, "Document"), quote=False)
+    return (
+        "<!DOCTYPE html>\n"
+        '<html lang="vi">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{title}</title>\n<style>\n{_CSS}\n</style>\n</head>\n<body>\n"
+        f"{_html_body(blocks)}\n<footer>{escape(FOOTER_TEXT)}</footer>\n</body>\n</html>\n"
+    ).encode("utf-8")
+
+
+# EPUB 3
+
+_EPUB_CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+
+def _zip_package(files: Sequence[Tuple[str, str]], stored_first: bool = False) -> bytes:
+    """A ZIP built in memory; EPUB needs its first entry (mimetype) uncompressed."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as package:
+        for i, (name, text) in enumerate(files):
+            compression = zipfile.ZIP_STORED if stored_first and i == 0 else zipfile.ZIP_DEFLATED
+            package.writestr(name, text.encode("utf-8"), compress_type=compression)
+    return buffer.getvalue()
+
+
+def render_epub(blocks: Tuple[Block, ...]) -> bytes:
+    title = xml_escape(document_title(blocks, "Document"))
+    body = _html_body(blocks)
+    # Same content, same identifier
+    identifier = uuid.UUID(bytes=hashlib.sha256(body.encode("utf-8")).digest()[:16])
+    modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    xhtml_head = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"'
+        ' lang="vi" xml:lang="vi">\n'
+    )
+    chapter = (
+        f"{xhtml_head}<head>\n<meta charset=\"utf-8\"/>\n<title>{title}</title>\n"
+        f"<style>\n{_CSS}\n</style>\n</head>\n<body>\n{body}\n"
+        f"<footer>{escape(FOOTER_TEXT)}</footer>\n</body>\n</html>\n"
+    )
+    nav = (
+        f"{xhtml_head}<head>\n<meta charset=\"utf-8\"/>\n<title>{title}</title>\n</head>\n<body>\n"
+        f'<nav epub:type="toc" id="toc">\n<ol>\n<li><a href="chapter.xhtml">{title}</a></li>\n</ol>\n</nav>\n'
+        "</body>\n</html>\n"
+    )
+    opf = f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="vi">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:{identifier}</dc:identifier>
+    <dc:title>{title}</dc:title>
+    <dc:language>vi</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="chapter" href="chapter.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine>
+    <itemref idref="chapter"/>
+  </spine>
+</package>
+"""
+    return _zip_package(
+        [
+            ("mimetype", "application/epub+zip"),
+            ("META-INF/container.xml", _EPUB_CONTAINER),
+            ("OEBPS/content.opf", opf),
+            ("OEBPS/nav.xhtml", nav),
+            ("OEBPS/chapter.xhtml", chapter),
+        ],
+        stored_first=True,
+    )
+
+
+# DOCX (WordprocessingML)
+
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+_DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+  <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+  <Default Extension="xml" ContentType="application/xml"/>
+  <Override PartName="/word/document.xml"
+    ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+  <Override PartName="/word/styles.xml"
+    ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>
+"""
+
+_DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  <Relationship Id="rId1"
+    Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+    Target="word/document.xml"/>
+</Relationships>
+"""
+
+_DOCX_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+  <Relationship Id="rId1"
+    Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+    Target="styles.xml"/>
+</Relationships>
+"""
+
+
+def _docx_style(
+    style_id: str,
+    name: str,
+    size_pt: int,
+    bold: bool = False,
+    center: bool = False,
+    before: int = 0,
+    after: int = 200,
+    indent: int = 0,
+) -> str:
+    paragraph = f'<w:spacing w:before="{before}" w:after="{after}"/>'
+    if center:
+        paragraph += '<w:jc w:val="center"/>'
+    if indent:
+        paragraph += f'<w:ind w:left="{indent}" w:hanging="{indent // 2}"/>'
+    run = f'<w:sz w:val="{size_pt * 2}"/>' + ("<w:b/>" if bold else "")
+    return (
+        f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+        f'<w:basedOn w:val="Normal"/><w:pPr>{paragraph}</w:pPr><w:rPr>{run}</w:rPr></w:style>'
+    )
+
+
+_DOCX_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:styles {_W_NS}>'
+    '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Arial" w:hAnsi="Arial" w:cs="Arial"/>'
+    '<w:sz w:val="24"/><w:lang w:val="vi-VN"/></w:rPr></w:rPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+    '<w:pPr><w:spacing w:after="200" w:line="320" w:lineRule="auto"/></w:pPr></w:style>'
+    + _docx_style("Title", "Title", 18, bold=True, center=True, after=300)
+    + _docx_style("Heading2", "heading 2", 14, bold=True, before=200)
+    + _docx_style("ListParagraph", "List Paragraph", 12, after=80, indent=360)
+    + _docx_style("Footer", "Footer", 9, center=True, before=600)
+    + "</w:styles>\n"
+)
+
+
+def _docx_run(text: str, bold: bool = False, italic: bool = False) -> str:
+    props = ("<w:b/>" if bold else "") + ("<w:i/>" if italic else "")
+    props = f"<w:rPr>{props}</w:rPr>" if props else ""
+    return f'<w:r>{props}<w:t xml:space="preserve">{xml_escape(text)}</w:t></w:r>'
+
+
+def _docx_paragraph(style: str, runs: Iterable[str]) -> str:
+    return f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>{"".join(runs)}</w:p>'
+
+
+def render_docx(blocks: Tuple[Block, ...]) -> bytes:
+    paragraphs = []
+    for block in blocks:
+        runs = [_docx_run(run.text, run.bold, run.italic) for run in block.runs]
+        if block.kind == "title":
+            paragraphs.append(_docx_paragraph("Title", runs))
+        elif block.kind == "heading":
+            paragraphs.append(_docx_paragraph("Heading2", runs))
+        elif block.kind in ("bullet", "ordered"):
+            marker = "•" if block.kind == "bullet" else block.marker
+            paragraphs.append(_docx_paragraph("ListParagraph", [_docx_run(f"{marker}\t")] + runs))
+        else:
+            paragraphs.append(_docx_paragraph("Normal", runs))
+    paragraphs.append(_docx_paragraph("Footer", [_docx_run(FOOTER_TEXT)]))
+
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document {_W_NS}><w:body>'
+        + "".join(paragraphs)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+        '<w:pgMar w:top="800" w:right="800" w:bottom="800" w:left="800" w:header="400" w:footer="400"'
+        ' w:gutter="0"/></w:sectPr></w:body></w:document>\n'
+    )
+    return _zip_package(
+        [
+            ("[Content_Types].xml", _DOCX_CONTENT_TYPES),
+            ("_rels/.rels", _DOCX_RELS),
+            ("word/_rels/document.xml.rels", _DOCX_DOCUMENT_RELS),
+            ("word/document.xml", document),
+            ("word/styles.xml", _DOCX_STYLES),
+        ]
+    )
+
+
+def render_pdf(blocks: Tuple[Block, ...]) -> bytes:
+    from app.services.pdf_service import PDFService
+
+    return PDFService.render_blocks(blocks)
+
+
+RENDERERS: Dict[str, Renderer] = {
+    "pdf": Renderer("pdf", "application/pdf", render_pdf, uses_reportlab=True),
+    "html": Renderer("html", "text/html", render_html),
+    "epub": Renderer("epub", "application/epub+zip", render_epub),
+    "docx": Renderer(
+        "docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", render_docx
+    ),
+}
+DEFAULT_FORMATS: Tuple[str, ...] = ("pdf",)
+
+
+def parse_formats(value) -> Tuple[str, ...]:
+    """Normalise a formats option ("pdf,html" or ["pdf", "html"]). Raises ValueError."""
+    if value is None or value == "" or value == []:
+        return DEFAULT_FORMATS
+    items = value.split(",") if isinstance(value, str) else value
+    formats: List[str] = []
+    for item in items:
+        name = str(item).strip().lower()
+        if name not in RENDERERS:
+            raise ValueError(f"Unknown format {item!r}; choose from {', '.join(RENDERERS)}.")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        return DEFAULT_FORMATS
+    return tuple(formats)
+
+
+def needs_reportlab(formats: Iterable[str]) -> bool:
+    return any(RENDERERS[name].uses_reportlab for name in formats)
+
+
+def render_documents(markdown_text: str, formats: Sequence[str]) -> Tuple[Dict[str, bytes], Dict[str, float]]:
+    """Parse once and render every requested format.
+
+    Returns the files by format and the seconds each renderer took.
+    """
+    blocks = parse_markdown(markdown_text)
+    files: Dict[str, bytes] = {}
+    seconds: Dict[str, float] = {}
+    for name in formats:
+        started = time.perf_counter()
+        files[name] = RENDERERS[name].render(blocks)
+        seconds[name] = time.perf_counter() - started
+    return files, seconds
@@ -1,37 +1,100 @@
-import io
-import zipfile
+import os
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
 import requests
-import datetime
-from typing import List, Tuple
+from requests.adapters import HTTPAdapter
 
+from app.core import config, metrics
+from app.services.archive_service import ZipArchiveWriter
 
-class StorageService:
-    @staticmethod
-    def upload_pdfs_as_zip(generated_pdf_data: List[Tuple[str, bytes]]) -> str:
-        """
-        Packs the tuples of (filename, bytes) into an in-memory ZIP and uploads it.
-        Returns the direct download URL.
-        """
-        if not generated_pdf_data:
-            raise ValueError("No files to zip")
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        zip_filename = f"generated_pdfs_{timestamp}.zip"
-        zip_buffer = io.BytesIO()
+class _MultipartFileStream:
+    """File-like multipart/form-data body that reads the file in chunks.
+
+    `requests` builds `files=` uploads fully in memory; handing it an object
+    with read() and a known length makes http.client stream it instead.
+    """
+
+    def __init__(self, field: str, filename: str, fileobj: BinaryIO, size: int, content_type: str):
+        self.boundary = uuid.uuid4().hex
+        head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._length = len(head) + size + len(tail)
+        self._parts = [_BytesReader(head), fileobj, _BytesReader(tail)]
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
 
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for filename, file_bytes in generated_pdf_data:
-                zipf.writestr(filename, file_bytes)
 
-        # Free memory of original list objects early
-        generated_pdf_data.clear()
+class _BytesReader:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
 
-        zip_buffer.seek(0)
-        response = requests.post(
-            "https://tmpfiles.org/api/v1/upload",
-            files={"file": (zip_filename, zip_buffer)},
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size < 0 else self._pos + size
+        chunk = self._data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+
+class StorageBackend(ABC):
+    """Where finished archives go. `store` returns the URL users download from."""
+
+    name = ""
+
+    @abstractmethod
+    def store(self, job_id: str, archive: ZipArchiveWriter) -> str:
+        ...
+
+
+class TmpfilesBackend(StorageBackend):
+    """Uploads archives to tmpfiles.org over a pooled session."""
+
+    name = "tmpfiles"
+
+    def __init__(self, upload_url: str = config.TMPFILES_UPLOAD_URL):
+        self.upload_url = upload_url
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=config.MAX_CONCURRENT_JOBS))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=config.MAX_CONCURRENT_JOBS))
+
+    def store(self, job_id: str, archive: ZipArchiveWriter) -> str:
+        size = archive.finish()
+        body = _MultipartFileStream(
+            "file", archive.filename, archive.fileobj, size, "application/zip"
+        )
+        response = self.session.post(
+            self.upload_url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=(config.UPLOAD_CONNECT_TIMEOUT_SECONDS, config.UPLOAD_READ_TIMEOUT_SECONDS),
         )
-        zip_buffer.close()
 
         if response.status_code == 200:
             data = response.json()
@@ -43,3 +106,116 @@ class StorageService:
             raise ConnectionError(
                 f"Upload failed: API returned status {response.status_code}"
             )
+
+
+class LocalDiskBackend(StorageBackend):
+    """Keeps archives on local disk (or tmpfs), served by /api/download/{job_id}.
+
+    Each job gets its own directory; directories older than ARTIFACT_TTL_SECONDS
+    are deleted whenever an archive is stored or looked up.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = config.ARTIFACT_DIR, ttl_seconds: int = config.ARTIFACT_TTL_SECONDS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _job_dir(self, job_id: str) -> str:
+        if not job_id or not job_id.isalnum():
+            raise ValueError("Invalid job ID")
+        return os.path.join(self.root, job_id)
+
+    def store(self, job_id: str, archive: ZipArchiveWriter) -> str:
+        self.purge_expired()
+        archive.finish()
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        partial_path = os.path.join(job_dir, ".partial")
+        with open(partial_path, "wb") as f:
+            shutil.copyfileobj(archive.fileobj, f, 1024 * 1024)
+        os.replace(partial_path, os.path.join(job_dir, archive.filename))
+        return f"/api/download/{job_id}"
+
+    def open(self, job_id: str) -> Optional[Tuple[str, str]]:
+        """Returns (path, filename) of a job's archive, or None if missing/expired."""
+        self.purge_expired()
+        try:
+            job_dir = self._job_dir(job_id)
+            names = [n for n in os.listdir(job_dir) if not n.startswith(".")]
+        except (ValueError, OSError):
+            return None
+        if not names:
+            return None
+        return os.path.join(job_dir, names[0]), names[0]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                pass
+
+
+_backends = {
+    TmpfilesBackend.name: TmpfilesBackend,
+    LocalDiskBackend.name: LocalDiskBackend,
+}
+_backend_instances: Dict[str, StorageBackend] = {}
+_backend_lock = threading.Lock()
+
+
+class StorageService:
+    @staticmethod
+    def get_backend(name: Optional[str] = None) -> StorageBackend:
+        """Shared backend instance by name (defaults to STORAGE_BACKEND)."""
+        name = name or config.STORAGE_BACKEND
+        with _backend_lock:
+            if name not in _backend_instances:
+                if name not in _backends:
+                    raise ValueError(f"Unknown storage backend: {name}")
+                _backend_instances[name] = _backends[name]()
+            return _backend_instances[name]
+
+    @staticmethod
+    def upload_archive(archive: ZipArchiveWriter, job_id: Optional[str] = None) -> str:
+        """
+        Stores a finished ZIP archive with the configured backend.
+        Returns the download URL.
+        """
+        if archive.count == 0:
+            raise ValueError("No files to zip")
+        backend = StorageService.get_backend()
+        started = time.perf_counter()
+        try:
+            url = backend.store(job_id or uuid.uuid4().hex, archive)
+        except Exception:
+            metrics.UPLOAD_FAILURES.labels(backend.name).inc()
+            raise
+        metrics.UPLOAD_SECONDS.labels(backend.name).observe(time.perf_counter() - started)
+        metrics.UPLOAD_BYTES.labels(backend.name).observe(archive.size)
+        return url
+
+    @staticmethod
+    def upload_pdfs_as_zip(generated_pdf_data: List[Tuple[str, bytes]]) -> str:
+        """
+        Packs the tuples of (filename, bytes) into a ZIP and uploads it.
+        Returns the direct download URL.
+        """
+        if not generated_pdf_data:
+            raise ValueError("No files to zip")
+
+        with ZipArchiveWriter() as archive:
+            for filename, file_bytes in generated_pdf_data:
+                archive.add(filename, file_bytes)
+
+            # Free memory of original list objects early
+            generated_pdf_data.clear()
+            return StorageService.upload_archive(archive)
@@ -0,0 +1,189 @@
+import math
+import random
+import re
+import unicodedata
+from contextlib import aclosing
+from difflib import SequenceMatcher
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from app.services.model_router import model_router
+from app.services.prompt_service import PromptService
+
+# Ask for this many times the needed topics so duplicates can be dropped
+# without a second round trip in the common case.
+OVERPROVISION_FACTOR = 1.5
+
+# Topics listed as "don't reuse" in a follow-up request (the most recent ones),
+# which keeps its prompt bounded on batches of thousands; older repeats are
+# still caught by the deduper.
+MAX_EXCLUDED_TOPICS = 300
+
+# Two topics count as the same when their content words overlap this much
+# (Jaccard), or when most words are shared and the words that differ are
+# spelling variants of each other ("Ohm" / "Ôm").
+FUZZY_JACCARD = 0.8
+FUZZY_MIN_SHARED = 0.5
+FUZZY_VARIANT_RATIO = 0.75
+
+# Vietnamese function words ignored by the word-overlap check.
+_STOPWORDS = frozenset(
+    "của ở và trong về các những là với cho trên tại một đến từ theo".split()
+)
+
+_LEADING_JUNK_RE = re.compile(r"^\s*(?:[-*•]+|\d+[.)]|[\"'“”‘’«»]+)\s*")
+_TRAILING_JUNK_RE = re.compile(r"[\s\"'“”‘’«».,;:!?]+$")
+_SPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def clean_topic(text: str) -> str:
+    """Strip list markers, quotes and stray punctuation the model wraps topics in."""
+    text = unicodedata.normalize("NFC", str(text))
+    previous = None
+    while previous != text:
+        previous = text
+        text = _LEADING_JUNK_RE.sub("", text)
+    text = _TRAILING_JUNK_RE.sub("", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def key_topic(text: str) -> str:
+    """Comparison form: NFC, lower-case, words only. Keeps tones, which tell Vietnamese words apart."""
+    return " ".join(_WORD_RE.findall(unicodedata.normalize("NFC", clean_topic(text).casefold())))
+
+
+def fold_topic(text: str) -> str:
+    """Toneless form: no Vietnamese diacritics (đ -> d). Only a hint for spelling variants."""
+    text = unicodedata.normalize("NFD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return unicodedata.normalize("NFC", text.replace("đ", "d"))
+
+
+class TopicDeduper:
+    """Accepts topics that are neither exact nor fuzzy duplicates of earlier ones.
+
+    Matching keeps tones: "Kinh tế vi mô" and "Kinh tế vĩ mô" are different
+    topics. Near-identical rewordings collide ("Quang hợp ở thực vật" /
+    "Quang hợp của thực vật"), and so does a topic written without any
+    diacritics ("lich su viet nam.") with the accented one it spells.
+    """
+
+    def __init__(self, existing: Iterable[str] = ()):
+        self.accepted: List[str] = []
+        self._keys: Set[str] = set()
+        self._plain: Dict[str, bool] = {}  # Toneless key -> whether that topic was written without diacritics
+        self._words: List[Set[str]] = []
+        for topic in existing:
+            self.add(topic)
+
+    def add(self, topic: str) -> Optional[str]:
+        """Cleaned topic if it was accepted, None if empty or a duplicate."""
+        cleaned = clean_topic(topic)
+        key = key_topic(cleaned)
+        if not key or key in self._keys:
+            return None
+        folded = fold_topic(key)
+        plain = folded == key
+        if folded in self._plain and (plain or self._plain[folded]):
+            return None  # Same words with the diacritics left out
+        words = set(key.split()) - _STOPWORDS or set(key.split())
+        for other_words in self._words:
+            if _same_topic(words, other_words):
+                return None
+        self._keys.add(key)
+        self._plain[folded] = self._plain.get(folded, False) or plain
+        self._words.append(words)
+        self.accepted.append(cleaned)
+        return cleaned
+
+    def __len__(self) -> int:
+        return len(self.accepted)
+
+
+def _same_topic(a: Set[str], b: Set[str]) -> bool:
+    shared = len(a & b) / len(a | b)
+    if shared >= FUZZY_JACCARD:
+        return True
+    if shared < FUZZY_MIN_SHARED:
+        return False
+    only_a = " ".join(sorted(a - b))
+    only_b = " ".join(sorted(b - a))
+    if not (only_a and only_b) or any(ch.isdigit() for ch in only_a + only_b):
+        return False  # Numbers are never spelling variants ("Thế kỷ 18" / "Thế kỷ 19")
+    folded_a, folded_b = fold_topic(only_a), fold_topic(only_b)
+    if folded_a == folded_b:
+        return False  # Nor are words that differ only in tone ("Kinh tế vi mô" / "Kinh tế vĩ mô")
+    return SequenceMatcher(None, folded_a, folded_b).ratio() >= FUZZY_VARIANT_RATIO
+
+
+def fill_with_fallbacks(deduper: TopicDeduper, num_topics: int, seed: Optional[int] = None) -> List[str]:
+    """Top `deduper` up to num_topics from the fallback list; returns the topics added.
+
+    Unused fallbacks go first. Once those run out, repeats are unavoidable;
+    the per-document prompt still varies its angle through its own seed.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    fallbacks = PromptService.get_fallback_topics()
+    rng.shuffle(fallbacks)
+
+    needed = num_topics - len(deduper)
+    added = []
+    for topic in fallbacks:
+        if len(added) >= needed:
+            break
+        accepted = deduper.add(topic)
+        if accepted is not None:
+            added.append(accepted)
+    while len(added) < needed:
+        added.append(rng.choice(fallbacks))
+    return added
+
+
+class TopicPlanner:
+    """Plans N distinct topics in as few LLM calls as the token cap allows.
+
+    Each call over-requests (OVERPROVISION_FACTOR) up to the topics one
+    response can hold (ModelRouter.max_topics), and topics are handed out as
+    they stream in, after cleaning and deduplication, so documents can start
+    before planning finishes. Further calls ask for the rest while listing
+    recent topics to avoid, until N distinct topics exist or a call adds
+    nothing new; anything still missing comes from the fallback list.
+    """
+
+    def __init__(self, ai_service):
+        self.ai_service = ai_service
+
+    async def plan(
+        self, num_topics: int, seed: Optional[int] = None, exclude: Iterable[str] = ()
+    ) -> AsyncIterator[str]:
+        """Yield `num_topics` distinct topics, none of them a duplicate of `exclude`."""
+        deduper = TopicDeduper(exclude)
+        target = len(deduper) + num_topics
+        first = True
+        while len(deduper) < target:
+            before = len(deduper)
+            ask = min(overprovisioned(target - before), model_router.max_topics())
+            avoid = deduper.accepted[-MAX_EXCLUDED_TOPICS:] or None
+            try:
+                async with aclosing(self.ai_service.iter_topics(ask, seed, exclude=avoid)) as topics:
+                    async for topic in topics:
+                        accepted = deduper.add(topic)
+                        if accepted is not None:
+                            yield accepted
+                            if len(deduper) >= target:
+                                return
+            except Exception:
+                if first:
+                    raise  # Bad key, service down...
+                break  # The fallback list covers the rest
+            first = False
+            if len(deduper) == before:
+                break
+
+        for topic in fill_with_fallbacks(deduper, target, seed):
+            yield topic
+
+
+def overprovisioned(num_topics: int) -> int:
+    """How many topics to ask for when `num_topics` distinct ones are needed."""
+    return max(num_topics + 1, math.ceil(num_topics * OVERPROVISION_FACTOR))
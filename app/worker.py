@@ -0,0 +1,36 @@
+"""Generation worker for JOB_WORKER_MODE=external deployments.
+
+    JOB_STORE_PATH=/var/lib/pdfgen/jobs.db python -m app.worker
+
+Claims queued jobs from the shared JobStore and runs them, checkpointing
+progress that the web process mirrors. Jobs whose worker dies are picked up
+by another worker once their lease (JOB_LEASE_SECONDS) runs out.
+"""
+import logging
+
+from app.core import config
+from app.core.event_loop import engine_loop
+from app.core.jobs import JobManager
+from app.services.render_pool import render_pool
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not config.JOB_STORE_PATH:
+        raise SystemExit("JOB_STORE_PATH must point at the job store shared with the web process")
+
+    manager = JobManager(role="worker")
+    render_pool.warm()
+    logger.info("Worker %s waiting for jobs in %s", manager.owner, config.JOB_STORE_PATH)
+    try:
+        engine_loop.run(manager.run_worker())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
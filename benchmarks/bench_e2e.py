@@ -0,0 +1,156 @@
+"""End-to-end batch benchmark against a fake Cerebras API and upload sink.
+
+Usage:
+    python -m benchmarks.bench_e2e [--sizes 1,5,20,100] [--latency 0.2]
+        [--error-rate 0.02] [--throttle-rate 0.05] [--tokens-per-sec 0]
+        [--words 1000] [--concurrency N] [--rate R] [--seed 42] [--output FILE]
+
+Each batch runs DocumentGenerationWorkflow in a fresh process (so peak RSS is
+per batch) with a fixed seed, against fakes from benchmarks.fake_services.
+Other settings come from the usual environment variables (LLM_STREAMING,
+RENDER_WORKERS...). Results are printed as JSON: wall time, docs/minute,
+per-stage timings (topics, llm, render, zip, upload), peak RSS of the
+web process and of its render workers, and the fake servers' request counts.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.fake_services import FakeCerebrasServer, FakeUploadSink
+
+
+def _peak_rss_mb(who) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def run_batch(num_docs: int, concurrency, seed: int) -> dict:
+    """Run one batch in this process; configuration is read from the environment."""
+    from app.core.workflow import DocumentGenerationWorkflow
+    from app.services.render_pool import render_pool
+
+    render_pool.warm()
+    started = time.perf_counter()
+    state = DocumentGenerationWorkflow.run("bench-key", num_docs, concurrency, seed=seed)
+    wall = time.perf_counter() - started
+    render_pool.shutdown()  # Lets RUSAGE_CHILDREN see the render workers
+
+    status = state.get_public_status()
+    stages = {
+        stage: {
+            "count": t["count"],
+            "total_s": t["seconds"],
+            "mean_s": round(t["seconds"] / t["count"], 4) if t["count"] else None,
+        }
+        for stage, t in status["timings"].items()
+    }
+    ttfts = [d["ttft_ms"] for d in status["documents"] if d.get("ttft_ms") is not None]
+    return {
+        "docs": num_docs,
+        "completed": status["completed"],
+        "failed": status["failed"],
+        "uploaded": status["download_url"] is not None,
+        "wall_s": round(wall, 3),
+        "docs_per_minute": round(status["completed"] / wall * 60, 2) if wall > 0 else None,
+        "stages": stages,
+        "mean_ttft_ms": round(sum(ttfts) / len(ttfts), 1) if ttfts else None,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "render_workers_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,5,20,100")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before each fake response")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.05, help="Share of requests answered with 429")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Streaming pace, 0 for unthrottled")
+    parser.add_argument("--words", type=int, default=1000, help="Words per fake article")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--rate", type=float, default=None, help="LLM_RATE_PER_SEC for the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Also write the JSON report here")
+    parser.add_argument("--single", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_batch(args.single, args.concurrency, args.seed)))
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    cerebras = FakeCerebrasServer(
+        latency=args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        tokens_per_sec=args.tokens_per_sec, words=args.words, seed=args.seed,
+    )
+    sink = FakeUploadSink()
+
+    env = dict(os.environ)
+    env.update(
+        CEREBRAS_BASE_URL=cerebras.url,
+        TMPFILES_UPLOAD_URL=sink.upload_url,
+        STORAGE_BACKEND="tmpfiles",
+        CACHE_ENABLED="0",  # Measure real work, not cache hits
+    )
+    if args.rate is not None:
+        env["LLM_RATE_PER_SEC"] = str(args.rate)
+
+    runs = []
+    with cerebras, sink:
+        for size in sizes:
+            cerebras.reset_stats()
+            sink.reset_stats()
+            cmd = [sys.executable, "-m", "benchmarks.bench_e2e", "--single", str(size), "--seed", str(args.seed)]
+            if args.concurrency is not None:
+                cmd += ["--concurrency", str(args.concurrency)]
+            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            if result.returncode != 0:
+                runs.append({"docs": size, "error": result.stderr.strip().splitlines()[-1:]})
+                continue
+            run = json.loads(result.stdout.strip().splitlines()[-1])
+            run["llm_requests"] = dict(cerebras.stats)
+            run["upload_bytes"] = sink.stats["bytes"]
+            runs.append(run)
+            print(f"{size} docs: {run['wall_s']}s, {run['docs_per_minute']} docs/min", file=sys.stderr)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "settings": {
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "tokens_per_sec": args.tokens_per_sec,
+            "words": args.words,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "seed": args.seed,
+            "llm_streaming": env.get("LLM_STREAMING", "default"),
+            "render_workers": env.get("RENDER_WORKERS", "default"),
+        },
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
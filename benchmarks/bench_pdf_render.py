@@ -0,0 +1,167 @@
+"""Microbenchmark: per-document PDF render time, legacy vs current PDFService.
+
+Usage:
+    python -m benchmarks.bench_pdf_render [--docs 20] [--words 1200] [--seed 42] [--rounds 5]
+
+The legacy path is a verbatim copy of the pre-tokenizer create_pdf (style sheet
+rebuilt per call, four re.sub passes per line, no XML escaping). Results are
+printed as JSON.
+
+ReportLab's line breaking and drawing are most of the time on both paths.
+The current path also escapes markup and renders list bullets, but builds
+each Paragraph from the parsed runs instead of having ReportLab re-parse
+its markup, and measures about 1.02-1.05x the legacy speed here;
+"unescaped_markup_ok" shows input that crashes the legacy path but renders
+now. Paths are timed alternately, article by article, over --rounds passes.
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+from app.services import pdf_service
+from app.services.pdf_service import PDFService, register_fonts
+
+WORDS = (
+    "lịch sử địa lý toán học vật lý hóa học sinh học tế bào năng lượng phản ứng "
+    "nguyên tử phân tử quang hợp tiến hóa dân tộc kinh tế văn học dân gian khái niệm "
+    "định luật hệ quả chứng minh phương trình hàm số đạo hàm tích phân thời kỳ triều đại "
+    "khí hậu sông núi đồng bằng môi trường di truyền gen protein enzyme"
+).split()
+
+
+def synthetic_article(rng: random.Random, words: int) -> str:
+    """Markdown shaped like an LLM article: title, sections, bold terms, lists."""
+    lines = [f"# {' '.join(rng.choices(WORDS, k=6)).capitalize()}"]
+    written = 0
+    while written < words:
+        lines.append(f"## {' '.join(rng.choices(WORDS, k=4)).capitalize()}")
+        for _ in range(rng.randint(2, 4)):
+            sentence = rng.choices(WORDS, k=rng.randint(40, 80))
+            sentence[rng.randrange(len(sentence))] = f"**{rng.choice(WORDS)}**"
+            sentence[rng.randrange(len(sentence))] = f"*{rng.choice(WORDS)}*"
+            lines.append(" ".join(sentence).capitalize() + ".")
+            written += len(sentence)
+        if rng.random() < 0.5:
+            for _ in range(3):
+                lines.append(f"- {' '.join(rng.choices(WORDS, k=10))}")
+                written += 10
+    return "\n".join(lines)
+
+
+def legacy_create_pdf(output_path, markdown_text) -> bool:
+    default_font, bold_font = pdf_service.default_font, pdf_service.bold_font
+    doc = SimpleDocTemplate(
+        output_path, pagesize=A4, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40
+    )
+    styles = getSampleStyleSheet()
+    custom_style = ParagraphStyle(
+        "CustomStyle", parent=styles["Normal"], fontName=default_font,
+        fontSize=12, leading=16, spaceAfter=10, alignment=0,
+    )
+    title_style = ParagraphStyle(
+        "TitleStyle", parent=styles["Title"], fontName=bold_font,
+        fontSize=18, spaceAfter=15, alignment=1,
+    )
+    heading_style = ParagraphStyle(
+        "HeadingStyle", parent=styles["Heading2"], fontName=bold_font,
+        fontSize=14, spaceBefore=10, spaceAfter=10, alignment=0,
+    )
+    story = []
+    for line in markdown_text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("# "):
+            story.append(Paragraph(line[2:], title_style))
+        elif line.startswith("## "):
+            story.append(Paragraph(line[3:], heading_style))
+        elif line.startswith("### "):
+            story.append(Paragraph(line[4:], heading_style))
+        else:
+            line = re.sub(r'\*\*(.*?)\*\*', rf'<font name="{bold_font}">\1</font>', line)
+            line = re.sub(r'\*(.*?)\*', r'\1', line)
+            line = re.sub(r'__(.*?)__', rf'<font name="{bold_font}">\1</font>', line)
+            line = re.sub(r'_(.*?)_', r'\1', line)
+            line = line.replace("### ", "").replace("## ", "")
+            story.append(Paragraph(line, custom_style))
+
+    def add_footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(default_font, 9)
+        canvas.drawCentredString(A4[0] / 2.0, 20, "footer")
+        canvas.restoreState()
+
+    doc.build(story, onFirstPage=add_footer, onLaterPages=add_footer)
+    return True
+
+
+def time_renders(renders, articles, rounds):
+    """Per-document render times of each path, alternating paths article by
+    article so load on the machine hits both alike."""
+    timings = {name: [] for name in renders}
+    for _ in range(rounds):
+        for article in articles:
+            for name, render in renders.items():
+                start = time.perf_counter()
+                render(BytesIO(), article)
+                timings[name].append((time.perf_counter() - start) * 1000)
+    return {
+        name: {
+            "mean_ms": round(statistics.mean(samples), 2),
+            "median_ms": round(statistics.median(samples), 2),
+            "min_ms": round(min(samples), 2),
+        }
+        for name, samples in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--words", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    register_fonts()
+    rng = random.Random(args.seed)
+    articles = [synthetic_article(rng, args.words) for _ in range(args.docs)]
+
+    # Warm both paths once so font/glyph caches don't skew the first sample
+    legacy_create_pdf(BytesIO(), articles[0])
+    PDFService.create_pdf(BytesIO(), articles[0])
+
+    results = time_renders({"legacy": legacy_create_pdf, "current": PDFService.create_pdf}, articles, args.rounds)
+    legacy, current = results["legacy"], results["current"]
+
+    hostile = "# Đề bài\nCông thức H<sub>2 và tập hợp a<b>c, với **x <y z**."
+    print(json.dumps({
+        "docs": args.docs,
+        "words_per_doc": args.words,
+        "legacy": legacy,
+        "current": current,
+        "speedup": round(legacy["median_ms"] / current["median_ms"], 3),
+        "unescaped_markup_ok": {
+            "legacy": _succeeds(legacy_create_pdf, hostile),
+            "current": PDFService.create_pdf(BytesIO(), hostile),
+        },
+    }, indent=2))
+
+
+def _succeeds(render, text) -> bool:
+    try:
+        return render(BytesIO(), text)
+    except Exception:
+        return False
+
+
+if __name__ == "__main__":
+    main()
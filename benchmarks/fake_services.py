@@ -0,0 +1,268 @@
+"""Local stand-ins for the Cerebras API and tmpfiles.org, for benchmarks.
+
+FakeCerebrasServer answers /v1/chat/completions (plain and stream=True) with
+synthetic topics and articles after a configurable latency, injects 5xx
+errors and 429s at configurable rates (429s always for `throttled_models`),
+and cuts answers off at max_completion_tokens with finish_reason "length". Every decision is drawn from an RNG
+seeded with (seed, request body, attempt number), so a run is repeatable no
+matter in which order concurrent requests arrive.
+
+FakeUploadSink accepts the multipart upload StorageService sends and replies
+the way tmpfiles.org does, without keeping the archive.
+
+    python -m benchmarks.fake_services --port 8765 --latency 0.2 --throttle-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable
+
+from benchmarks.bench_pdf_render import synthetic_article
+
+_COUNT_RE = re.compile(r"chứa (\d+) chủ đề")
+_CHUNK_CHARS = 16  # Roughly 4 tokens per streamed chunk
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, owner):
+        super().__init__(address, handler)
+        self.owner = owner
+
+
+class _BackgroundServer:
+    handler = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._httpd = _Server((host, port), self.handler, self)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _CerebrasHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        fake: FakeCerebrasServer = self.server.owner
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        request = json.loads(body)
+        rng = fake.rng_for(body)
+        fake.count("requests")
+
+        if self.headers.get("authorization", "").removeprefix("Bearer ") in fake.rejected_keys:
+            fake.count("unauthorized")
+            return self._send_json(401, {"message": "Wrong API Key"})
+        time.sleep(fake.latency * rng.uniform(0.5, 1.5))
+        if request["model"] in fake.throttled_models or rng.random() < fake.throttle_rate:
+            fake.count("throttled")
+            return self._send_json(429, {"message": "Too many requests"}, {"retry-after": "0.5"})
+        if rng.random() < fake.error_rate:
+            fake.count("errors")
+            return self._send_json(503, {"message": "Service unavailable"})
+
+        content = fake.completion_for(request, rng)
+        tokens = max(1, len(content) // 4)
+        finish_reason = "stop"
+        budget = request.get("max_completion_tokens")
+        if budget and tokens > budget:
+            content, tokens, finish_reason = content[: budget * 4], budget, "length"
+            fake.count("truncated")
+        fake.count("completion_tokens", tokens)
+        fake.count(f"model:{request['model']}")
+        if request.get("stream"):
+            return self._stream(request, content, tokens, fake.tokens_per_sec, finish_reason)
+
+        self._send_json(200, {
+            "id": "bench", "object": "chat.completion", "created": int(time.time()),
+            "model": request["model"], "system_fingerprint": "bench",
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": tokens, "total_tokens": 100 + tokens},
+        })
+
+    def _stream(self, request, content, tokens, tokens_per_sec, finish_reason="stop"):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        delay = _CHUNK_CHARS / 4 / tokens_per_sec if tokens_per_sec > 0 else 0
+        base = {"id": "bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request["model"], "system_fingerprint": "bench"}
+        for i in range(0, len(content), _CHUNK_CHARS):
+            chunk = dict(base, choices=[{"index": 0, "delta": {"content": content[i:i + _CHUNK_CHARS]}}])
+            self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            if delay:
+                time.sleep(delay)
+        last = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                    usage={"prompt_tokens": 100, "completion_tokens": tokens, "total_tokens": 100 + tokens})
+        self.wfile.write(b"data: " + json.dumps(last).encode() + b"\n\ndata: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, code, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeCerebrasServer(_BackgroundServer):
+    """Fake chat-completions endpoint; point CEREBRAS_BASE_URL at `url`."""
+
+    handler = _CerebrasHandler
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.2,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        tokens_per_sec: float = 0.0,
+        words: int = 1000,
+        seed: int = 0,
+        rejected_keys: Iterable[str] = (),
+        throttled_models: Iterable[str] = (),
+    ):
+        super().__init__(host, port)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.tokens_per_sec = tokens_per_sec
+        self.words = words
+        self.seed = seed
+        self.rejected_keys = set(rejected_keys)  # Answered with 401
+        self.throttled_models = set(throttled_models)  # Always answered with 429
+        self._attempts = Counter()
+
+    def rng_for(self, body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            self._attempts[digest] += 1
+            attempt = self._attempts[digest]
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def completion_for(self, request: dict, rng: random.Random) -> str:
+        prompt = request["messages"][-1]["content"]
+        if request.get("max_completion_tokens") == 1:
+            return "hi"
+        match = _COUNT_RE.search(prompt)
+        if match:
+            offset = rng.randrange(10**6)
+            topics = [f"Chủ đề thử nghiệm số {offset + i}" for i in range(int(match.group(1)))]
+            return json.dumps({"topics": topics}, ensure_ascii=False)
+        article = synthetic_article(rng, self.words)
+        title = article.splitlines()[0].lstrip("# ")
+        return json.dumps(
+            {"full_topic": title, "short_topic": " ".join(title.split()[:5]), "content": article},
+            ensure_ascii=False,
+        )
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        sink: FakeUploadSink = self.server.owner
+        remaining = int(self.headers.get("content-length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1 << 16))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            sink.count("bytes", len(chunk))
+        sink.count("uploads")
+        data = json.dumps({"status": "success", "data": {"url": "http://tmpfiles.org/1/bench.zip"}}).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeUploadSink(_BackgroundServer):
+    """Fake tmpfiles.org upload API; point TMPFILES_UPLOAD_URL at `upload_url`."""
+
+    handler = _UploadHandler
+
+    @property
+    def upload_url(self) -> str:
+        return f"{self.url}/api/v1/upload"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake Cerebras API and upload sink.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--upload-port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--words", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--throttled-models", default="", help="Comma-separated models always answered with 429")
+    args = parser.parse_args()
+
+    cerebras = FakeCerebrasServer(
+        port=args.port, latency=args.latency, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, tokens_per_sec=args.tokens_per_sec,
+        words=args.words, seed=args.seed,
+        throttled_models=[m for m in args.throttled_models.split(",") if m],
+    ).start()
+    sink = FakeUploadSink(port=args.upload_port).start()
+    print(f"CEREBRAS_BASE_URL={cerebras.url}")
+    print(f"TMPFILES_UPLOAD_URL={sink.upload_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Startup benchmark: how long the web process takes to import, and why.
+
+Usage:
+    python -m benchmarks.startup_time [--module main] [--runs 5] [--top 15]
+
+Each run imports `--module` in a fresh interpreter with `python -X importtime`,
+so nothing is cached in-process (the OS file cache stays warm after the first
+run). Results are printed as JSON: interpreter wall time and import time of
+the module (median over runs), the slowest imports by cumulative and by self
+time, the time spent per top-level package, and which heavy generation
+dependencies (ReportLab, the Cerebras SDK, requests...) got loaded at all.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Only needed to run a batch; the web tier should not import them up front
+HEAVY_MODULES = ("reportlab", "cerebras", "requests", "PIL", "app.services.pdf_service", "app.core.workflow")
+
+
+def import_once(module: str) -> Tuple[float, List[Tuple[str, int, int]], List[str]]:
+    """Wall seconds, (name, self_us, cumulative_us) per import, and heavy modules loaded."""
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            imports.append((name.strip(), int(own), int(cumulative)))
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return wall, imports, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_once(args.module)  # Warm the OS file cache
+    runs = [import_once(args.module) for _ in range(max(1, args.runs))]
+    walls = [wall for wall, _, _ in runs]
+    module_ms = [
+        next((cumulative for name, _, cumulative in imports if name == args.module), 0) / 1000
+        for _, imports, _ in runs
+    ]
+
+    # Breakdown from the median run
+    _, imports, heavy = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    packages: Dict[str, int] = defaultdict(int)
+    for name, own, _ in imports:
+        packages[name.split(".")[0]] += own
+
+    def top(items, key):
+        return [
+            {"module": name, "ms": round(key((name, own, cumulative)) / 1000, 2)}
+            for name, own, cumulative in sorted(items, key=key, reverse=True)[: args.top]
+        ]
+
+    print(json.dumps({
+        "module": args.module,
+        "runs": len(runs),
+        "python": sys.version.split()[0],
+        "interpreter_wall_ms": round(statistics.median(walls) * 1000, 1),
+        "module_import_ms": round(statistics.median(module_ms), 1),
+        "slowest_cumulative": top(imports, key=lambda item: item[2]),
+        "slowest_self": top(imports, key=lambda item: item[1]),
+        "by_package_ms": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        },
+        "heavy_modules_loaded": heavy,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,37 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+import asyncio
+import gzip
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
-import uvicorn
 
 from app.api.endpoints import router as api_router
+from app.core.jobs import job_manager
+from app.services.render_pool import render_pool
+
+INDEX_PATH = os.path.join("static", "index.html")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.path.exists(INDEX_PATH):
+        _index_page(os.stat(INDEX_PATH).st_mtime_ns)
+    # Start the PDF render workers in the background; the first job waits for
+    # them anyway, and the server can take requests in the meantime
+    warming = asyncio.create_task(asyncio.to_thread(render_pool.warm))
+    # Resume jobs left unfinished by the last run (needs JOB_STORE_PATH)
+    await asyncio.to_thread(job_manager.start)
+    yield
+    await warming
+    render_pool.shutdown()
+
 
-app = FastAPI(title="Cerebras Document Generator")
+app = FastAPI(title="Cerebras Document Generator", lifespan=lifespan)
 
 # Include the endpoints router
 app.include_router(api_router)
@@ -16,10 +42,26 @@ try:
 except Exception:
     pass # Will mount successfully once we move CSS/JS
 
+
+@lru_cache(maxsize=1)
+def _index_page(mtime_ns: int) -> Tuple[bytes, bytes, str]:
+    """index.html as (body, gzipped body, ETag), re-read only when the file changes."""
+    with open(INDEX_PATH, "rb") as f:
+        body = f.read()
+    return body, gzip.compress(body, mtime=0), f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+
+
 @app.get("/", response_class=HTMLResponse)
-def serve_frontend():
-    with open("static/index.html", "r", encoding="utf-8") as f:
-        return f.read()
+def serve_frontend(request: Request):
+    body, gzipped, etag = _index_page(os.stat(INDEX_PATH).st_mtime_ns)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return HTMLResponse(gzipped, headers={**headers, "Content-Encoding": "gzip"})
+    return HTMLResponse(body, headers=headers)
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -92,7 +92,7 @@ class UIController {
         }
     }
 
-    setCompletedState(data, onResetCallback) {
+    setCompletedState(data, jobId) {
         this.pingIndicator.classList.remove("animate-ping");
         this.statusText.innerText = "Hoàn tất!";
         this.logText.innerText = `Đã xong. ${data.completed} thành công, ${data.failed} thất bại.`;
@@ -103,7 +103,7 @@ class UIController {
 
             this.downloadLink.onclick = async () => {
                 try {
-                    await fetch("/api/reset", { method: "POST" });
+                    await fetch(`/api/reset/${jobId}`, { method: "POST" });
                 } catch (e) { }
                 setTimeout(() => {
                     this.downloadContainer.classList.add("hidden");
@@ -132,7 +132,7 @@ class UIController {
         const texts = {
             'terms': {
                 title: 'Điều Khoản Sử Dụng (Terms)',
-                html: '<p>Tất cả nội dung được biên soạn bởi ứng dụng này đều do Trí tuệ Nhân tạo (Cerebras Llama-3 70B) tự động tổng hợp dựa trên kiến thức chung.</p><p>Hệ thống chỉ đóng vai trò tự động hóa. <b>Chúng tôi hoàn toàn không chịu trách nhiệm pháp lý</b> về tính chính xác của thông tin, các rủi ro bản quyền hay bất kỳ sai sót thực tế (hallucinations) nào có thể xuất hiện trong nội dung văn bản. Việc sử dụng, phát hành hoặc thương mại hóa các tài liệu này là rủi ro và trách nhiệm hoàn toàn thuộc về phía người dùng.</p>'
+                html: '<p>Tất cả nội dung được biên soạn bởi ứng dụng này đều do Trí tuệ Nhân tạo (các mô hình ngôn ngữ trên Cerebras Cloud) tự động tổng hợp dựa trên kiến thức chung.</p><p>Hệ thống chỉ đóng vai trò tự động hóa. <b>Chúng tôi hoàn toàn không chịu trách nhiệm pháp lý</b> về tính chính xác của thông tin, các rủi ro bản quyền hay bất kỳ sai sót thực tế (hallucinations) nào có thể xuất hiện trong nội dung văn bản. Việc sử dụng, phát hành hoặc thương mại hóa các tài liệu này là rủi ro và trách nhiệm hoàn toàn thuộc về phía người dùng.</p>'
             },
             'privacy': {
                 title: 'Chính Sách Bảo Mật (Privacy)',
@@ -144,7 +144,7 @@ class UIController {
             },
             'howItWorks': {
                 title: 'Hướng dẫn sử dụng (How it works)',
-                html: '<ul class="list-disc pl-4 space-y-2 mb-4"><li><b>Bước 1:</b> Hệ thống gọi API đến mô hình ngôn ngữ Llama-3 70B thông qua nền tảng Cerebras Cloud để tự động lên ý tưởng.</li><li><b>Bước 2:</b> AI sẽ sinh ra các văn bản (khoảng 800-1200 từ) về các chủ đề ngẫu nhiên theo cấu trúc được thiết lập sẵn.</li><li><b>Bước 3:</b> Nội dung văn bản được hệ thống tự động biên dịch và tạo thành file định dạng PDF thông qua thư viện ReportLab.</li><li><b>Bước 4:</b> Toàn bộ các file PDF sinh ra được nén chung thành 1 tập tin ZIP và tải lên dịch vụ lưu trữ trung gian <a href="https://tmpfiles.org/" target="_blank" class="text-blue-500 hover:underline">tmpfiles.org</a>.</li><li><b>Bước 5:</b> Hệ thống sẽ trả về đường dẫn tải xuống tập tin ZIP. Mọi dữ liệu tạm thời trên ứng dụng sẽ được gỡ bỏ ngay sau đó để giải phóng bộ nhớ.</li></ul>'
+                html: '<ul class="list-disc pl-4 space-y-2 mb-4"><li><b>Bước 1:</b> Hệ thống gọi API đến mô hình ngôn ngữ được cấu hình (mặc định Llama 3.1 8B) thông qua nền tảng Cerebras Cloud để tự động lên ý tưởng.</li><li><b>Bước 2:</b> AI sẽ sinh ra các văn bản (khoảng 800-1200 từ) về các chủ đề ngẫu nhiên theo cấu trúc được thiết lập sẵn.</li><li><b>Bước 3:</b> Nội dung văn bản được hệ thống tự động biên dịch và tạo thành file định dạng PDF thông qua thư viện ReportLab.</li><li><b>Bước 4:</b> Toàn bộ các file PDF sinh ra được nén chung thành 1 tập tin ZIP và tải lên dịch vụ lưu trữ trung gian <a href="https://tmpfiles.org/" target="_blank" class="text-blue-500 hover:underline">tmpfiles.org</a>.</li><li><b>Bước 5:</b> Hệ thống sẽ trả về đường dẫn tải xuống tập tin ZIP. Mọi dữ liệu tạm thời trên ứng dụng sẽ được gỡ bỏ ngay sau đó để giải phóng bộ nhớ.</li></ul>'
             }
         };
 
@@ -177,7 +177,9 @@ class AppManager {
     constructor() {
         this.ui = new UIController();
         this.pollInterval = null;
-        
+        this.eventSource = null;
+        this.jobId = null;
+
         this.ui.btnGenerate.onclick = () => this.startGeneration();
     }
 
@@ -202,7 +204,12 @@ class AppManager {
                 throw new Error(data.message);
             }
 
-            this.pollInterval = setInterval(() => this.checkStatus(), 1000);
+            this.jobId = data.job_id;
+            if (window.EventSource) {
+                this.listenForEvents();
+            } else {
+                this.startPolling();
+            }
         } catch (err) {
             this.ui.showError(err.message);
             this.ui.progressContainer.classList.add("hidden");
@@ -210,36 +217,98 @@ class AppManager {
         }
     }
 
+    listenForEvents() {
+        // Server pushes a snapshot, then message/progress/status deltas.
+        // The browser resumes with Last-Event-ID on reconnect.
+        const data = { status: "queued", is_running: false, total: 0, completed: 0, failed: 0, messages: [], download_url: null };
+        const source = new EventSource(`/api/events/${this.jobId}`);
+        this.eventSource = source;
+
+        const merge = (e) => {
+            Object.assign(data, JSON.parse(e.data));
+            this.renderStatus(data);
+        };
+        source.addEventListener("snapshot", merge);
+        source.addEventListener("progress", merge);
+        source.addEventListener("status", merge);
+        source.addEventListener("message", (e) => {
+            data.messages = data.messages.concat(JSON.parse(e.data).message).slice(-10);
+            this.renderStatus(data);
+        });
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && this.eventSource === source) {
+                // Push channel unavailable: fall back to polling
+                this.stopTracking();
+                this.startPolling();
+            }
+        };
+    }
+
+    startPolling() {
+        this.polled = null;
+        this.pollInterval = setInterval(() => this.checkStatus(), 1000);
+    }
+
+    stopTracking() {
+        clearInterval(this.pollInterval);
+        this.pollInterval = null;
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+
     async checkStatus() {
         try {
-            const res = await fetch("/api/status");
-            const data = await res.json();
-
-            if (!data.is_running && data.total === 0) return;
-
-            const targetFiles = data.total;
-            const completedFiles = data.completed + data.failed;
-            const percentage = targetFiles ? Math.round((completedFiles / targetFiles) * 100) : 0;
-            const latestMessage = data.messages.length > 0 ? data.messages[data.messages.length - 1] : null;
-
-            this.ui.updateProgress(percentage, completedFiles, targetFiles, latestMessage);
-
-            if (!data.is_running) {
-                clearInterval(this.pollInterval);
-                if (completedFiles > 0) {
-                    this.ui.setCompletedState(data);
-                } else {
-                    // Fatal error happened before any files could be processed
-                    const errorMsg = latestMessage || "Failed to initialize generation.";
-                    this.ui.progressContainer.classList.add("hidden");
-                    this.ui.showError(errorMsg);
-                    this.ui.resetGenerateButton();
-                }
+            // After the first poll, ask only for what changed since the last one
+            const since = this.polled ? `?since_version=${this.polled.version}` : "";
+            const res = await fetch(`/api/status/${this.jobId}${since}`);
+            let data = await res.json();
+
+            if (res.status === 404) {
+                this.stopTracking();
+                this.ui.progressContainer.classList.add("hidden");
+                this.ui.showError(data.message);
+                this.ui.resetGenerateButton();
+                return;
             }
+            if ("since_version" in data) {
+                const messages = this.polled.messages.concat(data.messages || []).slice(-10);
+                data = Object.assign(this.polled, data, { messages });
+            }
+            this.polled = data;
+            this.renderStatus(data);
         } catch (err) {
             console.error("Polling error:", err);
         }
     }
+
+    renderStatus(data) {
+        if (data.status === "queued") {
+            this.ui.logText.innerText = "Đang chờ trong hàng đợi...";
+            return;
+        }
+
+        const targetFiles = data.total;
+        const completedFiles = data.completed + data.failed;
+        const percentage = targetFiles ? Math.round((completedFiles / targetFiles) * 100) : 0;
+        const latestMessage = data.messages.length > 0 ? data.messages[data.messages.length - 1] : null;
+
+        this.ui.updateProgress(percentage, completedFiles, targetFiles, latestMessage);
+
+        if (!data.is_running) {
+            this.stopTracking();
+            if (completedFiles > 0) {
+                this.ui.setCompletedState(data, this.jobId);
+            } else {
+                // Fatal error happened before any files could be processed
+                const errorMsg = latestMessage || "Failed to initialize generation.";
+                this.ui.progressContainer.classList.add("hidden");
+                this.ui.showError(errorMsg);
+                this.ui.resetGenerateButton();
+            }
+        }
+    }
 }
 
 document.addEventListener("DOMContentLoaded", () => {
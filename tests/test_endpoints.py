@@ -0,0 +1,74 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import endpoints
+from app.services import storage_service
+from app.services.storage_service import LocalDiskBackend
+
+ARCHIVE = bytes(range(256)) * 4  # 1024 bytes
+SIZE = len(ARCHIVE)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    job_dir = tmp_path / "job1"
+    job_dir.mkdir()
+    (job_dir / "tai_lieu.zip").write_bytes(ARCHIVE)
+    backend = LocalDiskBackend(root=str(tmp_path), ttl_seconds=3600)
+    monkeypatch.setitem(storage_service._backend_instances, "local", backend)
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    return TestClient(app)
+
+
+def download(client, range_header=None, job_id="job1"):
+    headers = {"Range": range_header} if range_header is not None else {}
+    return client.get(f"/api/download/{job_id}", headers=headers)
+
+
+def test_full_download(client):
+    response = download(client)
+    assert response.status_code == 200
+    assert response.content == ARCHIVE
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(SIZE)
+    assert 'filename="tai_lieu.zip"' in response.headers["content-disposition"]
+    assert "content-range" not in response.headers
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=0-99", 0, 99),
+    ("bytes=100-", 100, SIZE - 1),
+    ("bytes=1000-5000", 1000, SIZE - 1),
+    ("bytes=-24", SIZE - 24, SIZE - 1),
+    ("bytes=-5000", 0, SIZE - 1),
+    ("bytes=1023-1023", SIZE - 1, SIZE - 1),
+    (" bytes=5-9 ", 5, 9),
+])
+def test_satisfiable_ranges(client, range_header, start, end):
+    response = download(client, range_header)
+    assert response.status_code == 206
+    assert response.content == ARCHIVE[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{SIZE}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("range_header", [
+    "bytes=-",
+    "bytes=abc-",
+    "bytes=0-1,5-9",
+    "items=0-9",
+    "bytes=10-5",
+    f"bytes={SIZE}-",
+    "bytes=-0",
+])
+def test_unsatisfiable_ranges(client, range_header):
+    response = download(client, range_header)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+
+
+def test_unknown_or_invalid_job(client):
+    assert download(client, job_id="missing").status_code == 404
+    assert download(client, job_id="job-1").status_code == 404
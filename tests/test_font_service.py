@@ -0,0 +1,70 @@
+import os
+from io import BytesIO
+
+import pytest
+
+from app.services import font_service
+
+TTLib = pytest.importorskip("fontTools.ttLib")
+
+REGULAR = os.path.join(font_service.FONT_DIR, font_service.FONT_FILES["SVN-Arial"])
+
+
+@pytest.fixture(scope="module")
+def original():
+    with open(REGULAR, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def stripped(original):
+    return font_service.strip_hinting(original)
+
+
+def test_strip_hinting_removes_tables_and_instructions(original, stripped):
+    assert len(stripped) < len(original)
+    font = TTLib.TTFont(BytesIO(stripped))
+    for tag in font_service._HINTING_TABLES:
+        assert tag not in font
+    glyf = font["glyf"]
+    for name in glyf.keys():
+        glyph = glyf[name]
+        assert not getattr(glyph, "program", None) or not glyph.program.getBytecode()
+    assert font["maxp"].maxSizeOfInstructions == 0
+
+
+def test_strip_hinting_keeps_glyph_outlines(original, stripped):
+    before = TTLib.TTFont(BytesIO(original))
+    after = TTLib.TTFont(BytesIO(stripped))
+    assert after.getGlyphOrder() == before.getGlyphOrder()
+    assert after.getBestCmap() == before.getBestCmap()
+    for name in before.getGlyphOrder():
+        old, new = before["glyf"][name], after["glyf"][name]
+        assert new.getCoordinates(after["glyf"])[0] == old.getCoordinates(before["glyf"])[0]
+        assert after["hmtx"][name] == before["hmtx"][name]
+
+
+def test_stripped_font_is_embeddable(stripped):
+    font_service._check_embeddable(stripped)
+
+
+def test_load_font_strips_unless_hinting_is_kept(original, stripped):
+    assert font_service.load_font(REGULAR) == stripped
+    assert font_service.load_font(REGULAR, hinting=True) == original
+
+
+def test_load_font_falls_back_on_a_broken_font(tmp_path, caplog, original):
+    broken = tmp_path / "broken.ttf"
+    broken.write_bytes(original[:2000])
+    assert font_service.load_font(str(broken)) == original[:2000]
+    assert "Could not strip hinting" in caplog.text
+
+
+def test_fonts_hinted(monkeypatch):
+    monkeypatch.setattr(font_service.config, "PDF_FONT_HINTING", False)
+    assert not font_service.fonts_hinted()
+    monkeypatch.setattr(font_service.config, "PDF_FONT_HINTING", True)
+    assert font_service.fonts_hinted()
+    monkeypatch.setattr(font_service.config, "PDF_FONT_HINTING", False)
+    monkeypatch.setattr(font_service, "_FontToolsFont", None)
+    assert font_service.fonts_hinted()
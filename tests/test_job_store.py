@@ -0,0 +1,137 @@
+import os
+import stat
+import time
+
+import pytest
+
+from app.core import config
+from app.core.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def test_new_store_has_current_schema_and_owner_only_file(tmp_path, store):
+    assert store._conn.execute("PRAGMA user_version").fetchone()[0] == 1
+    tables = {row[0] for row in store._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"jobs", "topics", "documents", "document_files"} <= tables
+    assert stat.S_IMODE(os.stat(tmp_path / "jobs.db").st_mode) == 0o600
+
+
+def test_reopening_keeps_data(tmp_path, store):
+    store.create_job("a", 3, 2, 7, "key", formats=("pdf", "docx"), combine_pdf=True)
+    reopened = JobStore(str(tmp_path / "jobs.db"))
+    try:
+        job = reopened.get_job("a")
+    finally:
+        reopened.close()
+    assert job["status"] == "queued"
+    assert (job["num_files"], job["concurrency"], job["seed"], job["api_key"]) == (3, 2, 7, "key")
+    assert job["formats"] == ("pdf", "docx")
+    assert job["combine_pdf"] is True
+
+
+def test_claim_takes_oldest_queued_job_once(store):
+    store.create_job("a", 1, None, None, "k")
+    store.create_job("b", 1, None, None, "k")
+    assert store.claim_job("w1")["job_id"] == "a"
+    assert store.claim_job("w2")["job_id"] == "b"
+    assert store.claim_job("w3") is None
+    assert store.get_job("a")["status"] == "running"
+
+
+def test_claim_by_id(store):
+    store.create_job("a", 1, None, None, "k")
+    store.create_job("b", 1, None, None, "k")
+    assert store.claim_job("w1", job_id="b")["job_id"] == "b"
+    assert store.claim_job("w1", job_id="b") is None
+    assert store.claim_job("w1", job_id="missing") is None
+
+
+def test_live_lease_blocks_claim_unless_forced(store):
+    store.create_job("a", 1, None, None, "k", owner="w1")
+    assert store.get_job("a")["status"] == "running"
+    assert store.claim_job("w2") is None
+    assert store.claim_job("w2", force=True)["job_id"] == "a"
+
+
+def test_expired_lease_can_be_claimed_and_renewal_needs_ownership(store, monkeypatch):
+    monkeypatch.setattr(config, "JOB_LEASE_SECONDS", -1)
+    store.create_job("a", 1, None, None, "k", owner="w1")
+    assert store.claim_job("w2")["job_id"] == "a"
+
+    monkeypatch.setattr(config, "JOB_LEASE_SECONDS", 60)
+    store.save_progress("a", "w1", {"completed": 1})  # Old owner: ignored
+    assert store.get_job("a")["progress"] is None
+    store.save_progress("a", "w2", {"completed": 2})
+    assert store.get_job("a")["progress"] == {"completed": 2}
+    assert store.claim_job("w1") is None
+
+
+def test_cancel_queued_job_clears_key(store):
+    store.create_job("a", 1, None, None, "k")
+    assert store.request_cancel("a")
+    job = store.get_job("a")
+    assert job["status"] == "cancelled"
+    assert job["api_key"] is None
+    assert store.claim_job("w1") is None
+    assert store.count_pending() == 0
+
+
+def test_cancel_running_job_is_reported_to_owner(store):
+    store.create_job("a", 1, None, None, "k", owner="w1")
+    assert not store.save_progress("a", "w1", {})
+    assert store.request_cancel("a")
+    assert store.save_progress("a", "w1", {})
+    assert store.get_job("a")["status"] == "running"
+    assert not store.request_cancel("missing")
+
+
+def test_checkpoints_and_finish(store):
+    store.create_job("a", 2, None, None, "k", owner="w1")
+    store.save_topic("a", 1, "Ôm")
+    store.save_topic("a", 0, "Quang hợp")
+    store.save_document("a", 1, "Định luật Ôm", "# Ôm", {"b.pdf": b"%PDF-b", "b.docx": b"PK"})
+    store.save_document("a", 0, "Quang hợp", "# Quang hợp", {"a.pdf": b"%PDF-a"})
+
+    assert store.load_topics("a") == {0: "Quang hợp", 1: "Ôm"}
+    assert store.completed_documents("a") == [0, 1]
+    assert store.document_contents("a") == [(0, "Quang hợp", "# Quang hợp"), (1, "Định luật Ôm", "# Ôm")]
+    assert list(store.iter_document_files("a")) == [
+        (0, "a.pdf", b"%PDF-a"), (1, "b.docx", b"PK"), (1, "b.pdf", b"%PDF-b"),
+    ]
+    assert store.unfinished_jobs() == ["a"]
+
+    store.finish_job("a", {"status": "completed", "completed": 2})
+    job = store.get_job("a")
+    assert job["status"] == "completed"
+    assert job["progress"] == {"status": "completed", "completed": 2}
+    assert job["api_key"] is None
+    assert job["finished_at"] is not None
+    assert store.load_topics("a") == {}
+    assert store.completed_documents("a") == []
+    assert list(store.iter_document_files("a")) == []
+    assert store.unfinished_jobs() == []
+
+
+def test_purge_finished_keeps_recent_and_unfinished_jobs(store):
+    store.create_job("old", 1, None, None, "k")
+    store.create_job("running", 1, None, None, "k", owner="w1")
+    store.finish_job("old", {"status": "completed"})
+    store.purge_finished(time.time() - 60)
+    assert store.get_job("old") is not None
+    store.purge_finished(time.time() + 1)
+    assert store.get_job("old") is None
+    assert store.get_job("running") is not None
+
+
+def test_delete_job_drops_checkpoints(store):
+    store.create_job("a", 1, None, None, "k")
+    store.save_topic("a", 0, "Ôm")
+    store.delete_job("a")
+    assert store.get_job("a") is None
+    assert store.load_topics("a") == {}
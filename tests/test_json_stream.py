@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from app.services.json_stream import IncrementalJSONFields, loads_lenient, repair_json
+
+
+def feed_all(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_fields_complete_in_order_for_any_chunking(size):
+    payload = json.dumps({"full_topic": "Định luật Ôm", "short_topic": "Ôm", "content": "Dòng 1\nDòng \"2\""})
+    parser = IncrementalJSONFields()
+    assert feed_all(parser, payload, size) == ["full_topic", "short_topic", "content"]
+    assert parser.fields == json.loads(payload)
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_unicode_escapes_split_across_chunks(size):
+    payload = json.dumps({"content": "Tiếng Việt"}, ensure_ascii=True)
+    parser = IncrementalJSONFields()
+    feed_all(parser, payload, size)
+    assert parser.fields == {"content": "Tiếng Việt"}
+
+
+def test_root_array_items_stream_one_at_a_time():
+    parser = IncrementalJSONFields()
+    assert parser.feed('{"topics": ["Toán", "V') == ["topics"]
+    assert parser.arrays == {"topics": ["Toán"]}
+    assert parser.feed('ăn", "Sử"]}') == ["topics", "topics"]
+    assert parser.arrays == {"topics": ["Toán", "Văn", "Sử"]}
+
+
+def test_nested_values_are_not_captured():
+    parser = IncrementalJSONFields()
+    parser.feed('{"meta": {"content": "no"}, "list": [{"x": "no"}], "content": "yes"}')
+    assert parser.fields == {"content": "yes"}
+    assert parser.arrays == {"list": []}
+
+
+def test_incomplete_field_is_not_reported():
+    parser = IncrementalJSONFields()
+    assert parser.feed('{"full_topic": "A", "content": "đang viết') == ["full_topic"]
+    assert parser.fields == {"full_topic": "A"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('Đây là kết quả: {"a": 1} hết.', {"a": 1}),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('{"a": "cắt ngang', {"a": "cắt ngang"}),
+    ('{"a": "x\\', {"a": "x"}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1, "b"', {"a": 1, "b": None}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"a": {"b": [1, {"c": "d', {"a": {"b": [1, {"c": "d"}]}}),
+    ('{"a": "}", "b": "\\"{"}', {"a": "}", "b": '"{'}),
+    ('{"a": 1} {"b": 2}', {"a": 1}),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_repair_json_keeps_valid_json():
+    text = '{"a": [1, "2", {"b": null}], "c": "\\u00e1"}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+
+def test_loads_lenient():
+    assert loads_lenient('{"a": 1}') == {"a": 1}
+    assert loads_lenient('{"topics": ["A", "B"') == {"topics": ["A", "B"]}
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient("không có JSON")
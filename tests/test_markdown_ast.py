@@ -0,0 +1,75 @@
+from app.services.markdown_ast import Block, Run, document_title, parse_inline, parse_markdown
+
+
+def test_plain_text_is_one_run():
+    assert parse_inline("Xin chào") == (Run("Xin chào"),)
+
+
+def test_bold_and_italic():
+    assert parse_inline("a **b** *c* __d__ _e_") == (
+        Run("a "), Run("b", bold=True), Run(" "), Run("c", italic=True), Run(" "),
+        Run("d", bold=True), Run(" "), Run("e", italic=True),
+    )
+
+
+def test_nested_emphasis():
+    assert parse_inline("*a **b** c*") == (
+        Run("a ", italic=True), Run("b", bold=True, italic=True), Run(" c", italic=True),
+    )
+
+
+def test_triple_marker_opens_and_closes_both():
+    assert parse_inline("***x***") == (Run("x", bold=True, italic=True),)
+    assert parse_inline("___x___") == (Run("x", bold=True, italic=True),)
+
+
+def test_triple_closer_closes_inner_marker_first():
+    assert parse_inline("*a **b***") == (Run("a ", italic=True), Run("b", bold=True, italic=True))
+    assert parse_inline("**a *b***") == (Run("a ", bold=True), Run("b", bold=True, italic=True))
+    assert parse_inline("_a __b___") == (Run("a ", italic=True), Run("b", bold=True, italic=True))
+
+
+def test_unmatched_markers_stay_literal():
+    assert parse_inline("**không đóng") == (Run("**không đóng"),)
+    assert parse_inline("*a ***") == (Run("*a ***"),)
+
+
+def test_spaced_asterisks_are_not_emphasis():
+    assert parse_inline("2 * 3 * 4") == (Run("2 * 3 * 4"),)
+
+
+def test_underscores_inside_words_are_literal():
+    assert parse_inline("snake_case_name") == (Run("snake_case_name"),)
+
+
+def test_crossed_markers_keep_the_first_closed_pair():
+    assert parse_inline("**a *b** c*") == (Run("**a "), Run("b** c", italic=True))
+
+
+def test_block_kinds():
+    blocks = parse_markdown("# Tiêu đề\n## Mục\n### Nhỏ\n- một\n* hai\n2. ba\nĐoạn **văn**.")
+    assert [(b.kind, b.level, b.marker, b.text) for b in blocks] == [
+        ("title", 1, "", "Tiêu đề"),
+        ("heading", 2, "", "Mục"),
+        ("heading", 3, "", "Nhỏ"),
+        ("bullet", 0, "", "một"),
+        ("bullet", 0, "", "hai"),
+        ("ordered", 0, "2.", "ba"),
+        ("paragraph", 0, "", "Đoạn văn."),
+    ]
+    assert blocks[-1].runs == (Run("Đoạn "), Run("văn", bold=True), Run("."))
+
+
+def test_rules_blank_lines_and_quotes():
+    blocks = parse_markdown("\n---\n> Trích dẫn\n***\n\n___\n")
+    assert blocks == (Block("paragraph", (Run("Trích dẫn"),)),)
+
+
+def test_heading_text_keeps_inline_emphasis():
+    (block,) = parse_markdown("## Định luật *Ôm*")
+    assert block.runs == (Run("Định luật "), Run("Ôm", italic=True))
+
+
+def test_document_title():
+    assert document_title(parse_markdown("Mở đầu\n## Phần một\n# Sau")) == "Phần một"
+    assert document_title(parse_markdown("Chỉ có đoạn văn"), "mặc định") == "mặc định"
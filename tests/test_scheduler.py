@@ -0,0 +1,95 @@
+import asyncio
+
+from app.core.scheduler import FairLimiter
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_free_slots_are_taken_without_waiting():
+    async def scenario():
+        limiter = FairLimiter(2)
+        await limiter.acquire("a")
+        await limiter.acquire("b")
+        assert limiter.in_use == 2
+        limiter.release()
+        limiter.release()
+        assert limiter.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_freed_slots_rotate_between_jobs():
+    async def scenario():
+        limiter = FairLimiter(1)
+        await limiter.acquire("big")
+        order = []
+
+        async def worker(job_id, name):
+            await limiter.acquire(job_id)
+            order.append(name)
+
+        tasks = [asyncio.create_task(worker("big", f"big{i}")) for i in range(3)]
+        await settle()
+        tasks += [asyncio.create_task(worker("small", f"small{i}")) for i in range(2)]
+        await settle()
+        assert limiter.waiting == 5
+
+        for _ in tasks:
+            limiter.release()
+            await settle()
+        assert order == ["big0", "small0", "big1", "small1", "big2"]
+        assert limiter.in_use == 1 and limiter.waiting == 0
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = FairLimiter(1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await settle()
+        assert limiter.waiting == 1
+        waiter.cancel()
+        await settle()
+        assert waiter.cancelled()
+        assert limiter.waiting == 0
+        limiter.release()
+        assert limiter.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def scenario():
+        limiter = FairLimiter(1)
+        await limiter.acquire("a")
+        first = asyncio.create_task(limiter.acquire("b"))
+        second = asyncio.create_task(limiter.acquire("c"))
+        await settle()
+        limiter.release()  # Hands the slot to `first`...
+        first.cancel()  # ...which is cancelled before it runs
+        await settle()
+        assert first.cancelled()
+        assert second.done() and not second.cancelled()
+        assert limiter.in_use == 1 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_context_manager_releases_on_error():
+    async def scenario():
+        limiter = FairLimiter(1)
+        try:
+            async with limiter.slot("a"):
+                assert limiter.in_use == 1
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert limiter.in_use == 0
+
+    asyncio.run(scenario())
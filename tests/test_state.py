@@ -0,0 +1,128 @@
+import asyncio
+import threading
+
+from app.models.state import EVENT_LOG_SIZE, MAX_MESSAGES, GenerationState
+
+
+def running_state(total=3):
+    state = GenerationState("job")
+    state.start_generation(total)
+    return state
+
+
+def test_changes_since_current_version_is_empty():
+    state = running_state()
+    assert state.changes_since(state.version) == {"job_id": "job", "version": state.version, "since_version": state.version}
+
+
+def test_changes_since_returns_only_changed_sections():
+    state = running_state()
+    seen = state.version
+    state.add_message("một")
+    state.increment_completed()
+    delta = state.changes_since(seen)
+    assert delta["since_version"] == seen and delta["version"] == state.version
+    assert delta["messages"] == ["một"]
+    assert (delta["total"], delta["completed"], delta["failed"]) == (3, 1, 0)
+    assert "usage" in delta
+    assert "status" not in delta and "documents" not in delta and "timings" not in delta
+
+
+def test_changes_since_lists_only_new_messages_and_updated_documents():
+    state = running_state()
+    state.add_message("một")
+    state.set_document_stats(0, {"llm_seconds": 1.0})
+    state.set_document_stats(1, {"llm_seconds": 2.0})
+    seen = state.version
+    state.add_message("hai")
+    state.set_document_stats(0, {"render_seconds": 0.5})
+    delta = state.changes_since(seen)
+    assert delta["messages"] == ["hai"]
+    assert delta["documents"] == [{"index": 0, "llm_seconds": 1.0, "render_seconds": 0.5}]
+
+
+def test_changes_since_unknown_version_returns_full_status():
+    state = running_state()
+    state.add_message("một")
+    old = state.version
+    state.start_generation(5)  # Resets the version window
+    state.add_message("hai")
+    for version in (old, state.version + 10, -1):
+        full = state.changes_since(version)
+        assert full == state.get_public_status()
+        assert "since_version" not in full
+    assert full["messages"] == ["hai"] and full["total"] == 5
+
+
+def test_messages_are_capped():
+    state = running_state()
+    for i in range(MAX_MESSAGES + 5):
+        state.add_message(str(i))
+    assert state.get_public_status()["messages"] == [str(i) for i in range(5, MAX_MESSAGES + 5)]
+
+
+def test_public_status_is_cached_per_version():
+    state = running_state()
+    first = state.get_public_status()
+    assert state.get_public_status() is first
+    state.increment_failed()
+    assert state.get_public_status() is not first
+
+
+def test_subscribe_gets_snapshot_then_events_from_other_threads():
+    async def scenario():
+        state = running_state()
+        sub, backlog, snapshot = state.subscribe()
+        assert backlog == [] and snapshot["status"] == "running"
+        assert snapshot["event_id"] == state.snapshot()["event_id"]
+
+        thread = threading.Thread(target=state.add_message, args=("từ luồng khác",))
+        thread.start()
+        thread.join()
+        event = await sub.get(timeout=1)
+        assert event["type"] == "message" and event["data"] == {"message": "từ luồng khác"}
+        assert event["id"] == snapshot["event_id"] + 1
+        assert await sub.get(timeout=0.01) is None
+        sub.close()
+        state.add_message("sau khi đóng")
+        await asyncio.sleep(0)
+        assert sub.queue.empty()
+
+    asyncio.run(scenario())
+
+
+def test_subscribe_resumes_from_last_event_id():
+    async def scenario():
+        state = running_state()
+        last = state.snapshot()["event_id"]
+        state.add_message("một")
+        state.increment_completed()
+        sub, backlog, snapshot = state.subscribe(last_event_id=last)
+        assert snapshot is None
+        assert [e["type"] for e in backlog] == ["message", "progress"]
+        sub.close()
+
+        for _ in range(EVENT_LOG_SIZE + 1):
+            state.add_message("x")
+        sub, backlog, snapshot = state.subscribe(last_event_id=last)
+        assert backlog == [] and snapshot is not None
+        sub.close()
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_is_marked_lagged():
+    async def scenario():
+        state = running_state()
+        sub, _, _ = state.subscribe(max_queue=3)
+        for i in range(5):
+            state.add_message(str(i))
+        await asyncio.sleep(0)
+        assert sub.lagged
+        assert sub.queue.empty()
+        state.add_message("bị bỏ")
+        await asyncio.sleep(0)
+        assert sub.queue.empty()  # Dropped until the reader resyncs
+        sub.close()
+
+    asyncio.run(scenario())
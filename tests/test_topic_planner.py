@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from app.services.topic_planner import TopicDeduper, TopicPlanner, clean_topic, overprovisioned
+
+
+@pytest.mark.parametrize("raw, cleaned", [
+    ("1. Định luật Ôm.", "Định luật Ôm"),
+    ("- \"Quang hợp\"", "Quang hợp"),
+    ("  •  Lịch sử   Việt Nam;", "Lịch sử Việt Nam"),
+    ("Thế kỷ 18", "Thế kỷ 18"),
+])
+def test_clean_topic(raw, cleaned):
+    assert clean_topic(raw) == cleaned
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Kinh tế vi mô", "Kinh tế vĩ mô"),
+    ("Thế kỷ 18", "Thế kỷ 19"),
+    ("Bà ba", "Bá ba"),
+    ("Quang hợp", "Hô hấp tế bào"),
+])
+def test_distinct_topics_are_kept(first, second):
+    deduper = TopicDeduper()
+    assert deduper.add(first) == first
+    assert deduper.add(second) == second
+    assert len(deduper) == 2
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Lịch sử Việt Nam", "lich su viet nam."),
+    ("Lịch sử Việt Nam", "1. LỊCH SỬ VIỆT NAM"),
+    ("Định luật Ohm", "Định luật Ôm"),
+    ("Quang hợp ở thực vật", "Quang hợp của thực vật"),
+])
+def test_duplicates_are_dropped(first, second):
+    deduper = TopicDeduper()
+    assert deduper.add(first) is not None
+    assert deduper.add(second) is None
+    assert deduper.accepted == [clean_topic(first)]
+
+
+def test_toneless_topic_does_not_block_accented_ones():
+    deduper = TopicDeduper()
+    assert deduper.add("lich su viet nam") is not None
+    assert deduper.add("Lịch sử Việt Nam") is None
+
+
+def test_existing_topics_are_excluded_and_empty_ones_dropped():
+    deduper = TopicDeduper(["Định luật Ôm"])
+    assert deduper.add("Định luật Ôm") is None
+    assert deduper.add(" - ") is None
+    assert len(deduper) == 1
+
+
+def test_overprovisioned():
+    assert overprovisioned(1) == 2
+    assert overprovisioned(10) == 15
+
+
+class FakeTopicService:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def iter_topics(self, count, seed=None, exclude=None):
+        self.calls.append((count, exclude))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        for topic in response:
+            yield topic
+
+
+def plan(service, num_topics, **kwargs):
+    async def collect():
+        return [topic async for topic in TopicPlanner(service).plan(num_topics, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_plan_asks_again_for_missing_topics_and_excludes_accepted_ones():
+    service = FakeTopicService([["A", "A", "B"], ["B", "C"]])
+    assert plan(service, 3, seed=1) == ["A", "B", "C"]
+    assert service.calls == [(5, None), (2, ["A", "B"])]
+
+
+def test_plan_falls_back_when_a_request_adds_nothing():
+    service = FakeTopicService([["Định luật Ôm"], ["Định luật Ohm"]])
+    topics = plan(service, 4, seed=1)
+    assert topics[0] == "Định luật Ôm"
+    assert len(topics) == 4
+    assert len(service.calls) == 2
+
+
+def test_plan_raises_if_the_first_request_fails_and_falls_back_after():
+    with pytest.raises(RuntimeError):
+        plan(FakeTopicService([RuntimeError("bad key")]), 2)
+    topics = plan(FakeTopicService([["A"], RuntimeError("down")]), 3, seed=1)
+    assert topics[0] == "A" and len(topics) == 3